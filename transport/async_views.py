@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+
+class AsyncReadMixin:
+    """Async ``list``/``retrieve`` for a ViewSet, running on the async ORM.
+
+    Authentication, permissions and throttling run as in the sync view; the
+    page and the object are fetched with ``acount``/``aget``/``async for``,
+    so an ASGI worker can serve other requests while the queries run.
+    """
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(
+                queryset, request, view=self
+            )
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(
+            [obj async for obj in queryset], many=True
+        )
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (ObjectDoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+def async_read_view(viewset_class, actions, **initkwargs):
+    """Serve GET with the ViewSet's async actions, other methods synchronously.
+
+    ``initkwargs`` are passed on as to ``as_view``; give the router's
+    ``basename`` so cached responses are shared with the sync routes.
+    """
+    sync_view = viewset_class.as_view(actions, **initkwargs)
+    read_actions = {"get": actions["get"], "head": actions["get"]}
+
+    async def view(request, *args, **kwargs):
+        if request.method.lower() not in read_actions:
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+        viewset = viewset_class(**initkwargs)
+        viewset.action_map = read_actions
+        return await viewset.adispatch(request, *args, **kwargs)
+
+    view.cls = sync_view.cls
+    view.initkwargs = sync_view.initkwargs
+    view.actions = sync_view.actions
+    return csrf_exempt(view)
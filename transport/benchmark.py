@@ -0,0 +1,298 @@
+import datetime
+import statistics
+import time
+import tracemalloc
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+
+from transport.booking import reconcile_occupancy
+from transport.models import Journey, JourneyOccupancy, Order, Ticket
+from transport.seat_map import SeatMap
+
+CASES = (
+    "journey.list",
+    "journey.list.route",
+    "journey.list.train",
+    "journey.list.crew",
+    "journey.list.departure_after",
+    "journey.list.arrival_before",
+    "journey.retrieve",
+    "order.list",
+    "order.create",
+    "station.list",
+    "user.login",
+    "user.token_refresh",
+)
+
+# Relative slack on latency and allocations, absolute on queries
+DEFAULT_TOLERANCES = {"latency": 0.2, "queries": 0, "allocated_bytes": 0.2}
+
+
+def percentile(values, percent):
+    """Linear interpolation between the closest ranks"""
+    values = sorted(values)
+    rank = (len(values) - 1) * percent / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+class EndpointBenchmark:
+    """Time the hot API actions in-process against the configured database.
+
+    Requests go through the real URL conf, middleware, authentication and
+    throttling with DRF's ``APIClient``; only the throttle rates are lifted.
+    Each case is warmed up, timed ``iterations`` times for the latency
+    percentiles, then run ``profile_iterations`` more times under
+    ``tracemalloc`` and query capture, which would skew the timings.
+    ``allocated_bytes`` is the median peak of memory traced during a request.
+
+    The dataset is expected to come from ``seed_scale``: the user signs in
+    with ``email`` and ``password`` and the other cases use its journeys.
+    Orders created by ``order.create`` are deleted again afterwards.
+    """
+
+    def __init__(
+        self,
+        email,
+        password,
+        iterations=50,
+        warmup=5,
+        profile_iterations=5,
+        cases=CASES,
+    ):
+        self.email = email
+        self.password = password
+        self.iterations = iterations
+        self.warmup = warmup
+        self.profile_iterations = profile_iterations
+        self.cases = cases
+        self.created_orders = []
+
+    def run(self):
+        rates = SimpleRateThrottle.THROTTLE_RATES
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+        ), mock.patch.dict(rates, {scope: "1000000/day" for scope in rates}):
+            self.client = APIClient()
+            self._prepare()
+            try:
+                results = {name: self._run_case(name) for name in self.cases}
+            finally:
+                self._clean_up()
+        return {
+            "created_at": timezone.now().isoformat(),
+            "iterations": self.iterations,
+            "dataset": {
+                "journeys": Journey.objects.count(),
+                "orders": Order.objects.count(),
+                "tickets": Ticket.objects.count(),
+            },
+            "results": results,
+        }
+
+    def _prepare(self):
+        if not get_user_model().objects.filter(email=self.email).exists():
+            raise ValueError(
+                f"User {self.email} does not exist; run manage.py seed_scale first."
+            )
+        tokens = self._login()
+        self.access, self.refresh = tokens["access"], tokens["refresh"]
+        self.journey = (
+            Journey.objects.filter(departure_time__gt=timezone.now())
+            .order_by("departure_time", "id")
+            .first()
+        )
+        if self.journey is None:
+            raise ValueError("No upcoming journeys; run manage.py seed_scale first.")
+        self.crew_id = self.journey.crew.values_list("pk", flat=True).first()
+        if "order.create" in self.cases:
+            self.seats = iter(
+                self._free_seats(
+                    self.warmup + self.iterations + self.profile_iterations
+                )
+            )
+
+    def _login(self):
+        response = self.client.post(
+            reverse("user:login"),
+            {"email": self.email, "password": self.password},
+            format="json",
+        )
+        if response.status_code != 200:
+            raise ValueError(f"Could not sign in as {self.email}.")
+        return response.data
+
+    def _free_seats(self, count):
+        """Return ``count`` free ``(journey_id, cargo, seat)`` for new orders"""
+        seats = []
+        occupancies = (
+            JourneyOccupancy.objects.filter(
+                journey__departure_time__gt=timezone.now(),
+                sold__lt=F("capacity") - F("held"),
+            )
+            .select_related("journey__train")
+            .order_by("journey_id")
+        )
+        for occupancy in occupancies.iterator():
+            seat_map = SeatMap.for_journey(occupancy.journey)
+            for cargo in range(1, seat_map.cargo_num + 1):
+                for seat in seat_map.free_seats(cargo):
+                    seats.append((occupancy.journey_id, cargo, seat))
+                    if len(seats) == count:
+                        return seats
+        raise ValueError("Not enough free seats to benchmark order creation.")
+
+    def _requests(self):
+        """Map each case to ``(method, url, data factory, authenticated)``"""
+        journeys = reverse("transport:journey-list")
+        soon = timezone.now() + datetime.timedelta(days=1)
+        journey_filters = {
+            "route": self.journey.route_id,
+            "train": self.journey.train_id,
+            "crew": self.crew_id,
+            "departure_after": soon.isoformat(),
+            "arrival_before": (soon + datetime.timedelta(days=1)).isoformat(),
+        }
+        requests = {
+            "journey.list": ("get", journeys, None, True),
+            "journey.retrieve": (
+                "get",
+                reverse("transport:journey-detail", args=[self.journey.pk]),
+                None,
+                True,
+            ),
+            "order.list": ("get", reverse("transport:order-list"), None, True),
+            "order.create": (
+                "post",
+                reverse("transport:order-list"),
+                self._order_data,
+                True,
+            ),
+            "station.list": ("get", reverse("transport:station-list"), None, True),
+            "user.login": (
+                "post",
+                reverse("user:login"),
+                lambda: {"email": self.email, "password": self.password},
+                False,
+            ),
+            "user.token_refresh": (
+                "post",
+                reverse("token_refresh"),
+                lambda: {"refresh": self.refresh},
+                False,
+            ),
+        }
+        for name, value in journey_filters.items():
+            requests[f"journey.list.{name}"] = (
+                "get",
+                journeys,
+                lambda value=value, name=name: {name: value},
+                True,
+            )
+        return requests
+
+    def _order_data(self):
+        journey_id, cargo, seat = next(self.seats)
+        return {"tickets": [{"journey": journey_id, "cargo": cargo, "seat": seat}]}
+
+    def _request(self, method, url, data, authenticated):
+        headers = {}
+        if authenticated:
+            headers["Authorization"] = f"Bearer {self.access}"
+        payload = data() if data else None
+        if method == "get":
+            return lambda: self.client.get(url, payload, headers=headers)
+        return lambda: self.client.post(url, payload, format="json", headers=headers)
+
+    def _call(self, name, send):
+        response = send()
+        if response.status_code not in (200, 201):
+            raise ValueError(f"{name} returned {response.status_code}.")
+        if response.status_code == 201 and name == "order.create":
+            self.created_orders.append(response.data["id"])
+
+    def _run_case(self, name):
+        request = self._requests()[name]
+        for _ in range(self.warmup):
+            self._call(name, self._request(*request))
+
+        timings = []
+        for _ in range(self.iterations):
+            send = self._request(*request)
+            started = time.perf_counter()
+            self._call(name, send)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        queries = []
+        allocated = []
+        tracemalloc.start()
+        try:
+            for _ in range(self.profile_iterations):
+                send = self._request(*request)
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                with CaptureQueriesContext(connection) as captured:
+                    self._call(name, send)
+                allocated.append(tracemalloc.get_traced_memory()[1] - baseline)
+                queries.append(len(captured))
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": statistics.median_low(queries),
+            "allocated_bytes": statistics.median_low(allocated),
+        }
+
+    def _clean_up(self):
+        if not self.created_orders:
+            return
+        journey_ids = set(
+            Ticket.objects.filter(order_id__in=self.created_orders).values_list(
+                "journey_id", flat=True
+            )
+        )
+        Order.objects.filter(pk__in=self.created_orders).delete()
+        reconcile_occupancy(journey_ids)
+
+
+def compare(results, baseline, tolerances=None):
+    """Return a message per metric of ``results`` worse than ``baseline``.
+
+    Latency percentiles and allocations may grow by their relative
+    tolerance, queries by an absolute number.
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    regressions = []
+    for name, metrics in results["results"].items():
+        expected = baseline["results"].get(name)
+        if expected is None:
+            continue
+        for metric, value in metrics.items():
+            if metric not in expected or metric == "mean_ms":
+                continue
+            if metric == "queries":
+                limit = expected[metric] + tolerances["queries"]
+            elif metric == "allocated_bytes":
+                limit = expected[metric] * (1 + tolerances["allocated_bytes"])
+            else:
+                limit = expected[metric] * (1 + tolerances["latency"])
+            if value > limit:
+                regressions.append(
+                    f"{name} {metric}: {value} > {round(limit, 3)} "
+                    f"(baseline {expected[metric]})"
+                )
+    return regressions
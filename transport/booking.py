@@ -0,0 +1,268 @@
+import functools
+from collections import Counter
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from transport.cache import bump_versions
+from transport.models import (
+    Journey,
+    JourneyOccupancy,
+    Order,
+    Route,
+    SeatHold,
+    Ticket,
+)
+
+# Add per-journey deltas to existing counters; returns the journeys updated
+ADJUST_OCCUPANCY = """
+UPDATE transport_journeyoccupancy occupancy
+SET sold = occupancy.sold + delta.sold, held = occupancy.held + delta.held
+FROM
+    unnest(%s::bigint[], %s::integer[], %s::integer[])
+        AS delta (journey_id, sold, held),
+    transport_journey journey
+WHERE occupancy.journey_id = delta.journey_id AND journey.id = delta.journey_id
+RETURNING occupancy.journey_id, journey.route_id
+"""
+
+# Recount journeys from their tickets and holds, writing only changed rows
+RECOUNT_OCCUPANCY = """
+INSERT INTO transport_journeyoccupancy AS occupancy
+    (journey_id, capacity, sold, held)
+SELECT
+    journey.id,
+    train.cargo_num * train.places_in_cargo,
+    (SELECT count(*) FROM transport_ticket WHERE journey_id = journey.id),
+    (SELECT count(*) FROM transport_seathold WHERE journey_id = journey.id)
+FROM transport_journey journey
+JOIN transport_train train ON train.id = journey.train_id
+WHERE journey.id = ANY(%s)
+ON CONFLICT (journey_id) DO UPDATE
+SET capacity = excluded.capacity, sold = excluded.sold, held = excluded.held
+WHERE (occupancy.capacity, occupancy.sold, occupancy.held)
+    IS DISTINCT FROM (excluded.capacity, excluded.sold, excluded.held)
+RETURNING (
+    SELECT route_id FROM transport_journey WHERE id = occupancy.journey_id
+)
+"""
+
+# Set the capacity of a train's journeys; returns the routes they run on
+RESIZE_OCCUPANCY = """
+UPDATE transport_journeyoccupancy occupancy
+SET capacity = %s
+FROM transport_journey journey
+WHERE journey.id = occupancy.journey_id AND journey.train_id = %s
+RETURNING journey.route_id
+"""
+
+
+def seats_available():
+    """Free seats of a journey from its counters, for ``annotate``.
+
+    Journeys without counters yet have sold nothing.
+    """
+    return Coalesce(
+        F("occupancy__capacity") - F("occupancy__sold") - F("occupancy__held"),
+        F("train__cargo_num") * F("train__places_in_cargo"),
+    )
+
+
+def lock_journeys(journey_ids):
+    """Serialise seat writes on these journeys until the transaction ends.
+
+    Rows are locked in id order so two bookings can never deadlock. ``NO KEY
+    UPDATE`` does not block inserts that only reference the journey.
+    """
+    list(
+        Journey.objects.select_for_update(no_key=True)
+        .filter(pk__in=journey_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def active_holds():
+    return SeatHold.objects.filter(expires_at__gt=timezone.now())
+
+
+def adjust_occupancy(sold=None, held=None):
+    """Add ``{journey_id: delta}`` changes to the journeys' occupancy counters.
+
+    Call it in the transaction that wrote the tickets or holds, with the
+    journeys locked, so the counters move together with the rows. A journey
+    without a counter yet gets one counted from its rows, which already
+    include this change.
+    """
+    sold, held = Counter(sold or {}), Counter(held or {})
+    journey_ids = sorted(set(sold) | set(held))
+    if not journey_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ADJUST_OCCUPANCY,
+            [
+                journey_ids,
+                [sold[journey_id] for journey_id in journey_ids],
+                [held[journey_id] for journey_id in journey_ids],
+            ],
+        )
+        rows = cursor.fetchall()
+    invalidate_calendars({route_id for _, route_id in rows})
+    updated = {journey_id for journey_id, _ in rows}
+    missing = [journey_id for journey_id in journey_ids if journey_id not in updated]
+    if missing:
+        reconcile_occupancy(missing)
+
+
+def reconcile_occupancy(journey_ids):
+    """Recount the occupancy of these journeys; return how many rows changed.
+
+    The counters are locked before the rows are counted: a booking that
+    already adjusted them has committed by then and is counted, one that
+    has not yet adjusts the fresh counts afterwards.
+    """
+    journey_ids = list(journey_ids)
+    with transaction.atomic(savepoint=False):
+        list(
+            JourneyOccupancy.objects.select_for_update()
+            .filter(journey_id__in=journey_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(RECOUNT_OCCUPANCY, [journey_ids])
+            route_ids = [row[0] for row in cursor.fetchall()]
+    invalidate_calendars(set(route_ids))
+    return len(route_ids)
+
+
+def resize_occupancy(train):
+    """Give the journeys of ``train`` its current capacity"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            RESIZE_OCCUPANCY, [train.cargo_num * train.places_in_cargo, train.pk]
+        )
+        invalidate_calendars({row[0] for row in cursor.fetchall()})
+
+
+def invalidate_calendars(route_ids):
+    """Drop the cached calendars of these routes once the transaction commits"""
+    if route_ids:
+        transaction.on_commit(
+            functools.partial(
+                bump_versions, *[(Route, route_id) for route_id in sorted(route_ids)]
+            )
+        )
+
+
+def _release(holds):
+    """Delete ``holds`` and take them off the held counters"""
+    released = dict(
+        holds.order_by().values_list("journey_id").annotate(count=Count("pk"))
+    )
+    if released:
+        holds.delete()
+        adjust_occupancy(
+            held={journey_id: -count for journey_id, count in released.items()}
+        )
+    return sum(released.values())
+
+
+def release_expired_holds(**filters):
+    """Delete expired holds and return how many were removed.
+
+    Nothing is locked unless a hold has expired, which keeps the check cheap
+    on the hold path; the journeys are then locked and the holds counted
+    again before they are deleted.
+    """
+    expired = SeatHold.objects.filter(expires_at__lte=timezone.now(), **filters)
+    journey_ids = set(
+        expired.order_by().values_list("journey_id", flat=True).distinct()
+    )
+    if not journey_ids:
+        return 0
+    with transaction.atomic():
+        lock_journeys(journey_ids)
+        return _release(expired.filter(journey_id__in=journey_ids))
+
+
+def cancel_hold(hold_id, user):
+    """Release the user's active hold and return how many seats it had"""
+    holds = active_holds().filter(hold_id=hold_id, user=user)
+    with transaction.atomic():
+        lock_journeys(holds.values("journey_id"))
+        return _release(holds)
+
+
+def release_bought_holds(keys, user):
+    """Release the user's holds on ``(journey_id, cargo, seat)`` keys they bought.
+
+    Call it with the journeys locked, in the transaction creating the tickets.
+    """
+    if user is None or not user.is_authenticated or not keys:
+        return 0
+    seats = functools.reduce(
+        or_,
+        (
+            Q(journey_id=journey_id, cargo=cargo, seat=seat)
+            for journey_id, cargo, seat in keys
+        ),
+    )
+    return _release(SeatHold.objects.filter(seats, user=user))
+
+
+def taken_seats(keys, user=None):
+    """Return the ``(journey_id, cargo, seat)`` keys sold or held by someone else.
+
+    Tickets and active holds are read in a single query; holds of ``user``
+    do not count as taken for them.
+    """
+    filters = {
+        "journey_id__in": {key[0] for key in keys},
+        "cargo__in": {key[1] for key in keys},
+        "seat__in": {key[2] for key in keys},
+    }
+    holds = active_holds().filter(**filters)
+    if user is not None and user.is_authenticated:
+        holds = holds.exclude(user=user)
+    fields = ("journey_id", "cargo", "seat")
+    return set(
+        Ticket.objects.filter(**filters)
+        .values_list(*fields)
+        .union(holds.values_list(*fields), all=True)
+    )
+
+
+def confirm_hold(hold_id, user):
+    """Turn the user's active hold into an order, or return None if it lapsed.
+
+    Raises ``IntegrityError`` when the user already ordered a held seat.
+    """
+    with transaction.atomic():
+        lock_journeys(
+            SeatHold.objects.filter(hold_id=hold_id, user=user).values("journey_id")
+        )
+        holds = list(active_holds().filter(hold_id=hold_id, user=user))
+        if not holds:
+            return None
+        order = Order.objects.create(user=user)
+        Ticket.objects.bulk_create(
+            Ticket(
+                order=order,
+                journey_id=hold.journey_id,
+                cargo=hold.cargo,
+                seat=hold.seat,
+            )
+            for hold in holds
+        )
+        SeatHold.objects.filter(pk__in=[hold.pk for hold in holds]).delete()
+        seats = Counter(hold.journey_id for hold in holds)
+        adjust_occupancy(
+            sold=seats,
+            held={journey_id: -count for journey_id, count in seats.items()},
+        )
+    return order
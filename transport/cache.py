@@ -0,0 +1,187 @@
+import functools
+import hashlib
+import inspect
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from transport import metrics
+
+
+def _version_key(model):
+    # A (model, pk) pair versions the rows hanging off one object
+    if isinstance(model, tuple):
+        model, pk = model
+        return f"model-version:{model._meta.label_lower}:{pk}"
+    return f"model-version:{model._meta.label_lower}"
+
+
+def bump_versions(*models):
+    """Invalidate cached responses and process-wide objects built from these models.
+
+    A fresh random token is stored rather than an increment, so concurrent
+    bumps from different workers can never settle on a version that a
+    response cached in between already uses.
+    """
+    tokens = {model: uuid.uuid4().hex for model in models}
+    caches[settings.MODEL_VERSIONS_CACHE].set_many(
+        {_version_key(model): token for model, token in tokens.items()},
+        timeout=None,
+    )
+    return tokens
+
+
+def get_versions(models):
+    versions = caches[settings.MODEL_VERSIONS_CACHE]
+    keys = [_version_key(model) for model in models]
+    found = versions.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            versions.add(key, uuid.uuid4().hex, timeout=None)
+        found.update(versions.get_many(missing))
+    return [found[key] for key in keys]
+
+
+def response_cache_key(view, request):
+    # Versions are read before the view queries the database, so a response
+    # built from rows changed later is stored under an outdated version.
+    get_cache_models = getattr(view, "get_cache_models", None)
+    versions = get_versions(
+        get_cache_models() if get_cache_models else view.cache_models
+    )
+    identity = "|".join(
+        [
+            request.build_absolute_uri(),
+            getattr(request.accepted_renderer, "format", ""),
+            *versions,
+        ]
+    )
+    digest = hashlib.md5(identity.encode("utf-8")).hexdigest()
+    return f"response:{view.basename}:{view.action}:{digest}"
+
+
+def cache_response(view_method):
+    """Cache a ViewSet action's response data under the ``cache_models`` versions.
+
+    Views whose versions depend on the request define ``get_cache_models``.
+    Async actions (``alist``, ``aretrieve``) share the entries of their sync
+    counterparts.
+    """
+
+    if inspect.iscoroutinefunction(view_method):
+
+        @functools.wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            cache = caches[settings.RESPONSE_CACHE]
+            key = await sync_to_async(response_cache_key)(self, request)
+            data = await cache.aget(key)
+            if data is not None:
+                metrics.increment(f"response_cache.{self.basename}.hit")
+                return Response(data)
+
+            metrics.increment(f"response_cache.{self.basename}.miss")
+            response = await view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                await cache.aset(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        cache = caches[settings.RESPONSE_CACHE]
+        key = response_cache_key(self, request)
+        data = cache.get(key)
+        if data is not None:
+            metrics.increment(f"response_cache.{self.basename}.hit")
+            return Response(data)
+
+        metrics.increment(f"response_cache.{self.basename}.miss")
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
+
+
+class VersionedObject:
+    """Process-wide object built from the database and tracked by model versions.
+
+    ``get`` reloads the object when another process bumped one of its models'
+    versions. Changes committed by this process are applied in place with
+    ``apply`` instead, so they do not cause a reload. ``max_age`` bounds how
+    long a missed bump can go unnoticed.
+    """
+
+    def __init__(self, models, loader, max_age=600):
+        self.models = tuple(models)
+        self.loader = loader
+        self.max_age = max_age
+        self.value = None
+        self.versions = None
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        versions = get_versions(self.models)
+        value = self.value
+        if (
+            value is None
+            or versions != self.versions
+            or time.monotonic() - self.loaded_at > self.max_age
+        ):
+            with self.lock:
+                value = self.value = self.loader()
+                self.versions = versions
+                self.loaded_at = time.monotonic()
+        return value
+
+    def apply(self, previous, bumped, method, *args):
+        """Apply a change made by this process between two version states.
+
+        ``previous`` maps models to their versions before this process bumped
+        ``bumped``; when the object was loaded at another state it is dropped
+        and reloaded on the next ``get``.
+        """
+        with self.lock:
+            if self.value is None:
+                return
+            if self.versions != [previous[model] for model in self.models]:
+                self.value = None
+                return
+            getattr(self.value, method)(*args)
+            self.versions = [
+                bumped.get(model, previous[model]) for model in self.models
+            ]
+
+    def reset(self):
+        with self.lock:
+            self.value = None
+            self.versions = None
+
+
+def commit_change(model, *updates):
+    """Bump ``model``'s version and apply ``updates`` once the transaction commits.
+
+    Each update is a ``(versioned_object, method, *args)`` tuple.
+    """
+
+    def callback():
+        models = {model}
+        for versioned, *_ in updates:
+            models.update(versioned.models)
+        models = list(models)
+        previous = dict(zip(models, get_versions(models)))
+        bumped = bump_versions(model)
+        for versioned, method, *args in updates:
+            versioned.apply(previous, bumped, method, *args)
+
+    transaction.on_commit(callback)
@@ -0,0 +1,116 @@
+import csv
+
+import zstandard
+from django.conf import settings
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import OuterRef
+
+from transport.models import Journey, Order, Ticket
+
+OUTPUT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+COMPRESSIONS = {"zstd": ("application/zstd", "zst")}
+
+
+def _journeys():
+    crew = (
+        Journey.crew.through.objects.filter(journey=OuterRef("pk"))
+        .order_by("crew_id")
+        .values("crew_id")
+    )
+    return Journey.objects.annotate(crew_ids=ArraySubquery(crew))
+
+
+# Dataset name: (queryset factory, exported fields)
+DATASETS = {
+    "journeys": (
+        _journeys,
+        ("id", "route_id", "train_id", "departure_time", "arrival_time", "crew_ids"),
+    ),
+    "orders": (Order.objects.all, ("id", "user_id", "created_at")),
+    "tickets": (Ticket.objects.all, ("id", "order_id", "journey_id", "cargo", "seat")),
+}
+
+
+def export_rows(dataset):
+    """Yield every row of ``dataset`` as a dict, in primary key order.
+
+    Rows come from a server-side cursor ``EXPORT_CHUNK_SIZE`` at a time, so
+    memory stays flat however large the table is. The cursor is read inside
+    a transaction, which keeps it on one connection behind a pooler.
+    """
+    queryset, fields = DATASETS[dataset]
+    with transaction.atomic():
+        yield from (
+            queryset()
+            .order_by("pk")
+            .values(*fields)
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        )
+
+
+class _Line:
+    """File-like object handing back what ``csv.writer`` writes"""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows, fields):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(_Line())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(
+            [
+                " ".join(map(str, value)) if isinstance(value, list) else value
+                for value in row.values()
+            ]
+        )
+
+
+def _batches(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == size:
+            yield "".join(batch).encode()
+            batch = []
+    if batch:
+        yield "".join(batch).encode()
+
+
+def _zstd(chunks):
+    compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(dataset, output_format="ndjson", compression=None):
+    """Return ``(content_type, filename, chunks)`` for exporting ``dataset``.
+
+    ``chunks`` is a lazy iterator of bytes: nothing is queried until it is
+    consumed and at most one batch of rows is encoded at a time.
+    """
+    _, fields = DATASETS[dataset]
+    content_type, extension = OUTPUT_FORMATS[output_format]
+    encode = ndjson_lines if output_format == "ndjson" else csv_lines
+    chunks = _batches(encode(export_rows(dataset), fields), settings.EXPORT_CHUNK_SIZE)
+    filename = f"{dataset}.{extension}"
+    if compression:
+        content_type, extension = COMPRESSIONS[compression]
+        chunks = _zstd(chunks)
+        filename = f"{filename}.{extension}"
+    return content_type, filename, chunks
@@ -0,0 +1,192 @@
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Upper bound on ids in one ``?route=1,2,...`` list
+MAX_IDS = 100
+
+
+class Filter:
+    """One query parameter applied as a lookup on ``field``.
+
+    ``parse`` turns the raw string into a value or raises ``ValueError`` with
+    the message for the client; ``apply`` adds the condition to the queryset.
+    """
+
+    schema = {"type": "string"}
+
+    def __init__(self, field, lookup="exact", description=""):
+        self.field = field
+        self.lookup = lookup
+        self.description = description
+
+    def parse(self, value):
+        return value
+
+    def apply(self, queryset, value):
+        return queryset.filter(**{f"{self.field}__{self.lookup}": value})
+
+
+class CharFilter(Filter):
+    def parse(self, value):
+        if len(value) > 255:
+            raise ValueError("Ensure this value has at most 255 characters.")
+        return value
+
+
+class IntegerFilter(Filter):
+    schema = {"type": "integer"}
+
+    def parse(self, value):
+        if not value.isdigit():
+            raise ValueError("A valid integer is required.")
+        return int(value)
+
+
+class DateTimeFilter(Filter):
+    schema = {"type": "string", "format": "date-time"}
+
+    def parse(self, value):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError("A valid ISO 8601 datetime is required.")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+
+class IdListFilter(Filter):
+    """Comma separated ids matched with ``__in``"""
+
+    schema = {"type": "array", "items": {"type": "integer"}}
+
+    def __init__(self, field, description=""):
+        super().__init__(field, "in", description)
+
+    def parse(self, value):
+        ids = value.split(",")
+        if not all(id_.isdigit() for id_ in ids):
+            raise ValueError("A comma separated list of ids is required.")
+        if len(ids) > MAX_IDS:
+            raise ValueError(f"Ensure this list has at most {MAX_IDS} ids.")
+        return sorted({int(id_) for id_ in ids})
+
+
+class ManyToManyIdListFilter(IdListFilter):
+    """Ids of a many-to-many field, matched with an ``EXISTS`` semi-join.
+
+    Filtering through the join (``crew__id__in``) returns a row per matching
+    link and needs ``DISTINCT``, which sorts the whole result before it can
+    be paginated. ``EXISTS`` on the through table never duplicates rows.
+    """
+
+    def apply(self, queryset, value):
+        field = queryset.model._meta.get_field(self.field)
+        links = field.remote_field.through.objects.filter(
+            **{
+                field.m2m_field_name(): OuterRef("pk"),
+                f"{field.m2m_reverse_field_name()}__in": value,
+            }
+        )
+        return queryset.filter(Exists(links))
+
+
+class FilterSet:
+    """Query parameters a view can be filtered by, declared as attributes.
+
+    Every parameter is parsed before the queryset is touched, so bad input
+    is reported together as a 400 and all conditions land in one query::
+
+        class TrainFilter(FilterSet):
+            name = CharFilter("name", "icontains")
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.filters = {
+            name: value
+            for klass in reversed(cls.__mro__)
+            for name, value in vars(klass).items()
+            if isinstance(value, Filter)
+        }
+
+    def __init__(self, query_params):
+        self.query_params = query_params
+
+    def filter_queryset(self, queryset):
+        values, errors = {}, {}
+        for name, filter_ in self.filters.items():
+            value = self.query_params.get(name)
+            if not value:
+                continue
+            try:
+                values[name] = filter_.parse(value)
+            except ValueError as exc:
+                errors[name] = [str(exc)]
+        if errors:
+            raise ValidationError(errors)
+        for name, value in values.items():
+            queryset = self.filters[name].apply(queryset, value)
+        return queryset
+
+
+class FilterSetBackend(BaseFilterBackend):
+    """Filter backend applying the view's ``filterset_class``"""
+
+    def filter_queryset(self, request, queryset, view):
+        filterset_class = getattr(view, "filterset_class", None)
+        if filterset_class is None:
+            return queryset
+        return filterset_class(request.query_params).filter_queryset(queryset)
+
+    def get_schema_operation_parameters(self, view):
+        filterset_class = getattr(view, "filterset_class", None)
+        if filterset_class is None:
+            return []
+        return [
+            {
+                "name": name,
+                "required": False,
+                "in": "query",
+                "description": filter_.description,
+                "schema": filter_.schema,
+            }
+            for name, filter_ in filterset_class.filters.items()
+        ]
+
+
+class TrainFilter(FilterSet):
+    name = CharFilter("name", "icontains", "Filter by train name (ex. ?name=train1)")
+    train_types = IdListFilter(
+        "train_type", "Filter by train_types id (ex. ?train_types=2,5)"
+    )
+    cargo_num = IntegerFilter(
+        "cargo_num", description="Filter by number of cargo (ex. ?cargo_num=10)"
+    )
+    places_in_cargo = IntegerFilter(
+        "places_in_cargo",
+        description="Filter by places in cargo (ex. ?places_in_cargo=50)",
+    )
+
+
+class JourneyFilter(FilterSet):
+    route = IdListFilter("route", "Filter by route id (ex. ?route=2,5)")
+    train = IdListFilter("train", "Filter by train id (ex. ?train=2,5)")
+    crew = ManyToManyIdListFilter("crew", "Filter by crew id (ex. ?crew=2,5)")
+    departure_after = DateTimeFilter(
+        "departure_time",
+        "gte",
+        "Filter journeys departing after this time "
+        "(ex. ?departure_after=2025-04-24T10:00:00Z)",
+    )
+    arrival_before = DateTimeFilter(
+        "arrival_time",
+        "lte",
+        "Filter journeys arriving before this time "
+        "(ex. ?arrival_before=2025-04-24T18:00:00Z)",
+    )
@@ -0,0 +1,509 @@
+import csv
+import datetime
+import functools
+import io
+import zipfile
+import zoneinfo
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from transport.cache import bump_versions
+from transport.models import Journey, Route, Station, Train
+from transport.routing import EARTH_RADIUS_KM
+
+AGENCY_ID = "1"
+ROUTE_TYPE_RAIL = 2
+DATE_FORMAT = "%Y%m%d"
+
+
+@functools.lru_cache(maxsize=1024)
+def _day_start(date, tz):
+    """GTFS times count from noon minus 12 hours of the service day"""
+    noon = datetime.datetime.combine(date, datetime.time(12), tz)
+    return noon.astimezone(datetime.timezone.utc) - datetime.timedelta(hours=12)
+
+
+def _gtfs_time(moment, date, tz):
+    seconds = int((moment - _day_start(date, tz)).total_seconds())
+    return f"{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+
+
+def _values(queryset, *fields):
+    return (
+        queryset.order_by("pk")
+        .values_list(*fields)
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+
+def _trips(tz):
+    for pk, route_id, departure_time, train in _values(
+        Journey.objects, "id", "route_id", "departure_time", "train__name"
+    ):
+        service_date = departure_time.astimezone(tz).date()
+        yield route_id, service_date.strftime(DATE_FORMAT), pk, train
+
+
+def _stop_times(tz):
+    for pk, departure_time, arrival_time, source, destination in _values(
+        Journey.objects,
+        "id",
+        "departure_time",
+        "arrival_time",
+        "route__source_id",
+        "route__destination_id",
+    ):
+        date = departure_time.astimezone(tz).date()
+        departs = _gtfs_time(departure_time, date, tz)
+        arrives = _gtfs_time(arrival_time, date, tz)
+        yield pk, departs, departs, source, 1
+        yield pk, arrives, arrives, destination, 2
+
+
+def _feed_files():
+    """Yield ``(file name, header, rows)`` for each file of the feed"""
+    tz = timezone.get_current_timezone()
+    yield (
+        "agency.txt",
+        ("agency_id", "agency_name", "agency_url", "agency_timezone"),
+        [(AGENCY_ID, settings.GTFS_AGENCY_NAME, settings.GTFS_AGENCY_URL, str(tz))],
+    )
+    yield (
+        "stops.txt",
+        ("stop_id", "stop_name", "stop_lat", "stop_lon"),
+        _values(Station.objects, "id", "name", "latitude", "longitude"),
+    )
+    yield (
+        "routes.txt",
+        ("route_id", "agency_id", "route_short_name", "route_long_name", "route_type"),
+        (
+            (pk, AGENCY_ID, "", f"{source} - {destination}", ROUTE_TYPE_RAIL)
+            for pk, source, destination in _values(
+                Route.objects, "id", "source__name", "destination__name"
+            )
+        ),
+    )
+    service_dates = (
+        Journey.objects.annotate(service_date=TruncDate("departure_time", tzinfo=tz))
+        .order_by("service_date")
+        .values_list("service_date", flat=True)
+        .distinct()
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+    yield (
+        "calendar_dates.txt",
+        ("service_id", "date", "exception_type"),
+        (
+            (date.strftime(DATE_FORMAT), date.strftime(DATE_FORMAT), 1)
+            for date in service_dates
+        ),
+    )
+    yield (
+        "trips.txt",
+        ("route_id", "service_id", "trip_id", "trip_short_name"),
+        _trips(tz),
+    )
+    yield (
+        "stop_times.txt",
+        ("trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"),
+        _stop_times(tz),
+    )
+
+
+class _Sink:
+    """Unseekable file object collecting what ``zipfile`` writes"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_feed():
+    """Yield a GTFS zip of every station, route and journey in chunks of bytes.
+
+    Stations become stops, routes become GTFS routes, and each journey is a
+    trip with two stop times running on its own service date. Rows are read
+    from server-side cursors and written through ``zipfile`` into a sink
+    that is drained every ``EXPORT_CHUNK_SIZE`` rows, so neither the
+    querysets nor the archive are ever held in memory. Outside a transaction
+    the feed is read from one repeatable-read snapshot, so trips and stop
+    times always agree.
+    """
+    sink = _Sink()
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+                )
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, header, rows in _feed_files():
+                with archive.open(name, "w", force_zip64=True) as member:
+                    text = io.TextIOWrapper(member, encoding="utf-8", newline="")
+                    writer = csv.writer(text)
+                    writer.writerow(header)
+                    for count, row in enumerate(rows, 1):
+                        writer.writerow(row)
+                        if count % settings.EXPORT_CHUNK_SIZE == 0:
+                            yield sink.drain()
+                    text.close()
+                yield sink.drain()
+    yield sink.drain()
+
+
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+
+# File name: (staging table, {column: type}, required columns or None for all)
+STAGING = {
+    "stops.txt": (
+        "gtfs_stop",
+        {
+            "stop_id": "text",
+            "stop_name": "text",
+            "stop_lat": "double precision",
+            "stop_lon": "double precision",
+            "parent_station": "text",
+        },
+        ("stop_id", "stop_name", "stop_lat", "stop_lon"),
+    ),
+    "trips.txt": (
+        "gtfs_trip",
+        {
+            "trip_id": "text",
+            "service_id": "text",
+            "trip_short_name": "text",
+        },
+        ("trip_id", "service_id"),
+    ),
+    "stop_times.txt": (
+        "gtfs_stop_time",
+        {
+            "trip_id": "text",
+            "stop_sequence": "integer",
+            "stop_id": "text",
+            "arrival_time": "text",
+            "departure_time": "text",
+        },
+        ("trip_id", "stop_sequence", "stop_id", "arrival_time", "departure_time"),
+    ),
+    "calendar.txt": (
+        "gtfs_calendar",
+        {
+            "service_id": "text",
+            **{day: "integer" for day in WEEKDAYS},
+            "start_date": "date",
+            "end_date": "date",
+        },
+        None,
+    ),
+    "calendar_dates.txt": (
+        "gtfs_calendar_date",
+        {"service_id": "text", "date": "date", "exception_type": "integer"},
+        None,
+    ),
+}
+
+REQUIRED_FILES = ("agency.txt", "stops.txt", "trips.txt", "stop_times.txt")
+
+# Seconds since the start of the service day of a GTFS "H:MM:SS" time
+SECONDS = (
+    "(split_part({0}, ':', 1)::integer * 3600 "
+    "+ split_part({0}, ':', 2)::integer * 60 "
+    "+ split_part({0}, ':', 3)::integer)"
+)
+TIME_PATTERN = "^[0-9]{1,3}:[0-5][0-9]:[0-5][0-9]$"
+
+STATION_NAME_LENGTH = Station._meta.get_field("name").max_length
+
+# Tables derived from the staged files, built in order before the checks
+TRANSFORM = (
+    # A stop inside a station (a platform) stands for its parent station
+    "CREATE TEMPORARY TABLE gtfs_station ON COMMIT DROP AS "
+    "SELECT stop.stop_id, "
+    "COALESCE(parent.stop_name, stop.stop_name) AS name, "
+    "COALESCE(parent.stop_lat, stop.stop_lat) AS latitude, "
+    "COALESCE(parent.stop_lon, stop.stop_lon) AS longitude "
+    "FROM gtfs_stop stop "
+    "LEFT JOIN gtfs_stop parent ON parent.stop_id = stop.parent_station",
+    # First departure and last arrival of every trip with two stops or more
+    "CREATE TEMPORARY TABLE gtfs_span ON COMMIT DROP AS "
+    "SELECT origin.trip_id, origin.stop_id AS source_stop, "
+    "terminus.stop_id AS destination_stop, origin.departure_time AS departs, "
+    "terminus.arrival_time AS arrives "
+    "FROM (SELECT DISTINCT ON (trip_id) trip_id, stop_id, stop_sequence, "
+    "departure_time FROM gtfs_stop_time ORDER BY trip_id, stop_sequence) origin "
+    "JOIN (SELECT DISTINCT ON (trip_id) trip_id, stop_id, stop_sequence, "
+    "arrival_time FROM gtfs_stop_time "
+    "ORDER BY trip_id, stop_sequence DESC) terminus "
+    "ON terminus.trip_id = origin.trip_id "
+    "AND terminus.stop_sequence > origin.stop_sequence",
+)
+
+
+class GTFSImport:
+    """Load the stops and trips of a GTFS zip as stations, routes and journeys.
+
+    The feed's files are streamed through ``COPY`` into temporary staging
+    tables and turned into rows with a handful of set-based statements, so
+    memory stays flat and no model is saved row by row. A trip runs from its
+    first to its last stop: that pair becomes a ``Route`` (the distance is
+    the great-circle distance) and every service date of the trip becomes a
+    ``Journey``. The train is the existing train named like the trip's
+    ``trip_short_name``, else ``train``.
+
+    Stations and routes that already exist are reused, and journeys that
+    departed or already exist are skipped. Everything runs in one
+    transaction, rolled back on any error or when ``dry_run`` is set.
+    """
+
+    def __init__(self, path, train=None):
+        self.path = path
+        self.train = train
+        self.errors = []
+        self.counts = {}
+
+    def run(self, dry_run=False):
+        with transaction.atomic():
+            with zipfile.ZipFile(self.path) as archive:
+                self._load(archive)
+            if dry_run or self.errors:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(
+                    lambda: bump_versions(Station, Route, Train, Journey)
+                )
+        return not self.errors
+
+    def _load(self, archive):
+        names = set(archive.namelist())
+        missing = [name for name in REQUIRED_FILES if name not in names]
+        if not {"calendar.txt", "calendar_dates.txt"} & names:
+            missing.append("calendar.txt or calendar_dates.txt")
+        if missing:
+            self.errors.append(f"Missing files: {', '.join(missing)}")
+            return
+        self.timezone = self._agency_timezone(archive)
+        train_id = None
+        if self.train is not None:
+            train_id = self._train_id(self.train)
+        if self.errors:
+            return
+        with connection.cursor() as cursor:
+            for name, (table, columns, required) in STAGING.items():
+                required = columns if required is None else required
+                self._stage(cursor, archive, name, table, columns, required)
+            if not self.errors:
+                self._transform(cursor, train_id)
+
+    def _reader(self, archive, name):
+        member = archive.open(name)
+        return csv.DictReader(io.TextIOWrapper(member, encoding="utf-8-sig"))
+
+    def _agency_timezone(self, archive):
+        for row in self._reader(archive, "agency.txt"):
+            try:
+                return zoneinfo.ZoneInfo(row.get("agency_timezone", "").strip())
+            except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+                break
+        self.errors.append("agency.txt: A valid agency_timezone is required.")
+
+    def _train_id(self, name):
+        trains = list(Train.objects.filter(name=name).values_list("id", flat=True))
+        if len(trains) != 1:
+            self.errors.append(f"--train: {len(trains)} trains are named {name}.")
+            return None
+        return trains[0]
+
+    def _stage(self, cursor, archive, name, table, columns, required):
+        """COPY the columns of ``name`` into a new staging table ``table``"""
+        definition = ", ".join(f"{column} {kind}" for column, kind in columns.items())
+        cursor.execute(f"DROP TABLE IF EXISTS pg_temp.{table}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {table} ({definition}) ON COMMIT DROP"
+        )
+        if name not in archive.namelist():
+            return
+        reader = self._reader(archive, name)
+        absent = set(required) - set(reader.fieldnames or ())
+        if absent:
+            self.errors.append(f"{name}: Missing columns: {', '.join(sorted(absent))}")
+            return
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        try:
+            with transaction.atomic(), cursor.copy(sql) as copy:
+                for row in reader:
+                    copy.write_row([row.get(column) or None for column in columns])
+        except DatabaseError as exc:
+            self.errors.append(f"{name}: {exc}")
+            return
+        cursor.execute(f"ANALYZE {table}")
+        self.counts[name] = reader.line_num - 1
+
+    def _check(self, cursor, message, sql, *params):
+        """Record ``message`` as an error when the count query finds rows"""
+        cursor.execute(sql, params)
+        (count,) = cursor.fetchone()
+        if count:
+            self.errors.append(message.format(count=count))
+
+    def _transform(self, cursor, train_id):
+        cursor.execute(
+            "DROP TABLE IF EXISTS pg_temp.gtfs_station, pg_temp.gtfs_span, "
+            "pg_temp.gtfs_leg, pg_temp.gtfs_service_date"
+        )
+        for statement in TRANSFORM:
+            cursor.execute(statement)
+        self._check(
+            cursor,
+            "stops.txt: {count} stops have no valid stop_lat/stop_lon.",
+            "SELECT count(*) FROM gtfs_station WHERE latitude IS NULL "
+            "OR longitude IS NULL OR abs(latitude) > 90 OR abs(longitude) > 180",
+        )
+        self._check(
+            cursor,
+            "stops.txt: {count} stops have no stop_name or one longer than "
+            f"{STATION_NAME_LENGTH} characters.",
+            "SELECT count(*) FROM gtfs_station "
+            "WHERE name IS NULL OR length(name) > %s",
+            STATION_NAME_LENGTH,
+        )
+        self._check(
+            cursor,
+            "stop_times.txt: {count} trips start or end without a valid time.",
+            "SELECT count(*) FROM gtfs_span "
+            "WHERE departs IS NULL OR arrives IS NULL "
+            "OR departs !~ %s OR arrives !~ %s",
+            TIME_PATTERN,
+            TIME_PATTERN,
+        )
+        self._check(
+            cursor,
+            "stop_times.txt: {count} trips do not arrive after they depart.",
+            "SELECT count(*) FROM gtfs_span "
+            "WHERE departs ~ %s AND arrives ~ %s "
+            f"AND {SECONDS.format('arrives')} <= {SECONDS.format('departs')}",
+            TIME_PATTERN,
+            TIME_PATTERN,
+        )
+        self._check(
+            cursor,
+            "stop_times.txt: {count} trips start or end at a stop not in stops.txt.",
+            "SELECT count(*) FROM gtfs_span span WHERE NOT EXISTS "
+            "(SELECT 1 FROM gtfs_station WHERE stop_id = span.source_stop) "
+            "OR NOT EXISTS "
+            "(SELECT 1 FROM gtfs_station WHERE stop_id = span.destination_stop)",
+        )
+        if train_id is None:
+            self._check(
+                cursor,
+                "trips.txt: {count} trips have no trip_short_name matching one "
+                "train; pass --train.",
+                "SELECT count(*) FROM gtfs_trip trip LEFT JOIN "
+                "(SELECT name FROM transport_train GROUP BY name "
+                "HAVING count(*) = 1) train ON train.name = trip.trip_short_name "
+                "WHERE train.name IS NULL",
+            )
+        if self.errors:
+            return
+
+        cursor.execute(
+            "INSERT INTO transport_station (name, latitude, longitude) "
+            "SELECT DISTINCT ON (name) name, latitude, longitude "
+            "FROM gtfs_station ORDER BY name "
+            "ON CONFLICT (name) DO NOTHING"
+        )
+        self.counts["stations created"] = cursor.rowcount
+        cursor.execute(
+            "CREATE TEMPORARY TABLE gtfs_leg ON COMMIT DROP AS "
+            "SELECT span.trip_id, "
+            "source.id AS source_id, destination.id AS destination_id, "
+            "round(2 * %s * asin(least(1, sqrt("
+            "power(sin(radians(destination.latitude - source.latitude) / 2), 2) "
+            "+ cos(radians(source.latitude)) * cos(radians(destination.latitude)) "
+            "* power(sin(radians(destination.longitude - source.longitude) / 2), 2)"
+            "))))::integer AS distance, "
+            f"{SECONDS.format('span.departs')} AS departs, "
+            f"{SECONDS.format('span.arrives')} AS arrives "
+            "FROM gtfs_span span "
+            "JOIN gtfs_station source_stop ON source_stop.stop_id = span.source_stop "
+            "JOIN transport_station source ON source.name = source_stop.name "
+            "JOIN gtfs_station destination_stop "
+            "ON destination_stop.stop_id = span.destination_stop "
+            "JOIN transport_station destination "
+            "ON destination.name = destination_stop.name",
+            [EARTH_RADIUS_KM],
+        )
+        cursor.execute(
+            "INSERT INTO transport_route (source_id, destination_id, distance) "
+            "SELECT DISTINCT ON (source_id, destination_id) "
+            "source_id, destination_id, distance FROM gtfs_leg "
+            "ORDER BY source_id, destination_id "
+            "ON CONFLICT (source_id, destination_id) DO NOTHING"
+        )
+        self.counts["routes created"] = cursor.rowcount
+        # Dates a service runs: its weekly calendar plus added dates, less
+        # removed dates
+        cursor.execute(
+            "CREATE TEMPORARY TABLE gtfs_service_date ON COMMIT DROP AS "
+            "SELECT service_id, service_day::date AS date FROM gtfs_calendar, "
+            "generate_series(start_date, end_date, interval '1 day') service_day "
+            f"WHERE (ARRAY[{', '.join(WEEKDAYS)}])"
+            "[extract(isodow FROM service_day)] = 1 "
+            "UNION SELECT service_id, date FROM gtfs_calendar_date "
+            "WHERE exception_type = 1 "
+            "EXCEPT SELECT service_id, date FROM gtfs_calendar_date "
+            "WHERE exception_type = 2"
+        )
+        # A trip repeated in the feed becomes one journey
+        cursor.execute(
+            "INSERT INTO transport_journey "
+            "(route_id, train_id, departure_time, arrival_time) "
+            "SELECT DISTINCT ON (route_id, train_id, departure_time) "
+            "route_id, train_id, departure_time, arrival_time FROM ("
+            "SELECT route.id AS route_id, COALESCE(train.id, %s) AS train_id, "
+            "service_day.start + leg.departs * interval '1 second' "
+            "AS departure_time, "
+            "service_day.start + leg.arrives * interval '1 second' AS arrival_time "
+            "FROM gtfs_leg leg "
+            "JOIN gtfs_trip trip ON trip.trip_id = leg.trip_id "
+            "JOIN gtfs_service_date service ON service.service_id = trip.service_id "
+            "JOIN transport_route route ON route.source_id = leg.source_id "
+            "AND route.destination_id = leg.destination_id "
+            "LEFT JOIN (SELECT name, min(id) AS id FROM transport_train "
+            "GROUP BY name HAVING count(*) = 1) train "
+            "ON train.name = trip.trip_short_name "
+            "CROSS JOIN LATERAL (SELECT ((service.date + time '12:00') "
+            "AT TIME ZONE %s) - interval '12 hours' AS start) service_day"
+            ") candidate "
+            "WHERE departure_time >= now() "
+            "AND NOT EXISTS (SELECT 1 FROM transport_journey journey "
+            "WHERE journey.route_id = candidate.route_id "
+            "AND journey.departure_time = candidate.departure_time "
+            "AND journey.train_id = candidate.train_id) "
+            "ORDER BY route_id, train_id, departure_time, arrival_time",
+            [train_id, str(self.timezone)],
+        )
+        self.counts["journeys created"] = cursor.rowcount
@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.benchmark import CASES, DEFAULT_TOLERANCES, EndpointBenchmark, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot API endpoints in-process on a seeded dataset "
+        "(see seed_scale) and compare the results with a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--email",
+            default="seed0.user1@example.com",
+            help="User to sign in as (default: the first seed_scale user)",
+        )
+        parser.add_argument("--password", default="password")
+        parser.add_argument(
+            "--case",
+            action="append",
+            choices=CASES,
+            dest="cases",
+            help="Case to run, repeatable (default: all)",
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--profile-iterations",
+            type=int,
+            default=5,
+            help="Runs measuring queries and allocations (default: 5)",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument(
+            "--baseline", help="Fail when worse than the results in this JSON file"
+        )
+        for metric, default in DEFAULT_TOLERANCES.items():
+            parser.add_argument(
+                f"--{metric.replace('_', '-')}-tolerance",
+                type=type(default),
+                default=default,
+                dest=f"{metric}_tolerance",
+                help=f"Allowed growth over the baseline (default: {default})",
+            )
+
+    def handle(self, *args, **options):
+        benchmark = EndpointBenchmark(
+            options["email"],
+            options["password"],
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            profile_iterations=options["profile_iterations"],
+            cases=options["cases"] or CASES,
+        )
+        try:
+            results = benchmark.run()
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(
+            f"{'case':<30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'queries':>8} {'alloc KiB':>10}"
+        )
+        for name, metrics in results["results"].items():
+            self.stdout.write(
+                f"{name:<30} {metrics['p50_ms']:>9.2f} {metrics['p95_ms']:>9.2f} "
+                f"{metrics['p99_ms']:>9.2f} {metrics['queries']:>8} "
+                f"{metrics['allocated_bytes'] / 1024:>10.1f}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+            regressions = compare(
+                results,
+                baseline,
+                {
+                    metric: options[f"{metric}_tolerance"]
+                    for metric in DEFAULT_TOLERANCES
+                },
+            )
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError(f"{len(regressions)} metrics regressed.")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from transport.export import COMPRESSIONS, DATASETS, OUTPUT_FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = "Stream a whole table as NDJSON or CSV, optionally zstd compressed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=list(DATASETS))
+        parser.add_argument(
+            "--output-format", choices=list(OUTPUT_FORMATS), default="ndjson"
+        )
+        parser.add_argument("--compression", choices=list(COMPRESSIONS))
+        parser.add_argument(
+            "--output", help="File to write to (default: standard output)"
+        )
+
+    def handle(self, *args, **options):
+        _, _, chunks = export_stream(
+            options["dataset"], options["output_format"], options["compression"]
+        )
+        if options["output"] is None:
+            self._write(chunks, sys.stdout.buffer)
+            return
+        with open(options["output"], "wb") as output:
+            self._write(chunks, output)
+
+    @staticmethod
+    def _write(chunks, output):
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from transport.gtfs import export_feed
+
+
+class Command(BaseCommand):
+    help = "Write stations, routes and journeys as a GTFS zip"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the zip file to write")
+
+    def handle(self, *args, **options):
+        with open(options["output"], "wb") as output:
+            for chunk in export_feed():
+                output.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
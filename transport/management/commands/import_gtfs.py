@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.gtfs import GTFSImport
+
+
+class Command(BaseCommand):
+    help = "Load the stops and trips of a GTFS zip as stations, routes and journeys"
+
+    def add_arguments(self, parser):
+        parser.add_argument("feed", help="Path of the GTFS zip")
+        parser.add_argument(
+            "--train",
+            help="Name of the train running trips whose trip_short_name "
+            "matches no train",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate and load everything, report and roll back",
+        )
+
+    def handle(self, *args, **options):
+        importer = GTFSImport(options["feed"], train=options["train"])
+        importer.run(dry_run=options["dry_run"])
+        for name, count in importer.counts.items():
+            self.stdout.write(f"{name}: {count}")
+        if importer.errors:
+            for error in importer.errors:
+                self.stderr.write(error)
+            raise CommandError("The feed is invalid, nothing was imported")
+        if options["dry_run"]:
+            self.stdout.write("Dry run, rolled back")
+        else:
+            self.stdout.write(self.style.SUCCESS("Imported"))
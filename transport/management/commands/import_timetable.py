@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.timetable_import import BATCH_SIZE, TimetableImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Load stations, routes, trains, crew, journeys and journey crew from "
+        "CSV files in a directory (<name>.csv), using COPY for journeys"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory holding the CSV files")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate everything, report errors and roll back",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Rows validated per batch (default: {BATCH_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        importer = TimetableImport(options["directory"], options["batch_size"])
+        started = time.monotonic()
+        importer.run(dry_run=options["dry_run"])
+        elapsed = time.monotonic() - started
+
+        for name, counts in importer.counts.items():
+            summary = ", ".join(f"{count} {label}" for label, count in counts.items())
+            self.stdout.write(f"{name}: {summary}")
+        for error in importer.errors:
+            self.stderr.write(error)
+        if importer.error_count:
+            raise CommandError(
+                f"{importer.error_count} invalid rows, nothing was imported"
+            )
+        if options["dry_run"]:
+            self.stdout.write(f"Dry run finished in {elapsed:.1f}s, rolled back")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Imported in {elapsed:.1f}s"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from transport.booking import reconcile_occupancy
+from transport.models import Journey
+
+# Journeys recounted, and locked, per transaction
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the seat occupancy of every journey from its tickets and "
+        "holds, fixing counters that drifted (run periodically)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fixed = 0
+        last_id = 0
+        while True:
+            journey_ids = list(
+                Journey.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: options["batch_size"]]
+            )
+            if not journey_ids:
+                break
+            fixed += reconcile_occupancy(journey_ids)
+            last_id = journey_ids[-1]
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled occupancy: {fixed} journeys fixed")
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from transport.booking import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Delete expired seat holds in one statement (run periodically)"
+
+    def handle(self, *args, **options):
+        deleted = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Released {deleted} expired seat holds"))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.scale_seed import DEFAULTS, ScaleSeed
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic network, timetable and booking "
+        "history for load and scale testing (10M tickets by default)"
+    )
+
+    def add_arguments(self, parser):
+        for option, help_text in (
+            ("seed", "Random seed; the same seed gives the same dataset"),
+            ("stations", "Number of stations"),
+            ("routes", "Number of routes between neighbouring stations"),
+            ("trains", "Number of trains"),
+            ("crew", "Number of crew members"),
+            ("users", "Number of users, all with the password 'password'"),
+            ("days", "Days of journeys, starting tomorrow"),
+            ("journeys_per_day", "Journeys per route and day"),
+            ("tickets", "Approximate number of tickets sold"),
+        ):
+            parser.add_argument(
+                f"--{option.replace('_', '-')}",
+                type=int,
+                default=DEFAULTS[option],
+                help=f"{help_text} (default: {DEFAULTS[option]})",
+            )
+        parser.add_argument(
+            "--sold-out",
+            type=float,
+            default=DEFAULTS["sold_out"],
+            help=f"Share of sold-out journeys (default: {DEFAULTS['sold_out']})",
+        )
+
+    def handle(self, *args, **options):
+        seed = ScaleSeed(
+            log=self.stdout.write,
+            **{option: options[option] for option in DEFAULTS},
+        )
+        started = time.monotonic()
+        try:
+            seed.run()
+        except ValueError as exc:
+            raise CommandError(exc)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {seed.counts['tickets']} tickets "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+        )
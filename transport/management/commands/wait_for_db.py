@@ -1,19 +1,57 @@
 import time
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
 from django.db.utils import OperationalError
 
 
 class Command(BaseCommand):
+    help = "Wait until the database accepts queries and report pool statistics"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Database alias to check (default: default)",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="Give up and exit with an error after this many seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between attempts (default: 1)",
+        )
 
     def handle(self, *args, **options):
         self.stdout.write("Waiting for database...")
-        db_conn = None
-        while not db_conn:
+        db_conn = connections[options["database"]]
+        started = time.monotonic()
+        while True:
             try:
-                db_conn = connections["default"]
+                with db_conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                break
             except OperationalError:
+                db_conn.close()
+                if (
+                    options["timeout"] is not None
+                    and time.monotonic() - started >= options["timeout"]
+                ):
+                    raise CommandError("Database is not available")
                 self.stdout.write("Database is not ready...")
-                time.sleep(1)
+                time.sleep(options["interval"])
 
         self.stdout.write(self.style.SUCCESS("Database is available"))
+
+        pool = getattr(db_conn, "pool", None)
+        if pool is not None:
+            stats = pool.get_stats()
+            self.stdout.write(
+                "Connection pool: "
+                + ", ".join(f"{key}={value}" for key, value in sorted(stats.items()))
+            )
@@ -0,0 +1,33 @@
+import os
+import threading
+from collections import defaultdict
+
+_counters = defaultdict(int)
+_counters_lock = threading.Lock()
+_gauges = {}
+
+
+def increment(name, value=1):
+    with _counters_lock:
+        _counters[name] += value
+
+
+def register_gauge(name, callback):
+    """Report ``callback()`` under ``name`` in every snapshot"""
+    _gauges[name] = callback
+
+
+def snapshot():
+    """Counters and gauges of the current process"""
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        "pid": os.getpid(),
+        "counters": counters,
+        "gauges": {name: callback() for name, callback in _gauges.items()},
+    }
+
+
+def reset():
+    with _counters_lock:
+        _counters.clear()
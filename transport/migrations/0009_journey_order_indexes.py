@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-16 23:12
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transport", "0008_seathold"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="journey",
+            index=models.Index(
+                fields=["departure_time", "id"], name="transport_j_departu_45f34f_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="journey",
+            index=models.Index(
+                fields=["route", "departure_time"],
+                name="transport_j_route_i_7c59ba_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="journey",
+            index=models.Index(
+                fields=["train", "departure_time"],
+                name="transport_j_train_i_c5199e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="journey",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["arrival_time"], name="transport_j_arrival_87ae7f_brin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="transport_o_user_id_730d5f_idx",
+            ),
+        ),
+    ]
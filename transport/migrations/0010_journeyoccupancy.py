@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-16 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL = """
+INSERT INTO transport_journeyoccupancy (journey_id, capacity, sold, held)
+SELECT
+    journey.id,
+    train.cargo_num * train.places_in_cargo,
+    coalesce(tickets.count, 0),
+    coalesce(holds.count, 0)
+FROM transport_journey journey
+JOIN transport_train train ON train.id = journey.train_id
+LEFT JOIN (
+    SELECT journey_id, count(*) FROM transport_ticket GROUP BY journey_id
+) tickets ON tickets.journey_id = journey.id
+LEFT JOIN (
+    SELECT journey_id, count(*) FROM transport_seathold GROUP BY journey_id
+) holds ON holds.journey_id = journey.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transport", "0009_journey_order_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JourneyOccupancy",
+            fields=[
+                (
+                    "journey",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="occupancy",
+                        serialize=False,
+                        to="transport.journey",
+                    ),
+                ),
+                ("capacity", models.IntegerField()),
+                ("sold", models.IntegerField(default=0)),
+                ("held", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
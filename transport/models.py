@@ -1,4 +1,7 @@
+import uuid
+
 from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
@@ -81,6 +84,17 @@ class Journey(models.Model):
     arrival_time = models.DateTimeField()
     crew = models.ManyToManyField(Crew, related_name="journeys")
 
+    class Meta:
+        indexes = [
+            # Keyset pages and departure_after ranges
+            models.Index(fields=["departure_time", "id"]),
+            # route/train filters, ordered or bounded by departure
+            models.Index(fields=["route", "departure_time"]),
+            models.Index(fields=["train", "departure_time"]),
+            # Rows arrive roughly in time order, so a BRIN index stays tiny
+            BrinIndex(fields=["arrival_time"]),
+        ]
+
     def clean(self):
         if self.departure_time < timezone.now():
             raise ValidationError(
@@ -113,6 +127,7 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["user", "-created_at", "-id"])]
 
 
 class Ticket(models.Model):
@@ -165,3 +180,57 @@ class Ticket(models.Model):
     class Meta:
         unique_together = ("journey", "cargo", "seat")
         ordering = ["cargo", "seat"]
+
+
+class SeatHold(models.Model):
+    """A seat reserved for a user until ``expires_at``.
+
+    Seats reserved together share a ``hold_id`` and are confirmed into one
+    order. Expired rows keep their seat until they are deleted in bulk by
+    the next hold on the journey or by ``release_expired_holds``.
+    """
+
+    hold_id = models.UUIDField(default=uuid.uuid4, db_index=True)
+    cargo = models.IntegerField(validators=[MinValueValidator(0)])
+    seat = models.IntegerField(validators=[MinValueValidator(0)])
+    journey = models.ForeignKey(Journey, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"Hold on journey ID {self.journey_id} (cargo: {self.cargo}, seat: {self.seat})"
+
+    class Meta:
+        unique_together = ("journey", "cargo", "seat")
+        ordering = ["cargo", "seat"]
+
+
+class JourneyOccupancy(models.Model):
+    """Seats sold and held on a journey, kept in step with its rows.
+
+    Every ticket or hold write adjusts the counters in the same transaction
+    (see ``booking.adjust_occupancy``), so availability is read without
+    counting tickets. ``reconcile_occupancy`` repairs drift from writes that
+    bypass the booking code. Held seats include expired holds until they
+    are released.
+    """
+
+    journey = models.OneToOneField(
+        Journey,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="occupancy",
+    )
+    capacity = models.IntegerField()
+    sold = models.IntegerField(default=0)
+    held = models.IntegerField(default=0)
+
+    @property
+    def seats_available(self):
+        return self.capacity - self.sold - self.held
+
+    def __str__(self) -> str:
+        return (
+            f"Journey ID {self.journey_id} "
+            f"(sold: {self.sold}, held: {self.held}, capacity: {self.capacity})"
+        )
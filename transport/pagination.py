@@ -0,0 +1,212 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import datetime
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    CursorPagination,
+    PageNumberPagination,
+)
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """Forward-only keyset pagination over the view's ``keyset_ordering``.
+
+    The cursor holds the ordering values of the last row of the page, so the
+    next page is a range scan starting after that row: no COUNT and no
+    OFFSET, whatever the depth.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([obj async for obj in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        """Return the unevaluated page, with one extra row to detect a next page"""
+        self.request = request
+        self.ordering = tuple(getattr(view, "keyset_ordering", ("id",)))
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            position = self._parse_position(position, queryset.model)
+            queryset = queryset.filter(self._after(position))
+        return queryset[: self.page_size + 1]
+
+    def _set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        self.next_position = self._position(self.page[-1]) if self.has_next else None
+        self.display_page_controls = self.has_next
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_previous_link(self):
+        return None
+
+    def encode_cursor(self, position):
+        encoded = b64encode(json.dumps(position).encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(b64decode(encoded.encode("ascii")).decode("ascii"))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def _parse_position(self, position, model):
+        """Convert the cursor values with their ordering field's ``to_python``"""
+        parsed = []
+        for field, value in zip(self.ordering, position):
+            if value is None or isinstance(value, (list, dict)):
+                raise NotFound(self.invalid_cursor_message)
+            model_field = model._meta.get_field(field.lstrip("-"))
+            try:
+                parsed.append(model_field.to_python(value))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return parsed
+
+    def _position(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip("-"))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def _after(self, position):
+        """Build ``(a, b, ...) > (x, y, ...)`` honouring each field's direction"""
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                previous.lstrip("-"): position[previous_index]
+                for previous_index, previous in enumerate(self.ordering[:index])
+            }
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": position[index]}))
+        return reduce(or_, conditions)
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """Page number pagination that can also run on the async ORM"""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property; fill it without a sync query
+        paginator.__dict__["count"] = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+        self.page.object_list = [obj async for obj in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        return list(self.page)
+
+
+class PageNumberOrKeysetPagination(BasePagination):
+    """Page number pagination with an opt-in keyset mode.
+
+    Requests with ``?pagination=cursor`` or a ``cursor`` parameter are paged
+    with :class:`KeysetPagination`, every other request keeps the page
+    number behaviour.
+    """
+
+    mode_query_param = "pagination"
+
+    def __init__(self):
+        self.page_number = AsyncPageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.paginator = self.page_number
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, "display_page_controls", False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self._select_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view=view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self._select_paginator(request)
+        return await self.paginator.apaginate_queryset(queryset, request, view=view)
+
+    def _select_paginator(self, request):
+        if (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.keyset.cursor_query_param in request.query_params
+        ):
+            self.paginator = self.keyset
+        else:
+            self.paginator = self.page_number
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.page_number.get_schema_operation_parameters(view),
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to 'cursor' for keyset pagination without "
+                "a total count.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            *self.keyset.get_schema_operation_parameters(view),
+        ]
@@ -0,0 +1,145 @@
+import heapq
+import math
+
+from transport.cache import VersionedObject
+from transport.models import Route, Station
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RouteGraph:
+    """Directed Station graph with one edge per Route.
+
+    ``plan`` runs A* with a great-circle heuristic. The heuristic is scaled by
+    the smallest ``distance / great-circle`` ratio over all routes, so it never
+    overestimates even when route distances are shorter than the geometry.
+    """
+
+    def __init__(self, stations=(), routes=()):
+        self.coordinates = {}
+        self.adjacency = {}
+        self.edges = {}
+        for station_id, latitude, longitude in stations:
+            self.coordinates[station_id] = (latitude, longitude)
+        for route_id, source_id, destination_id, distance in routes:
+            self.edges[route_id] = (source_id, destination_id, distance)
+            self.adjacency.setdefault(source_id, []).append(
+                (destination_id, distance, route_id)
+            )
+        self.heuristic_scale = self._heuristic_scale()
+
+    @classmethod
+    def from_database(cls):
+        return cls(
+            Station.objects.values_list("id", "latitude", "longitude"),
+            Route.objects.values_list("id", "source_id", "destination_id", "distance"),
+        )
+
+    def _heuristic_scale(self):
+        scale = 1.0
+        for source_id, destination_id, distance in self.edges.values():
+            straight = self._great_circle(source_id, destination_id)
+            if straight:
+                scale = min(scale, distance / straight)
+        return max(scale, 0.0)
+
+    def _great_circle(self, station1, station2):
+        if station1 not in self.coordinates or station2 not in self.coordinates:
+            return 0.0
+        return haversine_km(*self.coordinates[station1], *self.coordinates[station2])
+
+    def set_station(self, station_id, latitude, longitude):
+        self.coordinates[station_id] = (latitude, longitude)
+        self.heuristic_scale = self._heuristic_scale()
+
+    def remove_station(self, station_id):
+        self.coordinates.pop(station_id, None)
+        for route_id, (source_id, destination_id, _) in list(self.edges.items()):
+            if station_id in (source_id, destination_id):
+                self.remove_route(route_id)
+        self.heuristic_scale = self._heuristic_scale()
+
+    def set_route(self, route_id, source_id, destination_id, distance):
+        self.remove_route(route_id)
+        self.edges[route_id] = (source_id, destination_id, distance)
+        # Replace the list instead of appending so running plans keep a
+        # consistent view of the node's edges.
+        self.adjacency[source_id] = self.adjacency.get(source_id, []) + [
+            (destination_id, distance, route_id)
+        ]
+        straight = self._great_circle(source_id, destination_id)
+        if straight:
+            self.heuristic_scale = max(
+                min(self.heuristic_scale, distance / straight), 0.0
+            )
+
+    def remove_route(self, route_id):
+        edge = self.edges.pop(route_id, None)
+        if edge is None:
+            return
+        source_id = edge[0]
+        self.adjacency[source_id] = [
+            item for item in self.adjacency.get(source_id, []) if item[2] != route_id
+        ]
+        self.heuristic_scale = self._heuristic_scale()
+
+    def plan(self, source_id, destination_id):
+        """Return ``(distance, legs)`` of the shortest path or None.
+
+        Each leg is a ``(route_id, source_id, destination_id, distance)`` tuple.
+        """
+        if source_id == destination_id:
+            return 0, []
+
+        def heuristic(station_id):
+            return self.heuristic_scale * self._great_circle(
+                station_id, destination_id
+            )
+
+        best = {source_id: 0}
+        previous = {}
+        queue = [(heuristic(source_id), 0, source_id)]
+        while queue:
+            _, cost, station_id = heapq.heappop(queue)
+            if station_id == destination_id:
+                legs = []
+                while station_id != source_id:
+                    leg = previous[station_id]
+                    legs.append(leg)
+                    station_id = leg[1]
+                return cost, legs[::-1]
+            if cost > best.get(station_id, math.inf):
+                continue
+            for next_id, distance, route_id in self.adjacency.get(station_id, ()):
+                next_cost = cost + distance
+                if next_cost < best.get(next_id, math.inf):
+                    best[next_id] = next_cost
+                    previous[next_id] = (route_id, station_id, next_id, distance)
+                    heapq.heappush(
+                        queue, (next_cost + heuristic(next_id), next_cost, next_id)
+                    )
+        return None
+
+
+route_graph = VersionedObject((Route, Station), RouteGraph.from_database)
+
+
+def get_route_graph():
+    """Return the process-wide graph, reloading it after changes made elsewhere"""
+    return route_graph.get()
+
+
+def reset_route_graph():
+    route_graph.reset()
@@ -0,0 +1,462 @@
+import contextlib
+import datetime
+import functools
+import math
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from transport.cache import bump_versions
+from transport.models import (
+    Crew,
+    Journey,
+    JourneyOccupancy,
+    Order,
+    Route,
+    Station,
+    Ticket,
+    Train,
+    TrainType,
+)
+from transport.routing import haversine_km
+
+# Sized so that the defaults sell 10M tickets at a load of about 45%
+DEFAULTS = {
+    "seed": 0,
+    "stations": 200,
+    "routes": 400,
+    "trains": 300,
+    "crew": 1000,
+    "users": 100000,
+    "days": 60,
+    "journeys_per_day": 2,
+    "tickets": 10000000,
+    "sold_out": 0.05,
+}
+
+# Type name: (speed in km/h, cargo range, places per cargo range)
+TRAIN_TYPES = {
+    "Regional": (80, (2, 6), (60, 90)),
+    "Intercity": (120, (6, 12), (50, 70)),
+    "Express": (160, (8, 14), (40, 60)),
+    "Night": (90, (8, 12), (20, 40)),
+}
+
+# Routes join a station to one of its nearest neighbours, in both directions
+NEIGHBOURS = 8
+
+# Seats booked together in one order, drawn per journey
+GROUP_SIZES = (1, 1, 1, 2, 2, 3, 4)
+
+FIRST_NAMES = ("Anna", "Ben", "Chloe", "David", "Emma", "Felix", "Grace", "Hugo")
+LAST_NAMES = ("Adams", "Brown", "Clark", "Davis", "Evans", "Fisher", "Green", "Hall")
+
+BATCH_SIZE = 10000
+
+STAGING_TABLES = (
+    "CREATE TEMPORARY TABLE seed_user ("
+    "position integer NOT NULL, id bigint NOT NULL"
+    ") ON COMMIT DROP",
+    # One row per journey, driving the generation of its orders and tickets
+    """
+CREATE TEMPORARY TABLE seed_load (
+    position integer NOT NULL,
+    journey_id bigint NOT NULL,
+    capacity integer NOT NULL,
+    places integer NOT NULL,
+    sold integer NOT NULL,
+    group_size integer NOT NULL,
+    seat_offset integer NOT NULL,
+    seat_step integer NOT NULL,
+    first_order bigint NOT NULL
+) ON COMMIT DROP
+""",
+)
+
+# Orders of a journey get consecutive ids and a pseudo-random user; they
+# were placed up to 60 days before the seed ran
+INSERT_ORDERS = """
+INSERT INTO transport_order (id, user_id, created_at)
+SELECT
+    load.first_order + number,
+    seed_user.id,
+    %s::timestamptz
+        - ((load.position * 31 + number * 17) %% 1440) * interval '1 hour'
+FROM seed_load load
+CROSS JOIN generate_series(
+    0, (load.sold + load.group_size - 1) / load.group_size - 1
+) AS number
+JOIN seed_user
+    ON seed_user.position = (load.position * 7919 + number * 104729) %% %s
+"""
+
+# Seat ``i`` of a journey is its ``seat_offset + i * seat_step``-th place;
+# the step is coprime with the capacity, so seats never repeat and sold
+# seats are spread over the whole train
+INSERT_TICKETS = """
+INSERT INTO transport_ticket (order_id, journey_id, cargo, seat)
+SELECT
+    load.first_order + i / load.group_size,
+    load.journey_id,
+    (load.seat_offset + i::bigint * load.seat_step) % load.capacity
+        / load.places + 1,
+    (load.seat_offset + i::bigint * load.seat_step) % load.capacity
+        % load.places + 1
+FROM seed_load load, generate_series(0, load.sold - 1) AS i
+"""
+
+
+class ScaleSeed:
+    """Generate a synthetic network and booking history at production scale.
+
+    Stations, routes, trains, crew, users and journeys are drawn from one
+    ``random.Random(seed)``, so a seed always describes the same dataset.
+    Journeys run every day for ``days`` days from tomorrow, and each one
+    gets a load factor: ``sold_out`` of them are full and the rest follow a
+    beta distribution whose mean makes the total about ``tickets``.
+
+    Small tables go through ``bulk_create`` and journeys through ``COPY``.
+    Orders and tickets never pass through Python: one row per journey is
+    copied to a staging table and ``generate_series`` expands it in SQL.
+    Everything runs in one transaction; tables are analyzed afterwards.
+    Ids are reserved in blocks, so seed a database nothing else writes to.
+    """
+
+    def __init__(self, log=None, **options):
+        unknown = set(options) - set(DEFAULTS)
+        if unknown:
+            raise TypeError(f"Unknown options: {', '.join(sorted(unknown))}")
+        self.options = {**DEFAULTS, **options}
+        self.random = random.Random(self.options["seed"])
+        self.prefix = f"Seed {self.options['seed']}"
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    def run(self):
+        if Station.objects.filter(name__startswith=f"{self.prefix} ").exists():
+            raise ValueError(f"Seed {self.options['seed']} is already loaded.")
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self._step("stations", self._create_stations)
+                self._step("routes", self._create_routes)
+                self._step("trains", self._create_trains)
+                self._step("crew", self._create_crew)
+                self._step("users", self._create_users)
+                self._step("journeys", self._create_journeys, cursor)
+                with self._foreign_keys_checked_in_bulk(cursor, Order, Ticket):
+                    self._step("orders", self._create_orders, cursor)
+                    self._step("tickets", self._create_tickets, cursor)
+            transaction.on_commit(
+                functools.partial(
+                    bump_versions, Station, Route, TrainType, Train, Crew, Journey
+                )
+            )
+        with connection.cursor() as cursor:
+            self._step("analyze", self._analyze, cursor)
+        return self.counts
+
+    def _step(self, name, create, *args):
+        started = time.monotonic()
+        count = create(*args)
+        if count is not None:
+            self.counts[name] = count
+            self.log(f"{name}: {count} in {time.monotonic() - started:.1f}s")
+
+    @contextlib.contextmanager
+    def _foreign_keys_checked_in_bulk(self, cursor, *models):
+        """Drop the models' foreign keys and add them back when done.
+
+        Deferred foreign keys are checked row by row at commit, which costs
+        more than generating the rows; adding a constraint validates all of
+        them with one join instead.
+        """
+        # Tables with pending deferred checks cannot be altered
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        constraints = []
+        for model in models:
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = %s::regclass AND contype = 'f'",
+                [model._meta.db_table],
+            )
+            for name, definition in cursor.fetchall():
+                table = connection.ops.quote_name(model._meta.db_table)
+                name = connection.ops.quote_name(name)
+                cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+                constraints.append((table, name, definition))
+        yield
+        started = time.monotonic()
+        for table, name, definition in constraints:
+            cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        self.log(f"foreign keys: checked in {time.monotonic() - started:.1f}s")
+
+    def _bulk_create(self, model, objects):
+        return model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+    def _reserve_ids(self, cursor, model, count):
+        """Take ``count`` consecutive ids from ``model``'s sequence"""
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id')", [model._meta.db_table]
+        )
+        (sequence,) = cursor.fetchone()
+        cursor.execute(
+            "SELECT setval(%s::regclass, nextval(%s::regclass) + %s - 1)",
+            [sequence, sequence, count],
+        )
+        (last,) = cursor.fetchone()
+        return last - count + 1
+
+    def _create_stations(self):
+        self.stations = self._bulk_create(
+            Station,
+            [
+                Station(
+                    name=f"{self.prefix} Station {number}",
+                    latitude=round(self.random.uniform(36.0, 60.0), 5),
+                    longitude=round(self.random.uniform(-9.0, 30.0), 5),
+                )
+                for number in range(1, self.options["stations"] + 1)
+            ],
+        )
+        return len(self.stations)
+
+    def _nearest(self, station):
+        return sorted(
+            (other for other in self.stations if other is not station),
+            key=lambda other: haversine_km(
+                station.latitude, station.longitude, other.latitude, other.longitude
+            ),
+        )[:NEIGHBOURS]
+
+    def _create_routes(self):
+        count = self.options["routes"]
+        if count > len(self.stations) * min(NEIGHBOURS, len(self.stations) - 1):
+            raise ValueError(
+                f"{count} routes need more than {len(self.stations)} stations."
+            )
+        neighbours = {}
+        pairs = {}
+        while len(pairs) < count:
+            source = self.random.choice(self.stations)
+            if source.pk not in neighbours:
+                neighbours[source.pk] = self._nearest(source)
+            destination = self.random.choice(neighbours[source.pk])
+            for pair in ((source, destination), (destination, source)):
+                if len(pairs) < count:
+                    pairs.setdefault((pair[0].pk, pair[1].pk), pair)
+        self.routes = self._bulk_create(
+            Route,
+            [
+                Route(
+                    source=source,
+                    destination=destination,
+                    distance=max(
+                        1,
+                        round(
+                            haversine_km(
+                                source.latitude,
+                                source.longitude,
+                                destination.latitude,
+                                destination.longitude,
+                            )
+                        ),
+                    ),
+                )
+                for source, destination in pairs.values()
+            ],
+        )
+        return len(self.routes)
+
+    def _create_trains(self):
+        train_types = {
+            name: TrainType.objects.get_or_create(name=name)[0]
+            for name in TRAIN_TYPES
+        }
+        trains = []
+        for number in range(1, self.options["trains"] + 1):
+            name = self.random.choice(list(TRAIN_TYPES))
+            _, cargo_range, places_range = TRAIN_TYPES[name]
+            trains.append(
+                Train(
+                    name=f"{self.prefix} {name} {number}",
+                    cargo_num=self.random.randint(*cargo_range),
+                    places_in_cargo=self.random.randint(*places_range),
+                    train_type=train_types[name],
+                )
+            )
+        self.trains = self._bulk_create(Train, trains)
+        return len(self.trains)
+
+    def _create_crew(self):
+        self.crew = self._bulk_create(
+            Crew,
+            [
+                Crew(
+                    first_name=self.random.choice(FIRST_NAMES),
+                    last_name=f"{self.random.choice(LAST_NAMES)} {number}",
+                )
+                for number in range(1, self.options["crew"] + 1)
+            ],
+        )
+        return len(self.crew)
+
+    def _create_users(self):
+        # Hashing is slow on purpose; everyone shares the password "password"
+        password = make_password("password")
+        users = self._bulk_create(
+            get_user_model(),
+            [
+                get_user_model()(
+                    email=f"seed{self.options['seed']}.user{number}@example.com",
+                    first_name=self.random.choice(FIRST_NAMES),
+                    last_name=self.random.choice(LAST_NAMES),
+                    password=password,
+                )
+                for number in range(1, self.options["users"] + 1)
+            ],
+        )
+        self.user_ids = [user.pk for user in users]
+        return len(users)
+
+    def _schedule(self):
+        """Yield ``(route, train, departure, arrival)`` for every journey"""
+        first_day = timezone.localdate() + datetime.timedelta(days=1)
+        per_day = self.options["journeys_per_day"]
+        for day in range(self.options["days"]):
+            date = first_day + datetime.timedelta(days=day)
+            for route in self.routes:
+                for number in range(per_day):
+                    train = self.random.choice(self.trains)
+                    speed = TRAIN_TYPES[train.train_type.name][0]
+                    # Departures spread from 05:00 to 22:00
+                    minutes = int((number + self.random.random()) * 1020 / per_day)
+                    departure = timezone.make_aware(
+                        datetime.datetime.combine(date, datetime.time(5))
+                        + datetime.timedelta(minutes=minutes - minutes % 5)
+                    )
+                    duration = max(20, round(route.distance * 60 / speed))
+                    yield (
+                        route,
+                        train,
+                        departure,
+                        departure + datetime.timedelta(minutes=duration),
+                    )
+
+    def _create_journeys(self, cursor):
+        schedule = list(self._schedule())
+        first_id = self._reserve_ids(cursor, Journey, len(schedule))
+        self.journeys = []
+        with cursor.copy(
+            f"COPY {Journey._meta.db_table} "
+            "(id, route_id, train_id, departure_time, arrival_time) FROM STDIN"
+        ) as copy:
+            for journey_id, (route, train, departure, arrival) in enumerate(
+                schedule, start=first_id
+            ):
+                copy.write_row((journey_id, route.pk, train.pk, departure, arrival))
+                self.journeys.append((journey_id, train))
+        with cursor.copy(
+            f"COPY {Journey.crew.through._meta.db_table} "
+            "(journey_id, crew_id) FROM STDIN"
+        ) as copy:
+            for journey_id, _ in self.journeys:
+                for member in self.random.sample(self.crew, min(3, len(self.crew))):
+                    copy.write_row((journey_id, member.pk))
+        return len(self.journeys)
+
+    def _loads(self):
+        """Pick the number of seats sold on each journey"""
+        capacities = [
+            train.cargo_num * train.places_in_cargo for _, train in self.journeys
+        ]
+        total = sum(capacities)
+        if self.options["tickets"] and not self.user_ids:
+            raise ValueError("Tickets need at least one user.")
+        if self.options["tickets"] > total:
+            raise ValueError(
+                f"{self.options['tickets']} tickets do not fit in {total} seats; "
+                "add days, routes or journeys per day."
+            )
+        sold_out = [
+            self.random.random() < self.options["sold_out"] for _ in capacities
+        ]
+        full = sum(
+            capacity for capacity, is_full in zip(capacities, sold_out) if is_full
+        )
+        rest = total - full
+        mean = (self.options["tickets"] - full) / rest if rest else 0
+        if not 0 < mean < 1:
+            raise ValueError(
+                "The sold-out share does not match the number of tickets; "
+                "lower --sold-out or change --tickets."
+            )
+        # Beta(2, b) has mean 2 / (2 + b)
+        beta = 2 * (1 - mean) / mean
+        return [
+            capacity
+            if is_full
+            else min(capacity, round(capacity * self.random.betavariate(2, beta)))
+            for capacity, is_full in zip(capacities, sold_out)
+        ]
+
+    def _create_orders(self, cursor):
+        loads = self._loads()
+        rows = []
+        order_count = 0
+        for position, ((journey_id, train), sold) in enumerate(
+            zip(self.journeys, loads)
+        ):
+            capacity = train.cargo_num * train.places_in_cargo
+            step = self.random.randrange(1, capacity) if capacity > 1 else 1
+            while math.gcd(step, capacity) != 1:
+                step = self.random.randrange(1, capacity)
+            group_size = self.random.choice(GROUP_SIZES)
+            rows.append(
+                [
+                    position,
+                    journey_id,
+                    capacity,
+                    train.places_in_cargo,
+                    sold,
+                    group_size,
+                    self.random.randrange(capacity),
+                    step,
+                    order_count,
+                ]
+            )
+            order_count += -(-sold // group_size)
+        first_order = (
+            self._reserve_ids(cursor, Order, order_count) if order_count else 0
+        )
+        cursor.execute("DROP TABLE IF EXISTS pg_temp.seed_user, pg_temp.seed_load")
+        for statement in STAGING_TABLES:
+            cursor.execute(statement)
+        with cursor.copy("COPY seed_user FROM STDIN") as copy:
+            for position, user_id in enumerate(self.user_ids):
+                copy.write_row((position, user_id))
+        with cursor.copy("COPY seed_load FROM STDIN") as copy:
+            for row in rows:
+                row[-1] += first_order
+                copy.write_row(row)
+        cursor.execute("ANALYZE seed_user, seed_load")
+        cursor.execute(INSERT_ORDERS, [timezone.now(), len(self.user_ids)])
+        return cursor.rowcount
+
+    def _create_tickets(self, cursor):
+        cursor.execute(INSERT_TICKETS)
+        count = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {JourneyOccupancy._meta.db_table} "
+            "(journey_id, capacity, sold, held) "
+            "SELECT journey_id, capacity, sold, 0 FROM seed_load"
+        )
+        return count
+
+    def _analyze(self, cursor):
+        for model in (Journey, Journey.crew.through, Order, Ticket, JourneyOccupancy):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
@@ -0,0 +1,156 @@
+import base64
+
+from transport.booking import active_holds
+from transport.models import Ticket
+
+
+class SeatMap:
+    """Occupancy bitmap of a train, one bit per seat.
+
+    Seats are numbered row-major: bit ``(cargo - 1) * places_in_cargo +
+    (seat - 1)`` is set when the seat is taken, most significant bit first.
+    """
+
+    def __init__(self, cargo_num, places_in_cargo, taken=()):
+        self.cargo_num = cargo_num
+        self.places_in_cargo = places_in_cargo
+        self.bits = bytearray((self.capacity + 7) // 8)
+        self.taken = 0
+        for cargo, seat in taken:
+            self.mark_taken(cargo, seat)
+
+    @classmethod
+    def for_journey(cls, journey):
+        """Build the map of a journey from a single query on sold and held seats"""
+        held = active_holds().filter(journey_id=journey.pk)
+        taken = (
+            Ticket.objects.filter(journey_id=journey.pk)
+            .values_list("cargo", "seat")
+            .union(held.values_list("cargo", "seat"), all=True)
+        )
+        return cls(journey.train.cargo_num, journey.train.places_in_cargo, taken)
+
+    @property
+    def capacity(self):
+        return self.cargo_num * self.places_in_cargo
+
+    @property
+    def free(self):
+        return self.capacity - self.taken
+
+    def _index(self, cargo, seat):
+        if not (
+            1 <= cargo <= self.cargo_num and 1 <= seat <= self.places_in_cargo
+        ):
+            return None
+        return (cargo - 1) * self.places_in_cargo + (seat - 1)
+
+    def is_taken(self, cargo, seat):
+        index = self._index(cargo, seat)
+        if index is None:
+            return False
+        return bool(self.bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def mark_taken(self, cargo, seat):
+        index = self._index(cargo, seat)
+        if index is None:
+            return
+        mask = 0x80 >> (index & 7)
+        if not self.bits[index >> 3] & mask:
+            self.bits[index >> 3] |= mask
+            self.taken += 1
+
+    def free_seats(self, cargo):
+        return [
+            seat
+            for seat in range(1, self.places_in_cargo + 1)
+            if not self.is_taken(cargo, seat)
+        ]
+
+    def allocate(self, count):
+        """Take ``count`` free seats and return them as ``(cargo, seat)`` pairs.
+
+        Prefers the shortest run of adjacent free seats that fits the group,
+        then the tightest group of seats within one cargo, then as few cargos
+        as possible. Returns None when fewer than ``count`` seats are free.
+        """
+        if count < 1 or count > self.free:
+            return None
+        free = {
+            cargo: self.free_seats(cargo) for cargo in range(1, self.cargo_num + 1)
+        }
+        seats = self._adjacent(free, count) or self._one_cargo(free, count)
+        if seats is None:
+            seats = []
+            for cargo in sorted(free, key=lambda cargo: -len(free[cargo])):
+                seats += [(cargo, seat) for seat in free[cargo][: count - len(seats)]]
+                if len(seats) == count:
+                    break
+        for cargo, seat in seats:
+            self.mark_taken(cargo, seat)
+        return seats
+
+    @staticmethod
+    def _adjacent(free, count):
+        best = None
+        for cargo, seats in free.items():
+            start = 0
+            for index in range(1, len(seats) + 1):
+                if index < len(seats) and seats[index] == seats[index - 1] + 1:
+                    continue
+                length = index - start
+                if length >= count and (best is None or length < best[2]):
+                    best = (cargo, seats[start], length)
+                start = index
+        if best is None:
+            return None
+        cargo, first, _ = best
+        return [(cargo, first + offset) for offset in range(count)]
+
+    @staticmethod
+    def _one_cargo(free, count):
+        best = None
+        for cargo, seats in free.items():
+            for index in range(len(seats) - count + 1):
+                spread = seats[index + count - 1] - seats[index]
+                if best is None or spread < best[0]:
+                    best = (spread, cargo, seats[index : index + count])
+        if best is None:
+            return None
+        _, cargo, seats = best
+        return [(cargo, seat) for seat in seats]
+
+    def to_bitmap(self):
+        """Return the bitmap as a base64 string"""
+        return base64.b64encode(bytes(self.bits)).decode("ascii")
+
+    def to_rle(self):
+        """Return alternating run lengths of free and taken seats.
+
+        The first run always counts free seats and may be zero.
+        """
+        runs = []
+        position = 0
+        taken_run_start = None
+        for index in self._taken_indexes():
+            if taken_run_start is not None and index == position:
+                position += 1
+                continue
+            if taken_run_start is not None:
+                runs.append(position - taken_run_start)
+            runs.append(index - position)
+            taken_run_start = index
+            position = index + 1
+        if taken_run_start is not None:
+            runs.append(position - taken_run_start)
+        if position < self.capacity or not runs:
+            runs.append(self.capacity - position)
+        return runs
+
+    def _taken_indexes(self):
+        for byte_index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    yield (byte_index << 3) + bit
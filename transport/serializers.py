@@ -1,7 +1,14 @@
-from django.db import transaction
+import datetime
+from collections import Counter
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.validators import UniqueTogetherValidator
 from transport.models import (
     Station,
     TrainType,
@@ -9,9 +16,19 @@ from transport.models import (
     Route,
     Crew,
     Journey,
+    JourneyOccupancy,
     Ticket,
     Order,
+    SeatHold,
+)
+from transport.booking import (
+    adjust_occupancy,
+    lock_journeys,
+    release_bought_holds,
+    release_expired_holds,
+    taken_seats,
 )
+from transport.seat_map import SeatMap
 
 
 class StationSerializer(serializers.ModelSerializer):
@@ -20,6 +37,14 @@ class StationSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "latitude", "longitude")
 
 
+class StationDistanceSerializer(StationSerializer):
+    distance = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Station
+        fields = ("id", "name", "latitude", "longitude", "distance")
+
+
 class TrainTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = TrainType
@@ -67,6 +92,27 @@ class RouteDetailSerializer(RouteSerializer):
         fields = ("id", "source", "destination", "distance")
 
 
+class RouteLegSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    source = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    distance = serializers.IntegerField()
+
+
+class RoutePlanSerializer(serializers.Serializer):
+    source = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    distance = serializers.IntegerField()
+    legs = RouteLegSerializer(many=True)
+
+
+class RouteCalendarDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    journeys = serializers.IntegerField()
+    min_seats_available = serializers.IntegerField(allow_null=True)
+    max_seats_available = serializers.IntegerField(allow_null=True)
+
+
 class CrewSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
 
@@ -99,10 +145,28 @@ class JourneyListSerializer(JourneySerializer):
     route = RouteSerializer(many=False, read_only=True)
     train = TrainSerializer(many=False, read_only=True)
     crew = CrewSerializer(many=True, read_only=True)
+    seats_available = serializers.SerializerMethodField()
 
     class Meta:
         model = Journey
-        fields = ("id", "route", "train", "departure_time", "arrival_time", "crew")
+        fields = (
+            "id",
+            "route",
+            "train",
+            "departure_time",
+            "arrival_time",
+            "crew",
+            "seats_available",
+        )
+
+    @extend_schema_field(serializers.IntegerField)
+    def get_seats_available(self, obj):
+        """Read from the counters; select ``occupancy`` with the journeys"""
+        try:
+            return obj.occupancy.seats_available
+        except JourneyOccupancy.DoesNotExist:
+            # Nothing sold yet
+            return obj.train.cargo_num * obj.train.places_in_cargo
 
 
 class JourneyDetailSerializer(JourneySerializer):
@@ -115,7 +179,98 @@ class JourneyDetailSerializer(JourneySerializer):
         fields = ("id", "route", "train", "departure_time", "arrival_time", "crew")
 
 
+class ConnectionLegSerializer(serializers.Serializer):
+    journey = serializers.IntegerField()
+    route = serializers.IntegerField()
+    source = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+
+
+class ConnectionPlanSerializer(serializers.Serializer):
+    source = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    departure_after = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    legs = ConnectionLegSerializer(many=True)
+
+
+class JourneyPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Journey lookup served from journeys preloaded by the list serializer"""
+
+    def __init__(self, **kwargs):
+        self.journeys = None
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if self.journeys is not None and not isinstance(data, bool):
+            try:
+                journey = self.journeys.get(int(data))
+            except (TypeError, ValueError):
+                journey = None
+            if journey is not None:
+                return journey
+        return super().to_internal_value(data)
+
+
+class TicketBulkSerializer(serializers.ListSerializer):
+    """Validates a batch of tickets with one query for their journeys.
+
+    Seat conflicts are left to the serializer saving the batch, which checks
+    them once with ``seat_conflict_errors`` under the journey lock.
+    """
+
+    seat_taken_message = UniqueTogetherValidator.message.format(
+        field_names="journey, cargo, seat"
+    )
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            journey_ids = set()
+            for item in data:
+                if isinstance(item, Mapping):
+                    try:
+                        journey_ids.add(int(item.get("journey")))
+                    except (TypeError, ValueError):
+                        pass
+            self.child.fields["journey"].journeys = Journey.objects.select_related(
+                "train"
+            ).in_bulk(journey_ids)
+        return super().to_internal_value(data)
+
+    @classmethod
+    def seat_conflict_errors(cls, tickets, user=None):
+        """Return per-ticket errors for seats taken, held or repeated in the batch.
+
+        Seats held by ``user`` are free for them.
+        """
+        keys = [
+            (ticket["journey"].pk, ticket["cargo"], ticket["seat"])
+            for ticket in tickets
+        ]
+        taken = taken_seats(keys, user)
+        errors = []
+        for key in keys:
+            if key in taken:
+                errors.append(
+                    {
+                        "non_field_errors": [
+                            ErrorDetail(cls.seat_taken_message, code="unique")
+                        ]
+                    }
+                )
+            else:
+                errors.append({})
+            taken.add(key)
+        return errors if any(errors) else None
+
+
 class TicketSerializer(serializers.ModelSerializer):
+    journey = JourneyPrimaryKeyRelatedField(
+        queryset=Journey.objects.select_related("train")
+    )
+
     def validate(self, attrs):
         data = super(TicketSerializer, self).validate(attrs=attrs)
         Ticket.validate_ticket(
@@ -126,6 +281,9 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = ("id", "cargo", "seat", "journey")
+        list_serializer_class = TicketBulkSerializer
+        # Seat uniqueness is checked for the whole batch when it is saved
+        validators = []
 
 
 class TicketListSerializer(TicketSerializer):
@@ -138,6 +296,26 @@ class TicketSeatsSerializer(TicketSerializer):
         fields = ("cargo", "seat")
 
 
+class SeatMapSerializer(serializers.Serializer):
+    cargo_num = serializers.IntegerField()
+    places_in_cargo = serializers.IntegerField()
+    capacity = serializers.IntegerField()
+    taken = serializers.IntegerField()
+    free = serializers.IntegerField()
+    encoding = serializers.SerializerMethodField()
+    seats = serializers.SerializerMethodField()
+
+    @extend_schema_field(serializers.CharField)
+    def get_encoding(self, obj):
+        return self.context.get("encoding", "bitmap")
+
+    @extend_schema_field(serializers.JSONField)
+    def get_seats(self, obj):
+        if self.get_encoding(obj) == "rle":
+            return obj.to_rle()
+        return obj.to_bitmap()
+
+
 class OrderSerializer(serializers.ModelSerializer):
     tickets = TicketSerializer(
         many=True, read_only=False, allow_empty=False, source="ticket_set"
@@ -150,10 +328,38 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         tickets_data = validated_data.pop("ticket_set")
-        with transaction.atomic():
-            order = Order.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
+        try:
+            with transaction.atomic():
+                # Holds are checked under the journey lock that new holds take
+                lock_journeys({ticket["journey"].pk for ticket in tickets_data})
+                errors = TicketBulkSerializer.seat_conflict_errors(
+                    tickets_data, validated_data.get("user")
+                )
+                if errors:
+                    raise ValidationError({"tickets": errors})
+                order = Order.objects.create(**validated_data)
+                Ticket.objects.bulk_create(
+                    Ticket(order=order, **ticket_data) for ticket_data in tickets_data
+                )
+                adjust_occupancy(
+                    sold=Counter(ticket["journey"].pk for ticket in tickets_data)
+                )
+                # Seats the buyer held are bought now
+                release_bought_holds(
+                    [
+                        (ticket["journey"].pk, ticket["cargo"], ticket["seat"])
+                        for ticket in tickets_data
+                    ],
+                    validated_data.get("user"),
+                )
+        except IntegrityError:
+            # A concurrent order took one of the seats after validation
+            errors = TicketBulkSerializer.seat_conflict_errors(
+                tickets_data, validated_data.get("user")
+            )
+            if errors is None:
+                raise
+            raise ValidationError({"tickets": errors})
         return order
 
 
@@ -164,3 +370,78 @@ class OrderListSerializer(OrderSerializer):
         model = Order
         fields = ("id", "tickets", "created_at", "user")
         read_only_fields = ("user", "created_at")
+
+
+class HeldSeatSerializer(TicketSerializer):
+    class Meta:
+        model = SeatHold
+        fields = ("cargo", "seat", "journey")
+        list_serializer_class = TicketBulkSerializer
+        validators = []
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    """Seats reserved together, confirmed into one order before ``expires_at``"""
+
+    hold_id = serializers.UUIDField(read_only=True)
+    expires_at = serializers.DateTimeField(read_only=True)
+    minutes = serializers.IntegerField(
+        write_only=True,
+        min_value=1,
+        max_value=settings.SEAT_HOLD_MAX_MINUTES,
+        default=settings.SEAT_HOLD_MINUTES,
+    )
+    seats = HeldSeatSerializer(many=True, allow_empty=False)
+
+    def create(self, validated_data):
+        seats = validated_data["seats"]
+        user = validated_data["user"]
+        journey_ids = {seat["journey"].pk for seat in seats}
+        expires_at = timezone.now() + datetime.timedelta(
+            minutes=validated_data["minutes"]
+        )
+        holds = [
+            SeatHold(user=user, expires_at=expires_at, **seat) for seat in seats
+        ]
+        for hold in holds:
+            hold.hold_id = holds[0].hold_id
+        with transaction.atomic():
+            lock_journeys(journey_ids)
+            # Frees the unique (journey, cargo, seat) slots of lapsed holds
+            release_expired_holds(journey_id__in=journey_ids)
+            # The user's own holds count too: a seat is held at most once
+            errors = TicketBulkSerializer.seat_conflict_errors(seats)
+            if errors:
+                raise ValidationError({"seats": errors})
+            SeatHold.objects.bulk_create(holds)
+            adjust_occupancy(held=Counter(hold.journey_id for hold in holds))
+        return {"hold_id": holds[0].hold_id, "expires_at": expires_at, "seats": holds}
+
+
+class SeatAllocationSerializer(serializers.Serializer):
+    """Order ``count`` seats on a journey, chosen by the server"""
+
+    journey = serializers.PrimaryKeyRelatedField(
+        queryset=Journey.objects.select_related("train")
+    )
+    count = serializers.IntegerField(min_value=1, max_value=100)
+
+    def create(self, validated_data):
+        journey = validated_data["journey"]
+        with transaction.atomic():
+            # The seat map is read and written under the journey lock, so
+            # concurrent allocations queue up instead of colliding
+            lock_journeys([journey.pk])
+            seat_map = SeatMap.for_journey(journey)
+            seats = seat_map.allocate(validated_data["count"])
+            if seats is None:
+                raise ValidationError(
+                    {"count": [f"Only {seat_map.free} seats are free on this journey."]}
+                )
+            order = Order.objects.create(user=validated_data["user"])
+            Ticket.objects.bulk_create(
+                Ticket(order=order, journey=journey, cargo=cargo, seat=seat)
+                for cargo, seat in seats
+            )
+            adjust_occupancy(sold={journey.pk: len(seats)})
+        return order
@@ -0,0 +1,126 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from transport.booking import invalidate_calendars, resize_occupancy
+from transport.cache import commit_change
+from transport.models import (
+    Crew,
+    Journey,
+    JourneyOccupancy,
+    Route,
+    Station,
+    Train,
+    TrainType,
+)
+from transport.routing import route_graph
+from transport.spatial import station_index
+from transport.timetable import timetable
+
+
+@receiver(post_save, sender=Station)
+def station_saved(sender, instance, **kwargs):
+    location = (instance.pk, instance.latitude, instance.longitude)
+    commit_change(
+        sender,
+        (route_graph, "set_station", *location),
+        (station_index, "set_station", *location),
+    )
+
+
+@receiver(post_delete, sender=Station)
+def station_deleted(sender, instance, **kwargs):
+    commit_change(
+        sender,
+        (route_graph, "remove_station", instance.pk),
+        (station_index, "remove_station", instance.pk),
+    )
+
+
+@receiver(post_save, sender=Route)
+def route_saved(sender, instance, **kwargs):
+    updates = [
+        (
+            route_graph,
+            "set_route",
+            instance.pk,
+            instance.source_id,
+            instance.destination_id,
+            instance.distance,
+        )
+    ]
+    if not kwargs["created"]:
+        updates.append(
+            (
+                timetable,
+                "set_route",
+                instance.pk,
+                instance.source_id,
+                instance.destination_id,
+            )
+        )
+    commit_change(sender, *updates)
+
+
+@receiver(post_delete, sender=Route)
+def route_deleted(sender, instance, **kwargs):
+    commit_change(sender, (route_graph, "remove_route", instance.pk))
+
+
+@receiver(pre_save, sender=Journey)
+def journey_saving(sender, instance, **kwargs):
+    # A journey moved to another route leaves the old route's calendar stale
+    instance._previous_route_id = (
+        None
+        if instance._state.adding
+        else Journey.objects.filter(pk=instance.pk)
+        .values_list("route_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Journey)
+def journey_saved(sender, instance, **kwargs):
+    invalidate_calendars(
+        {instance.route_id, getattr(instance, "_previous_route_id", None)} - {None}
+    )
+    commit_change(
+        sender,
+        (
+            timetable,
+            "set_journey",
+            instance.pk,
+            instance.route.source_id,
+            instance.route.destination_id,
+            instance.departure_time,
+            instance.arrival_time,
+            instance.route_id,
+        ),
+    )
+    capacity = instance.train.cargo_num * instance.train.places_in_cargo
+    if kwargs["created"]:
+        JourneyOccupancy.objects.create(journey=instance, capacity=capacity)
+    else:
+        # The train, and with it the capacity, may have changed
+        JourneyOccupancy.objects.filter(journey=instance).update(capacity=capacity)
+
+
+@receiver(post_delete, sender=Journey)
+def journey_deleted(sender, instance, **kwargs):
+    invalidate_calendars({instance.route_id})
+    commit_change(sender, (timetable, "remove_journey", instance.pk))
+
+
+@receiver(post_save, sender=Train)
+def train_saved(sender, instance, created, **kwargs):
+    if not created:
+        resize_occupancy(instance)
+
+
+@receiver(post_save, sender=TrainType)
+@receiver(post_delete, sender=TrainType)
+@receiver(post_save, sender=Train)
+@receiver(post_delete, sender=Train)
+@receiver(post_save, sender=Crew)
+@receiver(post_delete, sender=Crew)
+def reference_data_changed(sender, **kwargs):
+    commit_change(sender)
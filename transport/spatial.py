@@ -0,0 +1,178 @@
+import heapq
+import math
+
+from transport.cache import VersionedObject
+from transport.models import Station
+from transport.routing import EARTH_RADIUS_KM, haversine_km
+
+
+def to_unit_vector(latitude, longitude):
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    return (
+        math.cos(phi) * math.cos(lam),
+        math.cos(phi) * math.sin(lam),
+        math.sin(phi),
+    )
+
+
+def km_to_chord(distance_km):
+    """Straight-line distance on the unit sphere for a great-circle distance"""
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+class StationIndex:
+    """k-d tree over stations projected on the unit sphere.
+
+    Chord length grows with great-circle distance, so Euclidean search on the
+    3D points answers radius and nearest queries without special cases at the
+    poles or the antimeridian. Writes update the point set and the tree is
+    rebuilt in memory on the next query.
+    """
+
+    def __init__(self, stations=()):
+        self.stations = {
+            station_id: (latitude, longitude)
+            for station_id, latitude, longitude in stations
+        }
+        self._tree = None
+
+    @classmethod
+    def from_database(cls):
+        return cls(Station.objects.values_list("id", "latitude", "longitude"))
+
+    def set_station(self, station_id, latitude, longitude):
+        self.stations[station_id] = (latitude, longitude)
+        self._tree = None
+
+    def remove_station(self, station_id):
+        if self.stations.pop(station_id, None) is not None:
+            self._tree = None
+
+    @property
+    def tree(self):
+        tree = self._tree
+        if tree is None:
+            tree = self._tree = _KDTree(
+                [
+                    (*to_unit_vector(latitude, longitude), station_id)
+                    for station_id, (latitude, longitude) in self.stations.items()
+                ]
+            )
+        return tree
+
+    def _with_distances(self, latitude, longitude, station_ids):
+        return sorted(
+            (haversine_km(latitude, longitude, *self.stations[station_id]), station_id)
+            for station_id in station_ids
+            if station_id in self.stations
+        )
+
+    def within(self, latitude, longitude, radius_km):
+        """Return ``(distance_km, station_id)`` pairs within the radius, nearest first"""
+        station_ids = self.tree.within(
+            to_unit_vector(latitude, longitude), km_to_chord(radius_km)
+        )
+        return [
+            item
+            for item in self._with_distances(latitude, longitude, station_ids)
+            if item[0] <= radius_km
+        ]
+
+    def nearest(self, latitude, longitude, k):
+        """Return the ``k`` nearest ``(distance_km, station_id)`` pairs"""
+        station_ids = self.tree.nearest(to_unit_vector(latitude, longitude), k)
+        return self._with_distances(latitude, longitude, station_ids)
+
+
+class _KDTree:
+    def __init__(self, points):
+        self.points = []
+        self.left = []
+        self.right = []
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return -1
+        axis = depth % 3
+        points.sort(key=lambda point: point[axis])
+        middle = len(points) // 2
+        node = len(self.points)
+        self.points.append(points[middle])
+        self.left.append(-1)
+        self.right.append(-1)
+        self.left[node] = self._build(points[:middle], depth + 1)
+        self.right[node] = self._build(points[middle + 1 :], depth + 1)
+        return node
+
+    @staticmethod
+    def _distance2(point, query):
+        return (
+            (point[0] - query[0]) ** 2
+            + (point[1] - query[1]) ** 2
+            + (point[2] - query[2]) ** 2
+        )
+
+    def within(self, query, radius):
+        radius2 = radius * radius
+        found = []
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if node < 0:
+                continue
+            point = self.points[node]
+            if self._distance2(point, query) <= radius2:
+                found.append(point[3])
+            axis = depth % 3
+            diff = query[axis] - point[axis]
+            near, far = (
+                (self.left[node], self.right[node])
+                if diff < 0
+                else (self.right[node], self.left[node])
+            )
+            stack.append((near, depth + 1))
+            if diff * diff <= radius2:
+                stack.append((far, depth + 1))
+        return found
+
+    def nearest(self, query, k):
+        # Max-heap of the best k as (-distance2, station_id)
+        best = []
+
+        def visit(node, depth):
+            if node < 0:
+                return
+            point = self.points[node]
+            distance2 = self._distance2(point, query)
+            if len(best) < k:
+                heapq.heappush(best, (-distance2, point[3]))
+            elif distance2 < -best[0][0]:
+                heapq.heapreplace(best, (-distance2, point[3]))
+            axis = depth % 3
+            diff = query[axis] - point[axis]
+            near, far = (
+                (self.left[node], self.right[node])
+                if diff < 0
+                else (self.right[node], self.left[node])
+            )
+            visit(near, depth + 1)
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(far, depth + 1)
+
+        if k > 0:
+            visit(self.root, 0)
+        return [station_id for _, station_id in best]
+
+
+station_index = VersionedObject((Station,), StationIndex.from_database)
+
+
+def get_station_index():
+    """Return the process-wide index, reloading it after changes made elsewhere"""
+    return station_index.get()
+
+
+def reset_station_index():
+    station_index.reset()
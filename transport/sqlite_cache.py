@@ -0,0 +1,173 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Integers are stored as SQLite integers so ``incr`` can run in SQL
+MIN_INTEGER, MAX_INTEGER = -(2**63), 2**63 - 1
+
+# Expired rows are removed once every this many writes per connection
+CULL_INTERVAL = 1000
+
+
+class SQLiteCache(BaseCache):
+    """Cache in a SQLite file shared by every process on the host.
+
+    Each statement runs in its own transaction and SQLite serialises writers,
+    so ``add`` and ``incr`` are atomic across workers: counters such as
+    throttle windows stay exact without a cache server. ``LOCATION`` is the
+    database file; it is created on first use.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        local = self._local
+        # Connections must not cross a fork, so they are keyed by process
+        if getattr(local, "pid", None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+            local.writes = 0
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self.location)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.location, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)"
+        )
+        return connection
+
+    def _encode(self, value):
+        if type(value) is int and MIN_INTEGER <= value <= MAX_INTEGER:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _write(self, sql, params):
+        cursor = self.connection.execute(sql, params)
+        self._local.writes += 1
+        if self._local.writes % CULL_INTERVAL == 0:
+            self._cull()
+        return cursor
+
+    def _cull(self):
+        connection = self.connection
+        connection.execute(
+            "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?",
+            (time.time(),),
+        )
+        (count,) = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)",
+                (count // self._cull_frequency,),
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._write(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = excluded.value, expires = excluded.expires "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (
+                key,
+                self._encode(value),
+                self.get_backend_timeout(timeout),
+                time.time(),
+            ),
+        )
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            "SELECT value FROM cache WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return default
+        return self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self.connection.execute(
+            "SELECT key, value FROM cache WHERE key IN (%s) "
+            "AND (expires IS NULL OR expires > ?)" % ", ".join("?" * len(keys)),
+            (*keys, time.time()),
+        )
+        return {keys[key]: self._decode(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, self._encode(value), self.get_backend_timeout(timeout)),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._write(
+            "UPDATE cache SET expires = ? WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # Fetch every row so the statement, and its write lock, is finished
+        rows = self.connection.execute(
+            "UPDATE cache SET value = value + ? WHERE key = ? "
+            "AND typeof(value) = 'integer' "
+            "AND (expires IS NULL OR expires > ?) RETURNING value",
+            (delta, key, time.time()),
+        ).fetchall()
+        if not rows:
+            raise ValueError(f"Key '{key}' not found or not an integer.")
+        return rows[0][0]
+
+    def clear(self):
+        self.connection.execute("DELETE FROM cache")
@@ -1,9 +1,56 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings, tag
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Station, Route, Crew, TrainType, Train, Journey, Order, Ticket
+from django.contrib.auth.models import AnonymousUser
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import (
+    Station,
+    Route,
+    Crew,
+    TrainType,
+    Train,
+    Journey,
+    JourneyOccupancy,
+    Order,
+    Ticket,
+    SeatHold,
+)
+from . import benchmark, metrics
+from . import urls as transport_urls
+from .async_views import async_read_view
+from .cache import bump_versions
+from .routing import haversine_km, reset_route_graph
+from .seat_map import SeatMap
+from .sqlite_cache import SQLiteCache
+from .throttling import ScopedRateThrottle
+from .spatial import StationIndex, reset_station_index
+from .timetable import Timetable, reset_timetable
+from .serializers import TicketBulkSerializer
+from .views import JourneyViewSet, RouteViewSet
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import base64
+import csv
 import datetime
+import importlib
+import json
+import os
+import random
+import tempfile
+import types
+import zipfile
+import zoneinfo
+import zstandard
 
 
 class StationModelTest(TestCase):
@@ -272,3 +319,2150 @@ class TicketModelTest(TestCase):
         ticket = Ticket(cargo=1, seat=21, journey=self.journey, order=self.order)
         with self.assertRaises(ValidationError):
             ticket.full_clean()
+
+
+class SeatMapTest(TestCase):
+    def test_rle_alternates_free_and_taken_runs(self):
+        seat_map = SeatMap(2, 4, [(1, 1), (1, 2), (2, 1)])
+        self.assertEqual(seat_map.taken, 3)
+        self.assertEqual(seat_map.free, 5)
+        self.assertEqual(seat_map.to_rle(), [0, 2, 2, 1, 3])
+
+    def test_bitmap_is_row_major(self):
+        seat_map = SeatMap(2, 4, [(1, 2), (2, 4)])
+        self.assertTrue(seat_map.is_taken(2, 4))
+        self.assertFalse(seat_map.is_taken(2, 3))
+        self.assertEqual(base64.b64decode(seat_map.to_bitmap()), bytes([0b01000001]))
+
+    def test_allocate_prefers_shortest_adjacent_run(self):
+        # Cargo 1: free 1-2 and 7-8; cargo 2: free 1-3
+        taken = [(1, seat) for seat in range(3, 7)] + [(2, seat) for seat in range(4, 9)]
+        seat_map = SeatMap(2, 8, taken)
+        self.assertEqual(seat_map.allocate(3), [(2, 1), (2, 2), (2, 3)])
+        self.assertEqual(seat_map.allocate(2), [(1, 1), (1, 2)])
+        self.assertTrue(seat_map.is_taken(2, 2))
+
+    def test_allocate_falls_back_to_one_cargo_then_several(self):
+        seat_map = SeatMap(2, 4, [(1, 2), (2, 1), (2, 3)])
+        self.assertEqual(seat_map.allocate(3), [(1, 1), (1, 3), (1, 4)])
+        self.assertEqual(seat_map.allocate(3), None)
+        self.assertEqual(seat_map.allocate(2), [(2, 2), (2, 4)])
+
+        seat_map = SeatMap(3, 2, [(1, 1)])
+        self.assertEqual(
+            seat_map.allocate(5), [(2, 1), (2, 2), (3, 1), (3, 2), (1, 2)]
+        )
+
+
+class ApiTestCase(TestCase):
+    """A user signed in on ``self.client``"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user()
+
+    @classmethod
+    def create_user(cls):
+        return get_user_model().objects.create_user(
+            email="testuser@example.com",
+            password="testpass",
+            first_name="Test",
+            last_name="User",
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class BookingApiTestCase(ApiTestCase):
+    """A route and a train of ``cargo_num`` cargos of ``places_in_cargo`` seats.
+
+    ``journey`` departs ``journey_departs_in`` from now; set it to None to
+    create the journeys in the test case instead.
+    """
+
+    cargo_num = 2
+    places_in_cargo = 4
+    journey_departs_in = datetime.timedelta(hours=1)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.station1 = Station.objects.create(name="Station A", latitude=0, longitude=0)
+        cls.station2 = Station.objects.create(name="Station B", latitude=1, longitude=1)
+        cls.route = Route.objects.create(
+            source=cls.station1, destination=cls.station2, distance=100
+        )
+        cls.train = Train.objects.create(
+            name="Thunderbolt",
+            cargo_num=cls.cargo_num,
+            places_in_cargo=cls.places_in_cargo,
+            train_type=TrainType.objects.create(name="Express"),
+        )
+        if cls.journey_departs_in is not None:
+            cls.journey = cls.create_journey(
+                cls.route, timezone.now() + cls.journey_departs_in
+            )
+
+    @classmethod
+    def create_journey(cls, route, departure, duration=datetime.timedelta(hours=2)):
+        return Journey.objects.create(
+            route=route,
+            train=cls.train,
+            departure_time=departure,
+            arrival_time=departure + duration,
+        )
+
+
+class JourneySeatsApiTest(BookingApiTestCase):
+    cargo_num = 100
+    places_in_cargo = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        order = Order.objects.create(user=cls.user)
+        Ticket.objects.bulk_create(
+            Ticket(cargo=1, seat=seat, journey=cls.journey, order=order)
+            for seat in range(1, 101)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("transport:journey-seats", args=[self.journey.id])
+
+    def test_seat_map_bitmap(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["capacity"], 10000)
+        self.assertEqual(response.data["taken"], 100)
+        self.assertEqual(response.data["free"], 9900)
+        bits = base64.b64decode(response.data["seats"])
+        self.assertEqual(len(bits), 1250)
+        self.assertEqual(bits[:13], b"\xff" * 12 + b"\xf0")
+
+    def test_seat_map_rle(self):
+        response = self.client.get(self.url, {"encoding": "rle"})
+        self.assertEqual(response.data["encoding"], "rle")
+        self.assertEqual(response.data["seats"], [0, 100, 9900])
+
+    def test_unknown_encoding(self):
+        response = self.client.get(self.url, {"encoding": "png"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("encoding", response.data)
+
+
+class OrderCreateApiTest(BookingApiTestCase):
+    cargo_num = 10
+    places_in_cargo = 40
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("transport:order-list")
+
+    def _tickets(self, seats, cargo=1):
+        return [
+            {"cargo": cargo, "seat": seat, "journey": self.journey.id}
+            for seat in seats
+        ]
+
+    def _ticket_attrs(self, seats):
+        return [
+            {"cargo": 1, "seat": seat, "journey": self.journey} for seat in seats
+        ]
+
+    def test_group_booking_query_count_does_not_grow(self):
+        with self.assertNumQueries(10):
+            response = self.client.post(
+                self.url, {"tickets": self._tickets([1])}, format="json"
+            )
+        self.assertEqual(response.status_code, 201)
+        with self.assertNumQueries(10):
+            response = self.client.post(
+                self.url, {"tickets": self._tickets(range(1, 41), 2)}, format="json"
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ticket.objects.filter(journey=self.journey).count(), 41)
+
+    def test_taken_seat_error_shape(self):
+        self.client.post(self.url, {"tickets": self._tickets([5])}, format="json")
+        response = self.client.post(
+            self.url, {"tickets": self._tickets([4, 5, 4])}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        message = "The fields journey, cargo, seat must make a unique set."
+        self.assertEqual(
+            response.json(),
+            {
+                "tickets": [
+                    {},
+                    {"non_field_errors": [message]},
+                    {"non_field_errors": [message]},
+                ]
+            },
+        )
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_seat_out_of_range(self):
+        response = self.client.post(
+            self.url, {"tickets": self._tickets([41])}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("seat", response.json()["tickets"][0])
+
+    def test_concurrent_conflict_keeps_error_shape(self):
+        self.client.post(self.url, {"tickets": self._tickets([7])}, format="json")
+        real_check = TicketBulkSerializer.seat_conflict_errors
+        with mock.patch.object(
+            TicketBulkSerializer,
+            "seat_conflict_errors",
+            side_effect=[None, real_check(self._ticket_attrs([7]))],
+        ):
+            response = self.client.post(
+                self.url, {"tickets": self._tickets([7])}, format="json"
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["tickets"][0]["non_field_errors"],
+            ["The fields journey, cargo, seat must make a unique set."],
+        )
+        self.assertEqual(Order.objects.count(), 1)
+
+
+# Maximum number of queries per endpoint, including JWT authentication.
+# Run against QueryBudgetTest's dataset, so a query per row shows up as a
+# budget overrun.
+QUERY_BUDGETS = {
+    ("station", "list"): 3,
+    ("station", "create"): 3,
+    ("traintype", "list"): 3,
+    ("traintype", "create"): 3,
+    ("train", "list"): 3,
+    ("train", "retrieve"): 2,
+    ("train", "create"): 3,
+    ("train", "update"): 4,
+    ("train", "destroy"): 9,
+    ("route", "list"): 3,
+    ("route", "retrieve"): 2,
+    ("route", "create"): 5,
+    ("route", "update"): 5,
+    ("crew", "list"): 3,
+    ("crew", "retrieve"): 2,
+    ("crew", "create"): 2,
+    ("crew", "update"): 3,
+    ("journey", "list"): 4,
+    ("journey", "list_filtered"): 4,
+    ("journey", "retrieve"): 3,
+    ("journey", "create"): 10,
+    ("journey", "seats"): 3,
+    ("order", "list"): 5,
+    ("order", "create"): 10,
+    ("route", "plan"): 3,
+    ("journey", "connections"): 2,
+    ("station", "nearby"): 3,
+    ("station", "nearest"): 3,
+    ("hold", "create"): 9,
+    ("hold", "confirm"): 9,
+    ("order", "allocate"): 10,
+    ("route", "calendar"): 3,
+}
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email="budget@example.com",
+            password="testpass",
+            first_name="Test",
+            last_name="User",
+        )
+        stations = [
+            Station.objects.create(name=f"Station {i}", latitude=i, longitude=i)
+            for i in range(5)
+        ]
+        routes = [
+            Route.objects.create(
+                source=stations[i], destination=stations[i + 1], distance=100
+            )
+            for i in range(4)
+        ]
+        train_type = TrainType.objects.create(name="Express")
+        trains = [
+            Train.objects.create(
+                name=f"Train {i}",
+                cargo_num=10,
+                places_in_cargo=20,
+                train_type=train_type,
+            )
+            for i in range(3)
+        ]
+        crews = [
+            Crew.objects.create(first_name=f"First {i}", last_name=f"Last {i}")
+            for i in range(4)
+        ]
+        departure = timezone.now() + datetime.timedelta(days=1)
+        cls.journeys = []
+        for i in range(6):
+            journey = Journey.objects.create(
+                route=routes[i % 4],
+                train=trains[i % 3],
+                departure_time=departure + datetime.timedelta(hours=i),
+                arrival_time=departure + datetime.timedelta(hours=i + 2),
+            )
+            journey.crew.add(crews[i % 4], crews[(i + 1) % 4])
+            cls.journeys.append(journey)
+        for i in range(3):
+            order = Order.objects.create(user=cls.user)
+            for seat in range(1, 5):
+                Ticket.objects.create(
+                    cargo=i + 1,
+                    seat=seat,
+                    journey=cls.journeys[seat],
+                    order=order,
+                )
+        cls.stations = stations
+        cls.station = stations[0]
+        cls.route = routes[0]
+        cls.train = trains[0]
+        cls.train_type = train_type
+        cls.crew = crews[0]
+
+    def setUp(self):
+        cache.clear()
+        caches["shared"].clear()
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def assert_within_budget(self, key, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertLessEqual(
+            len(queries),
+            QUERY_BUDGETS[key],
+            f"{key} ran {len(queries)} queries:\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        return response
+
+    def test_reference_data_endpoints(self):
+        for basename, obj, payload in [
+            ("station", None, {"name": "New", "latitude": 1, "longitude": 2}),
+            ("traintype", None, {"name": "Regional"}),
+            (
+                "train",
+                self.train,
+                {
+                    "name": "New",
+                    "cargo_num": 2,
+                    "places_in_cargo": 3,
+                    "train_type": self.train_type.id,
+                },
+            ),
+            (
+                "route",
+                self.route,
+                {
+                    "source": self.route.destination_id,
+                    "destination": self.route.source_id,
+                    "distance": 10,
+                },
+            ),
+            ("crew", self.crew, {"first_name": "New", "last_name": "Crew"}),
+        ]:
+            list_url = reverse(f"transport:{basename}-list")
+            self.assert_within_budget((basename, "list"), "get", list_url)
+            self.assert_within_budget((basename, "create"), "post", list_url, payload)
+            if obj is not None:
+                detail_url = reverse(f"transport:{basename}-detail", args=[obj.id])
+                self.assert_within_budget((basename, "retrieve"), "get", detail_url)
+                self.assert_within_budget(
+                    (basename, "update"),
+                    "patch",
+                    detail_url,
+                    {key: value for key, value in payload.items() if key != "source"},
+                )
+
+    def test_train_destroy(self):
+        self.assert_within_budget(
+            ("train", "destroy"),
+            "delete",
+            reverse("transport:train-detail", args=[self.train.id]),
+        )
+
+    def test_journey_endpoints(self):
+        list_url = reverse("transport:journey-list")
+        self.assert_within_budget(("journey", "list"), "get", list_url)
+        self.assert_within_budget(
+            ("journey", "list_filtered"),
+            "get",
+            f"{list_url}?route={self.route.id}&crew={self.crew.id}",
+        )
+        self.assert_within_budget(
+            ("journey", "retrieve"),
+            "get",
+            reverse("transport:journey-detail", args=[self.journeys[0].id]),
+        )
+        self.assert_within_budget(
+            ("journey", "seats"),
+            "get",
+            reverse("transport:journey-seats", args=[self.journeys[0].id]),
+        )
+        departure = timezone.now() + datetime.timedelta(days=2)
+        self.assert_within_budget(
+            ("journey", "create"),
+            "post",
+            list_url,
+            {
+                "route": self.route.id,
+                "train": self.train.id,
+                "departure_time": departure.isoformat(),
+                "arrival_time": (departure + datetime.timedelta(hours=1)).isoformat(),
+                "crew": [self.crew.id],
+            },
+        )
+
+    def test_order_endpoints(self):
+        url = reverse("transport:order-list")
+        self.assert_within_budget(("order", "list"), "get", url)
+        self.assert_within_budget(
+            ("order", "create"),
+            "post",
+            url,
+            {
+                "tickets": [
+                    {"cargo": 9, "seat": seat, "journey": journey.id}
+                    for seat, journey in enumerate(self.journeys, start=1)
+                ]
+            },
+        )
+
+    def test_route_plan(self):
+        reset_route_graph()
+        self.addCleanup(reset_route_graph)
+        self.assert_within_budget(
+            ("route", "plan"),
+            "get",
+            reverse("transport:route-plan"),
+            {"from": self.stations[0].id, "to": self.stations[4].id},
+        )
+
+    def test_journey_connections(self):
+        reset_timetable()
+        self.addCleanup(reset_timetable)
+        self.assert_within_budget(
+            ("journey", "connections"),
+            "get",
+            reverse("transport:journey-connections"),
+            {"from": self.stations[0].id, "to": self.stations[2].id},
+        )
+
+    def test_station_lookups(self):
+        for action, params in (("nearby", {"radius": 1000}), ("nearest", {"k": 3})):
+            reset_station_index()
+            self.addCleanup(reset_station_index)
+            self.assert_within_budget(
+                ("station", action),
+                "get",
+                reverse(f"transport:station-{action}"),
+                {"lat": 0, "lon": 0, **params},
+            )
+
+    def test_hold_endpoints(self):
+        response = self.assert_within_budget(
+            ("hold", "create"),
+            "post",
+            reverse("transport:hold-list"),
+            {
+                "seats": [
+                    {"cargo": 9, "seat": seat, "journey": journey.id}
+                    for seat, journey in enumerate(self.journeys, start=1)
+                ]
+            },
+        )
+        self.assert_within_budget(
+            ("hold", "confirm"),
+            "post",
+            reverse("transport:hold-confirm", args=[response.data["hold_id"]]),
+        )
+
+    def test_order_allocate(self):
+        self.assert_within_budget(
+            ("order", "allocate"),
+            "post",
+            reverse("transport:order-allocate"),
+            {"journey": self.journeys[1].id, "count": 3},
+        )
+
+    def test_route_calendar(self):
+        self.assert_within_budget(
+            ("route", "calendar"),
+            "get",
+            reverse("transport:route-calendar", args=[self.route.id]),
+        )
+
+
+class KeysetPaginationTest(BookingApiTestCase):
+    cargo_num = 5
+    places_in_cargo = 5
+    journey_departs_in = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        departure = timezone.now() + datetime.timedelta(days=1)
+        # Several journeys share a departure time to exercise the id tiebreak
+        for i in range(25):
+            cls.create_journey(
+                cls.route,
+                departure + datetime.timedelta(hours=i // 4),
+                datetime.timedelta(hours=1),
+            )
+
+    def test_journey_cursor_walks_every_row_in_order(self):
+        url = reverse("transport:journey-list") + "?pagination=cursor"
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(
+                "COUNT(", " ".join(query["sql"] for query in queries.captured_queries)
+            )
+            self.assertNotIn("count", response.data)
+            seen.extend(response.data["results"])
+            url = response.data["next"]
+        expected = list(
+            Journey.objects.order_by("departure_time", "id").values_list(
+                "id", flat=True
+            )
+        )
+        self.assertEqual([journey["id"] for journey in seen], expected)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get(reverse("transport:journey-list"))
+        self.assertEqual(response.data["count"], 25)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse("transport:journey-list"), {"cursor": "not-a-cursor"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_invalid_values(self):
+        for position in (
+            ["x", "y"],
+            [1, {}],
+            ["2025-13-40T10:00:00", 1],
+            [timezone.now().isoformat(), "x"],
+            [None, 1],
+        ):
+            cursor = base64.b64encode(json.dumps(position).encode()).decode()
+            with self.subTest(position=position):
+                response = self.client.get(
+                    reverse("transport:journey-list"), {"cursor": cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_order_cursor_newest_first(self):
+        orders = [Order.objects.create(user=self.user) for _ in range(3)]
+        response = self.client.get(
+            reverse("transport:order-list"), {"pagination": "cursor", "page_size": 2}
+        )
+        self.assertEqual(
+            [order["id"] for order in response.data["results"]],
+            [orders[2].id, orders[1].id],
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [order["id"] for order in response.data["results"]], [orders[0].id]
+        )
+        self.assertIsNone(response.data["next"])
+
+
+class WaitForDbCommandTest(TestCase):
+    def test_reports_available_after_running_a_query(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("wait_for_db", stdout=out)
+        self.assertIn("SELECT 1", [query["sql"] for query in queries.captured_queries])
+        self.assertIn("Database is available", out.getvalue())
+        self.assertIn("Connection pool: ", out.getvalue())
+
+
+class AsyncReadViewTest(BookingApiTestCase):
+    cargo_num = 5
+    places_in_cargo = 5
+    journey_departs_in = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.crew = Crew.objects.create(first_name="John", last_name="Doe")
+        departure = timezone.now() + datetime.timedelta(days=1)
+        for i in range(12):
+            journey = cls.create_journey(
+                cls.route,
+                departure + datetime.timedelta(hours=i),
+                datetime.timedelta(hours=1),
+            )
+            journey.crew.add(cls.crew)
+        cls.journey = journey
+
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.list_view = async_read_view(
+            JourneyViewSet, {"get": "list", "post": "create"}
+        )
+        self.detail_view = async_read_view(JourneyViewSet, {"get": "retrieve"})
+
+    def _get(self, view, path, data=None, **kwargs):
+        request = self.factory.get(path, data, **self.auth)
+        response = async_to_sync(view)(request, **kwargs)
+        return response.render()
+
+    def test_list_matches_sync_view(self):
+        url = reverse("transport:journey-list")
+        response = self._get(self.list_view, url, {"route": self.route.id, "page": 2})
+        expected = self.client.get(url, {"route": self.route.id, "page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, expected.data)
+
+    def test_retrieve(self):
+        response = self._get(
+            self.detail_view, f"/journey/{self.journey.id}/", pk=self.journey.id
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["route"]["source"]["name"], "Station A")
+
+    def test_retrieve_missing(self):
+        response = self._get(self.detail_view, "/journey/0/", pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_authentication(self):
+        request = self.factory.get("/journey/")
+        response = async_to_sync(self.list_view)(request).render()
+        self.assertEqual(response.status_code, 401)
+
+    def test_write_stays_on_sync_view(self):
+        departure = timezone.now() + datetime.timedelta(days=3)
+        request = self.factory.post(
+            "/journey/",
+            {
+                "route": self.route.id,
+                "train": self.train.id,
+                "departure_time": departure.isoformat(),
+                "arrival_time": (departure + datetime.timedelta(hours=1)).isoformat(),
+                "crew": [self.crew.id],
+            },
+            format="json",
+            **self.auth,
+        )
+        response = async_to_sync(self.list_view)(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Journey.objects.count(), 13)
+
+
+class RoutePlanTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_route_graph()
+        self.addCleanup(reset_route_graph)
+        self.kyiv = Station.objects.create(name="Kyiv", latitude=50.45, longitude=30.52)
+        self.vinnytsia = Station.objects.create(
+            name="Vinnytsia", latitude=49.23, longitude=28.47
+        )
+        self.lviv = Station.objects.create(name="Lviv", latitude=49.84, longitude=24.03)
+        self.odesa = Station.objects.create(name="Odesa", latitude=46.48, longitude=30.72)
+        Route.objects.create(source=self.kyiv, destination=self.lviv, distance=700)
+        self.kyiv_vinnytsia = Route.objects.create(
+            source=self.kyiv, destination=self.vinnytsia, distance=270
+        )
+        self.vinnytsia_lviv = Route.objects.create(
+            source=self.vinnytsia, destination=self.lviv, distance=370
+        )
+        self.url = reverse("transport:route-plan")
+
+    def test_plan_prefers_shorter_connection(self):
+        response = self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["distance"], 640)
+        self.assertEqual(
+            [leg["id"] for leg in response.data["legs"]],
+            [self.kyiv_vinnytsia.id, self.vinnytsia_lviv.id],
+        )
+
+    def test_plan_does_not_query_once_graph_is_loaded(self):
+        self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"from": self.lviv.id, "to": self.kyiv.id})
+        self.assertEqual(len(queries), 0)
+
+    def test_graph_follows_route_changes(self):
+        self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vinnytsia_lviv.delete()
+            Route.objects.create(
+                source=self.vinnytsia, destination=self.odesa, distance=420
+            )
+        response = self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        self.assertEqual(response.data["distance"], 700)
+        response = self.client.get(self.url, {"from": self.kyiv.id, "to": self.odesa.id})
+        self.assertEqual(response.data["distance"], 690)
+
+    def test_graph_reloads_after_change_in_another_process(self):
+        self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        # A queryset update sends no signals, like a write made by another worker
+        Route.objects.filter(pk=self.kyiv_vinnytsia.pk).update(distance=500)
+        response = self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        self.assertEqual(response.data["distance"], 640)
+
+        bump_versions(Route)
+        response = self.client.get(self.url, {"from": self.kyiv.id, "to": self.lviv.id})
+        self.assertEqual(response.data["distance"], 700)
+
+    def test_no_route(self):
+        response = self.client.get(self.url, {"from": self.lviv.id, "to": self.kyiv.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_station(self):
+        response = self.client.get(self.url, {"from": "abc", "to": self.kyiv.id})
+        self.assertEqual(response.status_code, 400)
+
+
+class TimetableTest(TestCase):
+    def setUp(self):
+        self.start = datetime.datetime(2030, 1, 1, 8, tzinfo=datetime.timezone.utc)
+
+    def _at(self, minutes):
+        return self.start + datetime.timedelta(minutes=minutes)
+
+    def test_earliest_arrival_respects_transfer_time(self):
+        # (journey, source, destination, departure, arrival, route)
+        timetable = Timetable(
+            [
+                (1, 1, 2, self._at(0), self._at(60), 10),
+                (2, 2, 3, self._at(65), self._at(120), 20),
+                (3, 2, 3, self._at(80), self._at(140), 20),
+                (4, 1, 3, self._at(30), self._at(200), 30),
+            ]
+        )
+        legs = timetable.earliest_arrival(1, 3, self.start, min_transfer_minutes=10)
+        self.assertEqual([leg["journey"] for leg in legs], [1, 3])
+        self.assertEqual(legs[-1]["arrival_time"], self._at(140))
+
+        legs = timetable.earliest_arrival(1, 3, self.start, min_transfer_minutes=5)
+        self.assertEqual([leg["journey"] for leg in legs], [1, 2])
+
+        legs = timetable.earliest_arrival(1, 3, self._at(1))
+        self.assertEqual([leg["journey"] for leg in legs], [4])
+        self.assertIsNone(timetable.earliest_arrival(3, 1, self.start))
+
+    def test_incremental_updates_keep_departure_order(self):
+        timetable = Timetable([(1, 1, 2, self._at(60), self._at(90), 10)])
+        timetable.set_journey(2, 1, 2, self._at(0), self._at(30), 10)
+        timetable.set_journey(1, 1, 2, self._at(-30), self._at(20), 10)
+        self.assertEqual(list(timetable.columns[5]), [1, 2])
+        timetable.remove_journey(1)
+        timetable.set_route(10, 5, 6)
+        self.assertEqual(list(timetable.columns[2]), [5])
+        self.assertEqual(len(timetable), 1)
+
+
+class JourneyConnectionsApiTest(BookingApiTestCase):
+    cargo_num = 5
+    places_in_cargo = 5
+    journey_departs_in = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.stations = [
+            cls.station1,
+            cls.station2,
+            Station.objects.create(name="Station C", latitude=2, longitude=2),
+        ]
+        cls.first_leg = cls.route
+        cls.second_leg = Route.objects.create(
+            source=cls.stations[1], destination=cls.stations[2], distance=100
+        )
+
+    def setUp(self):
+        super().setUp()
+        reset_timetable()
+        self.addCleanup(reset_timetable)
+        self.departure = timezone.now() + datetime.timedelta(days=1)
+        self.url = reverse("transport:journey-connections")
+
+    def _journey(self, route, departs_in, duration):
+        return self.create_journey(
+            route,
+            self.departure + datetime.timedelta(minutes=departs_in),
+            datetime.timedelta(minutes=duration),
+        )
+
+    def test_connection_with_change(self):
+        first = self._journey(self.first_leg, 0, 60)
+        second = self._journey(self.second_leg, 90, 60)
+        response = self.client.get(
+            self.url, {"from": self.stations[0].id, "to": self.stations[2].id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [leg["journey"] for leg in response.data["legs"]], [first.id, second.id]
+        )
+
+    def test_new_journeys_are_added_without_reloading(self):
+        self._journey(self.first_leg, 0, 60)
+        params = {"from": self.stations[0].id, "to": self.stations[2].id}
+        self.assertEqual(self.client.get(self.url, params).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self._journey(self.second_leg, 75, 60)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response.data["legs"][-1]["journey"], second.id)
+
+    def test_min_transfer_must_be_a_number(self):
+        response = self.client.get(
+            self.url,
+            {"from": self.stations[0].id, "to": self.stations[2].id, "min_transfer": "x"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_departure_after(self):
+        for value in ("tomorrow", "2025-13-40T10:00:00"):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    self.url,
+                    {
+                        "from": self.stations[0].id,
+                        "to": self.stations[2].id,
+                        "departure_after": value,
+                    },
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("departure_after", response.data)
+
+    def test_connections_with_async_read_views(self):
+        first = self._journey(self.first_leg, 0, 60)
+        with override_settings(ASYNC_READ_VIEWS=True):
+            async_urls = importlib.reload(transport_urls)
+        self.addCleanup(importlib.reload, transport_urls)
+        urlconf = types.ModuleType("async_urlconf")
+        urlconf.urlpatterns = [
+            path("api/transport/", include(async_urls, namespace="transport"))
+        ]
+        with override_settings(ROOT_URLCONF=urlconf):
+            url = reverse("transport:journey-connections")
+            response = self.client.get(
+                url, {"from": self.stations[0].id, "to": self.stations[1].id}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["legs"][0]["journey"], first.id)
+
+
+class StationIndexTest(TestCase):
+    def test_matches_brute_force(self):
+        generator = random.Random(7)
+        stations = [
+            (i, generator.uniform(-89, 89), generator.uniform(-180, 180))
+            for i in range(500)
+        ]
+        index = StationIndex(stations)
+        for latitude, longitude in [(0, 179.9), (89.5, 10), (50.45, 30.52)]:
+            expected = sorted(
+                (haversine_km(latitude, longitude, lat, lon), station_id)
+                for station_id, lat, lon in stations
+            )
+            self.assertEqual(
+                index.nearest(latitude, longitude, 7),
+                expected[:7],
+            )
+            self.assertEqual(
+                index.within(latitude, longitude, 1500),
+                [item for item in expected if item[0] <= 1500],
+            )
+
+    def test_writes_update_the_index(self):
+        index = StationIndex([(1, 0, 0)])
+        self.assertEqual(index.nearest(0, 0, 5), [(0.0, 1)])
+        index.set_station(2, 0, 0.001)
+        index.remove_station(1)
+        self.assertEqual([item[1] for item in index.nearest(0, 0, 5)], [2])
+
+
+class StationNearbyApiTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_station_index()
+        self.addCleanup(reset_station_index)
+        self.kyiv = Station.objects.create(name="Kyiv", latitude=50.45, longitude=30.52)
+        self.irpin = Station.objects.create(name="Irpin", latitude=50.52, longitude=30.25)
+        self.lviv = Station.objects.create(name="Lviv", latitude=49.84, longitude=24.03)
+
+    def test_nearby(self):
+        response = self.client.get(
+            reverse("transport:station-nearby"),
+            {"lat": 50.45, "lon": 30.52, "radius": 50},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [station["name"] for station in response.data], ["Kyiv", "Irpin"]
+        )
+        self.assertEqual(response.data[0]["distance"], 0.0)
+
+    def test_nearest_sees_new_station(self):
+        url = reverse("transport:station-nearest")
+        self.client.get(url, {"lat": 49.8, "lon": 24.0, "k": 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            Station.objects.create(name="Lviv Suburb", latitude=49.8, longitude=24.0)
+        response = self.client.get(url, {"lat": 49.8, "lon": 24.0, "k": 2})
+        self.assertEqual(
+            [station["name"] for station in response.data], ["Lviv Suburb", "Lviv"]
+        )
+
+    def test_invalid_coordinates(self):
+        response = self.client.get(
+            reverse("transport:station-nearest"), {"lat": 95, "lon": 0}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ResponseCacheTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        caches["shared"].clear()
+        metrics.reset()
+        self.station = Station.objects.create(
+            name="Station A", latitude=0, longitude=0
+        )
+        self.url = reverse("transport:station-list")
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.data, second.data)
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["response_cache.station.miss"], 1)
+        self.assertEqual(counters["response_cache.station.hit"], 1)
+
+    def test_write_invalidates_cached_responses(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Station.objects.create(name="Station B", latitude=1, longitude=1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_route_detail_depends_on_stations(self):
+        destination = Station.objects.create(name="Station B", latitude=1, longitude=1)
+        route = Route.objects.create(
+            source=self.station, destination=destination, distance=10
+        )
+        url = reverse("transport:route-detail", args=[route.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            destination.name = "Renamed"
+            destination.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["destination"]["name"], "Renamed")
+
+    def test_async_route_reads_share_the_cache(self):
+        destination = Station.objects.create(name="Station B", latitude=1, longitude=1)
+        route = Route.objects.create(
+            source=self.station, destination=destination, distance=10
+        )
+        factory = APIRequestFactory()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.user)}"}
+        list_view = async_read_view(RouteViewSet, {"get": "list"}, basename="route")
+        detail_view = async_read_view(
+            RouteViewSet, {"get": "retrieve"}, basename="route", detail=True
+        )
+        list_url = reverse("transport:route-list")
+        detail_url = reverse("transport:route-detail", args=[route.id])
+
+        expected = self.client.get(list_url).data
+        request = factory.get(list_url, **auth)
+        response = async_to_sync(list_view)(request).render()
+        self.assertEqual(response.data, expected)
+        request = factory.get(detail_url, **auth)
+        async_to_sync(detail_view)(request, pk=route.id).render()
+        request = factory.get(detail_url, **auth)
+        response = async_to_sync(detail_view)(request, pk=route.id).render()
+        self.assertEqual(response.data["destination"]["name"], "Station B")
+
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["response_cache.route.miss"], 2)
+        self.assertEqual(counters["response_cache.route.hit"], 2)
+
+    def test_metrics_require_staff(self):
+        url = reverse("transport:metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("counters", response.data)
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, "cache.sqlite3")
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_values_and_expiry(self):
+        self.cache.set("key", {"a": 1})
+        self.assertEqual(self.cache.get("key"), {"a": 1})
+        self.assertFalse(self.cache.add("key", "other"))
+        self.cache.set("expired", 1, timeout=-1)
+        self.assertIsNone(self.cache.get("expired"))
+        self.assertTrue(self.cache.add("expired", 2))
+        self.assertEqual(
+            self.cache.get_many(["key", "expired", "missing"]),
+            {"key": {"a": 1}, "expired": 2},
+        )
+
+    def test_incr_is_atomic_across_connections(self):
+        # Separate instances have separate connections, like separate workers
+        caches = [SQLiteCache(self.location, {}) for _ in range(4)]
+        self.assertTrue(caches[0].add("counter", 0))
+
+        def increment(cache):
+            for _ in range(100):
+                cache.incr("counter")
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(increment, caches))
+        self.assertEqual(self.cache.get("counter"), 400)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+
+class SlidingWindowThrottleTest(TestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        self.request = APIRequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        self.request.user = AnonymousUser()
+        self.view = mock.Mock(throttle_scope="login")
+        self.now = 36000.0
+
+    def allow(self):
+        throttle = ScopedRateThrottle()
+        throttle.timer = lambda: self.now
+        allowed = throttle.allow_request(self.request, self.view)
+        return allowed, throttle
+
+    def test_limit_slides_over_previous_window(self):
+        # login: 10/hour
+        for _ in range(10):
+            self.assertTrue(self.allow()[0])
+        allowed, throttle = self.allow()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 3600 * 0.1 + 3600)
+
+        # Halfway through the next hour half of the previous one still counts
+        self.now += 3600 + 1800
+        for _ in range(5):
+            self.assertTrue(self.allow()[0])
+        allowed, throttle = self.allow()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(throttle.wait(), 360)
+
+    def test_state_is_two_counters(self):
+        self.allow()
+        self.now += 3600
+        self.allow()
+        key = ScopedRateThrottle.cache_format % {"scope": "login", "ident": "10.0.0.1"}
+        self.assertEqual(
+            caches["shared"].get_many([f"{key}:10", f"{key}:11"]),
+            {f"{key}:10": 1, f"{key}:11": 1},
+        )
+
+
+class SeatHoldApiTest(BookingApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="testpass",
+            first_name="Other",
+            last_name="User",
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(self.other)
+        self.url = reverse("transport:hold-list")
+
+    def _seats(self, seats):
+        return [
+            {"cargo": 1, "seat": seat, "journey": self.journey.id} for seat in seats
+        ]
+
+    def _hold(self, client, seats):
+        return client.post(self.url, {"seats": self._seats(seats)}, format="json")
+
+    def test_held_seats_are_taken_for_others(self):
+        response = self._hold(self.client, [1, 2])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["seats"]), 2)
+
+        seats = self.client.get(
+            reverse("transport:journey-seats", args=[self.journey.id])
+        )
+        self.assertEqual(seats.data["taken"], 2)
+        self.assertEqual(self._hold(self.other_client, [2, 3]).status_code, 400)
+        self.assertEqual(self._hold(self.client, [2]).status_code, 400)
+        response = self.other_client.post(
+            reverse("transport:order-list"),
+            {"tickets": self._seats([1])},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["tickets"][0]["non_field_errors"],
+            ["The fields journey, cargo, seat must make a unique set."],
+        )
+
+    def test_confirm_turns_hold_into_order(self):
+        hold_id = self._hold(self.client, [3, 4]).data["hold_id"]
+        url = reverse("transport:hold-confirm", args=[hold_id])
+        self.assertEqual(self.other_client.post(url).status_code, 404)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(ticket["seat"] for ticket in response.data["tickets"]), [3, 4]
+        )
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertEqual(self.client.post(url).status_code, 404)
+
+    def test_expired_holds_are_reclaimed(self):
+        hold_id = self._hold(self.client, [1]).data["hold_id"]
+        SeatHold.objects.update(expires_at=timezone.now())
+        url = reverse("transport:hold-detail", args=[hold_id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self._hold(self.other_client, [1]).status_code, 201)
+        self.assertEqual(SeatHold.objects.get().user, self.other)
+
+        SeatHold.objects.update(expires_at=timezone.now())
+        out = StringIO()
+        call_command("release_expired_holds", stdout=out)
+        self.assertIn("Released 1", out.getvalue())
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_release_hold(self):
+        hold_id = self._hold(self.client, [1]).data["hold_id"]
+        url = reverse("transport:hold-detail", args=[hold_id])
+        self.assertEqual(self.other_client.delete(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self._hold(self.other_client, [1]).status_code, 201)
+
+    def _occupancy(self):
+        occupancy = JourneyOccupancy.objects.get(journey=self.journey)
+        return occupancy.sold, occupancy.held, occupancy.seats_available
+
+    def test_occupancy_follows_holds_and_orders(self):
+        hold_id = self._hold(self.client, [1, 2]).data["hold_id"]
+        self.assertEqual(self._occupancy(), (0, 2, 6))
+        self.client.post(reverse("transport:hold-confirm", args=[hold_id]))
+        self.assertEqual(self._occupancy(), (2, 0, 6))
+        self.other_client.post(
+            reverse("transport:order-list"),
+            {"tickets": self._seats([3])},
+            format="json",
+        )
+        hold_id = self._hold(self.client, [4]).data["hold_id"]
+        self.assertEqual(self._occupancy(), (3, 1, 4))
+        self.client.delete(reverse("transport:hold-detail", args=[hold_id]))
+        self._hold(self.client, [4])
+        SeatHold.objects.update(expires_at=timezone.now())
+        call_command("release_expired_holds", stdout=StringIO())
+        self.assertEqual(self._occupancy(), (3, 0, 5))
+
+        response = self.client.get(reverse("transport:journey-list"))
+        self.assertEqual(response.data["results"][0]["seats_available"], 5)
+
+    def test_ordering_held_seats_consumes_the_hold(self):
+        hold_id = self._hold(self.client, [1, 2]).data["hold_id"]
+        response = self.client.post(
+            reverse("transport:order-list"),
+            {"tickets": self._seats([1])},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(SeatHold.objects.values_list("seat", flat=True)), [2])
+        self.assertEqual(self._occupancy(), (1, 1, 6))
+
+        response = self.client.post(reverse("transport:hold-confirm", args=[hold_id]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([ticket["seat"] for ticket in response.data["tickets"]], [2])
+        self.assertEqual(self._occupancy(), (2, 0, 6))
+
+    def test_concurrent_conflict_keeps_own_holds_free(self):
+        self._hold(self.client, [1])
+        self.other_client.post(
+            reverse("transport:order-list"),
+            {"tickets": self._seats([2])},
+            format="json",
+        )
+        # The locked check misses the sale, as if it committed right after
+        checks = iter([lambda *args: None, TicketBulkSerializer.seat_conflict_errors])
+        with mock.patch.object(
+            TicketBulkSerializer,
+            "seat_conflict_errors",
+            side_effect=lambda *args: next(checks)(*args),
+        ):
+            response = self.client.post(
+                reverse("transport:order-list"),
+                {"tickets": self._seats([1, 2])},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["tickets"][0], {})
+        self.assertIn("non_field_errors", response.json()["tickets"][1])
+
+    def test_order_list_journeys_have_seats_available(self):
+        self.client.post(
+            reverse("transport:order-list"),
+            {"tickets": self._seats([1, 2])},
+            format="json",
+        )
+        self._hold(self.other_client, [3])
+        response = self.client.get(reverse("transport:order-list"))
+        journey = response.data["results"][0]["tickets"][0]["journey"]
+        self.assertEqual(journey["seats_available"], 5)
+        response = self.client.get(reverse("transport:journey-list"))
+        self.assertEqual(response.data["results"][0], journey)
+
+    def test_reconcile_occupancy(self):
+        response = self.client.get(reverse("transport:journey-list"))
+        self.assertEqual(response.data["results"][0]["seats_available"], 8)
+        self._hold(self.client, [1])
+        # Written behind the counters' back
+        order = Order.objects.create(user=self.other)
+        Ticket.objects.create(cargo=2, seat=1, journey=self.journey, order=order)
+        self.journey.train.cargo_num = 3
+        self.journey.train.save()
+        self.assertEqual(self._occupancy(), (0, 1, 11))
+
+        out = StringIO()
+        call_command("reconcile_occupancy", stdout=out)
+        self.assertIn("1 journeys fixed", out.getvalue())
+        self.assertEqual(self._occupancy(), (1, 1, 10))
+        call_command("reconcile_occupancy", stdout=out)
+        self.assertIn("0 journeys fixed", out.getvalue())
+
+
+class OrderAllocateApiTest(BookingApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        order = Order.objects.create(user=cls.user)
+        Ticket.objects.create(cargo=1, seat=2, journey=cls.journey, order=order)
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("transport:order-allocate")
+
+    def _allocate(self, count):
+        return self.client.post(
+            self.url, {"journey": self.journey.id, "count": count}, format="json"
+        )
+
+    def test_allocates_adjacent_seats_around_taken_ones(self):
+        response = self._allocate(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [(ticket["cargo"], ticket["seat"]) for ticket in response.data["tickets"]],
+            [(2, 1), (2, 2), (2, 3)],
+        )
+        response = self._allocate(2)
+        self.assertEqual(
+            [(ticket["cargo"], ticket["seat"]) for ticket in response.data["tickets"]],
+            [(1, 3), (1, 4)],
+        )
+
+    def test_not_enough_free_seats(self):
+        response = self._allocate(8)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("count", response.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class RouteCalendarApiTest(BookingApiTestCase):
+    journey_departs_in = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_route = Route.objects.create(
+            source=cls.station2, destination=cls.station1, distance=100
+        )
+        cls.tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        cls.journeys = []
+        for route, day, hour in (
+            (cls.route, 0, 9),
+            (cls.route, 0, 23),
+            (cls.route, 2, 12),
+            (cls.other_route, 0, 12),
+        ):
+            departure = timezone.make_aware(
+                datetime.datetime.combine(
+                    cls.tomorrow + datetime.timedelta(days=day), datetime.time(hour)
+                )
+            )
+            cls.journeys.append(cls.create_journey(route, departure))
+
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        caches["shared"].clear()
+        self.url = reverse("transport:route-calendar", args=[self.route.id])
+
+    def _order(self, journey, seats):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("transport:order-list"),
+                {
+                    "tickets": [
+                        {"cargo": 1, "seat": seat, "journey": journey.id}
+                        for seat in seats
+                    ]
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def _calendar(self):
+        return self.client.get(
+            self.url, {"from": self.tomorrow.isoformat(), "days": 3}
+        ).json()
+
+    def test_calendar_per_day(self):
+        self._order(self.journeys[0], [1, 2, 3])
+        self.assertEqual(
+            self._calendar(),
+            [
+                {
+                    "date": self.tomorrow.isoformat(),
+                    "journeys": 2,
+                    "min_seats_available": 5,
+                    "max_seats_available": 8,
+                },
+                {
+                    "date": (self.tomorrow + datetime.timedelta(days=1)).isoformat(),
+                    "journeys": 0,
+                    "min_seats_available": None,
+                    "max_seats_available": None,
+                },
+                {
+                    "date": (self.tomorrow + datetime.timedelta(days=2)).isoformat(),
+                    "journeys": 1,
+                    "min_seats_available": 8,
+                    "max_seats_available": 8,
+                },
+            ],
+        )
+        self.assertEqual(len(self.client.get(self.url).json()), 60)
+        self.assertEqual(self.client.get(self.url, {"days": 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"from": "May"}).status_code, 400)
+        missing = reverse("transport:route-calendar", args=[self.other_route.id + 1])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_bookings_invalidate_only_their_route(self):
+        self._calendar()
+        self._order(self.journeys[3], [1])
+        with self.assertNumQueries(0):
+            self._calendar()
+        self._order(self.journeys[2], [1])
+        self.assertEqual(self._calendar()[2]["min_seats_available"], 7)
+
+    def test_journey_and_train_changes_invalidate_only_their_routes(self):
+        other_train = Train.objects.create(
+            name="Slowpoke",
+            cargo_num=1,
+            places_in_cargo=1,
+            train_type=self.train.train_type,
+        )
+        self._calendar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.journeys[3].train = other_train
+            self.journeys[3].save()
+            other_train.cargo_num = 3
+            other_train.save()
+        with self.assertNumQueries(0):
+            self._calendar()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.journeys[3].route = self.route
+            self.journeys[3].save()
+        self.assertEqual(self._calendar()[0]["journeys"], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.journeys[3].delete()
+        self.assertEqual(self._calendar()[0]["journeys"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.train.places_in_cargo = 5
+            self.train.save()
+        self.assertEqual(self._calendar()[2]["min_seats_available"], 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.journeys[2].route = self.other_route
+            self.journeys[2].save()
+        self.assertEqual(self._calendar()[2]["journeys"], 0)
+
+
+@tag("benchmark")
+class IndexPlanTest(TestCase):
+    """EXPLAIN the hot endpoints' queries against a realistically sized table"""
+
+    LARGE_TABLES = ("transport_journey", "transport_order", "transport_ticket")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"user{i}@example.com", password="!")
+            for i in range(200)
+        )
+        stations = Station.objects.bulk_create(
+            Station(name=f"Station {i}", latitude=i % 90, longitude=i % 180)
+            for i in range(201)
+        )
+        routes = Route.objects.bulk_create(
+            Route(source=stations[i], destination=stations[i + 1], distance=100)
+            for i in range(200)
+        )
+        train_type = TrainType.objects.create(name="Express")
+        trains = Train.objects.bulk_create(
+            Train(
+                name=f"Train {i}",
+                cargo_num=10,
+                places_in_cargo=40,
+                train_type=train_type,
+            )
+            for i in range(100)
+        )
+        start = timezone.now()
+        journeys = Journey.objects.bulk_create(
+            Journey(
+                route=routes[i % 200],
+                train=trains[i % 100],
+                departure_time=start + datetime.timedelta(minutes=5 * i),
+                arrival_time=start + datetime.timedelta(minutes=5 * i + 90),
+            )
+            for i in range(40000)
+        )
+        orders = Order.objects.bulk_create(
+            Order(user=users[i % 199] if i % 50 else cls.user) for i in range(20000)
+        )
+        Ticket.objects.bulk_create(
+            Ticket(
+                order=orders[i // 2],
+                journey=journeys[i % 40000],
+                cargo=1 + i // 40000,
+                seat=1 + i % 2,
+            )
+            for i in range(40000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.route = routes[7]
+        cls.train = trains[3]
+        cls.journey = journeys[12345]
+        cls.late = journeys[-50].departure_time
+
+    def setUp(self):
+        cache.clear()
+        caches["shared"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def index_name(model, *fields):
+        return next(
+            index.name
+            for index in model._meta.indexes
+            if tuple(index.fields) == fields
+        )
+
+    def assert_index_plans(self, url, index=None):
+        """Fail on sequential scans of large tables; ``index`` must be used"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN " + query["sql"])
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                for table in self.LARGE_TABLES:
+                    self.assertNotIn(
+                        f"Seq Scan on {table} ", plan, f"{query['sql']}\n{plan}"
+                    )
+                plans.append(f"{query['sql']}\n{plan}")
+        if index is not None:
+            self.assertIn(index, "\n".join(plans), "\n\n".join(plans))
+        return response
+
+    def test_journey_filters(self):
+        url = reverse("transport:journey-list")
+        self.assert_index_plans(f"{url}?route={self.route.id}")
+        self.assert_index_plans(
+            f"{url}?route={self.route.id}&pagination=cursor",
+            self.index_name(Journey, "route", "departure_time"),
+        )
+        self.assert_index_plans(
+            f"{url}?train={self.train.id}&pagination=cursor",
+            self.index_name(Journey, "train", "departure_time"),
+        )
+        after = self.late.isoformat().replace("+", "%2B")
+        self.assert_index_plans(
+            f"{url}?departure_after={after}&pagination=cursor",
+            self.index_name(Journey, "departure_time", "id"),
+        )
+
+    def test_journey_cursor_pages(self):
+        keyset = self.index_name(Journey, "departure_time", "id")
+        response = self.assert_index_plans(
+            reverse("transport:journey-list") + "?pagination=cursor", keyset
+        )
+        self.assert_index_plans(response.data["next"], keyset)
+
+    def test_orders(self):
+        url = reverse("transport:order-list")
+        by_user = self.index_name(Order, "user", "-created_at", "-id")
+        self.assert_index_plans(url, by_user)
+        response = self.assert_index_plans(f"{url}?pagination=cursor", by_user)
+        self.assert_index_plans(response.data["next"], by_user)
+
+    def test_journey_detail_and_seats(self):
+        self.assert_index_plans(
+            reverse("transport:journey-detail", args=[self.journey.id])
+        )
+        self.assert_index_plans(
+            reverse("transport:journey-seats", args=[self.journey.id])
+        )
+
+
+class QueryFilterApiTest(BookingApiTestCase):
+    cargo_num = 5
+    places_in_cargo = 5
+    journey_departs_in = None
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Train.objects.create(
+            name="Slowpoke",
+            cargo_num=3,
+            places_in_cargo=5,
+            train_type=cls.train.train_type,
+        )
+        cls.crew = [
+            Crew.objects.create(first_name=f"First {i}", last_name=f"Last {i}")
+            for i in range(3)
+        ]
+        cls.departure = timezone.now() + datetime.timedelta(days=1)
+        cls.journeys = []
+        for i in range(3):
+            journey = cls.create_journey(
+                cls.route,
+                cls.departure + datetime.timedelta(hours=i),
+                datetime.timedelta(hours=1),
+            )
+            journey.crew.add(cls.crew[i], cls.crew[(i + 1) % 3])
+            cls.journeys.append(journey)
+
+    def setUp(self):
+        super().setUp()
+        self.journey_url = reverse("transport:journey-list")
+        self.train_url = reverse("transport:train-list")
+
+    def test_crew_filter_uses_exists_without_duplicates(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f"{self.journey_url}?crew={self.crew[0].id},{self.crew[1].id}"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [journey["id"] for journey in response.data["results"]],
+            [journey.id for journey in self.journeys],
+        )
+        sql = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+
+    def test_filters_combine(self):
+        after = (self.departure + datetime.timedelta(minutes=30)).isoformat()
+        response = self.client.get(
+            self.journey_url,
+            {
+                "route": self.route.id,
+                "crew": self.crew[2].id,
+                "departure_after": after,
+            },
+        )
+        self.assertEqual(
+            [journey["id"] for journey in response.data["results"]],
+            [self.journeys[1].id, self.journeys[2].id],
+        )
+
+    def test_invalid_parameters_are_rejected(self):
+        response = self.client.get(
+            self.journey_url,
+            {"route": "1,x", "train": "", "departure_after": "tomorrow"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {"route", "departure_after"})
+        response = self.client.get(self.journey_url, {"crew": ",".join(["1"] * 101)})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.train_url, {"cargo_num": "ten"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cargo_num", response.data)
+
+    def test_train_filters(self):
+        response = self.client.get(
+            self.train_url,
+            {
+                "name": "thunder",
+                "cargo_num": 5,
+                "train_types": self.train.train_type_id,
+            },
+        )
+        self.assertEqual(
+            [train["id"] for train in response.data["results"]], [self.train.id]
+        )
+
+
+class ExportTest(BookingApiTestCase):
+    cargo_num = 5
+    places_in_cargo = 5
+    journey_departs_in = None
+
+    @classmethod
+    def create_user(cls):
+        return get_user_model().objects.create_superuser(
+            email="admin@example.com", password="testpass"
+        )
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        crew = [
+            Crew.objects.create(first_name=f"First {i}", last_name=f"Last {i}")
+            for i in range(2)
+        ]
+        departure = timezone.now() + datetime.timedelta(days=1)
+        cls.journeys = [
+            cls.create_journey(
+                cls.route,
+                departure + datetime.timedelta(hours=i),
+                datetime.timedelta(hours=1),
+            )
+            for i in range(5)
+        ]
+        cls.journeys[0].crew.add(*crew)
+        order = Order.objects.create(user=cls.user)
+        Ticket.objects.create(cargo=1, seat=1, journey=cls.journeys[0], order=order)
+
+    def _get(self, dataset, **params):
+        response = self.client.get(reverse("transport:export", args=[dataset]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    @mock.patch("django.conf.settings.EXPORT_CHUNK_SIZE", 2)
+    def test_ndjson(self):
+        response, body = self._get("journeys")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [j.id for j in self.journeys])
+        crew_ids = sorted(self.journeys[0].crew.values_list("id", flat=True))
+        self.assertEqual(rows[0]["crew_ids"], crew_ids)
+        self.assertEqual(rows[1]["crew_ids"], [])
+
+    def test_csv_zstd(self):
+        response, body = self._get("tickets", output="csv", compression="zstd")
+        self.assertIn("tickets.csv.zst", response["Content-Disposition"])
+        text = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        rows = list(csv.reader(text.decode().splitlines()))
+        ticket = Ticket.objects.get()
+        self.assertEqual(rows[0], ["id", "order_id", "journey_id", "cargo", "seat"])
+        self.assertEqual(
+            rows[1],
+            [str(ticket.id), str(ticket.order_id), str(self.journeys[0].id), "1", "1"],
+        )
+
+    def test_rejected_requests(self):
+        url = reverse("transport:export", args=["orders"])
+        self.assertEqual(self.client.get(url, {"output": "xml"}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse("transport:export", args=["users"])).status_code,
+            404,
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="user@example.com", password="testpass"
+            )
+        )
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.ndjson")
+            call_command("export_data", "orders", "--output", path)
+            with open(path) as output:
+                rows = [json.loads(line) for line in output]
+        self.assertEqual(rows[0]["user_id"], self.user.id)
+
+
+class ImportTimetableCommandTest(TestCase):
+    def setUp(self):
+        self.station = Station.objects.create(name="Kyiv", latitude=50, longitude=30)
+        departure = (timezone.now() + datetime.timedelta(days=1)).replace(
+            microsecond=0
+        )
+        self.departure = departure
+        self.files = {
+            "stations": "name,latitude,longitude\nKyiv,50,30\nLviv,49.8,24\n",
+            "routes": "source,destination,distance\nKyiv,Lviv,540\n",
+            "trains": "name,cargo_num,places_in_cargo,train_type\n"
+            "Intercity 1,10,40,Intercity\n",
+            "crew": "first_name,last_name\nIvan,Franko\nLesya,Ukrainka\n",
+            "journeys": "ref,source,destination,train,departure_time,arrival_time\n"
+            + "".join(
+                f"j{i},Kyiv,Lviv,Intercity 1,"
+                f"{(departure + datetime.timedelta(hours=i)).isoformat()},"
+                f"{(departure + datetime.timedelta(hours=i + 6)).isoformat()}\n"
+                for i in range(5)
+            ),
+            "journey_crew": "journey,first_name,last_name\n"
+            "j0,Ivan,Franko\nj0,Lesya,Ukrainka\nj1,Ivan,Franko\nj1,Ivan,Franko\n",
+        }
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _import(self, *args, **files):
+        for name, content in {**self.files, **files}.items():
+            with open(os.path.join(self.directory.name, f"{name}.csv"), "w") as file:
+                file.write(content)
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_timetable",
+            self.directory.name,
+            "--batch-size",
+            "2",
+            *args,
+            stdout=out,
+            stderr=err,
+        )
+        return out.getvalue()
+
+    def test_import(self):
+        with CaptureQueriesContext(connection) as queries:
+            out = self._import()
+        self.assertIn("stations: 1 created, 1 existing", out)
+        self.assertIn("journey_crew: 3 created", out)
+        journeys = list(Journey.objects.order_by("departure_time"))
+        self.assertEqual(len(journeys), 5)
+        self.assertEqual(journeys[0].route.source, self.station)
+        self.assertEqual(journeys[0].route.destination.name, "Lviv")
+        self.assertEqual(journeys[0].train.train_type.name, "Intercity")
+        self.assertEqual(journeys[0].departure_time, self.departure)
+        self.assertEqual(journeys[0].crew.count(), 2)
+        self.assertEqual(journeys[1].crew.get().full_name, "Ivan Franko")
+        # Journeys are not inserted one statement per row
+        self.assertLess(len(queries), 25)
+
+        # Reference rows are matched by name on the next import
+        self._import(
+            journeys=self.files["journeys"].replace("j", "k"),
+            journey_crew="journey,first_name,last_name\n",
+        )
+        self.assertEqual(Station.objects.count(), 2)
+        self.assertEqual(Crew.objects.count(), 2)
+        self.assertEqual(Journey.objects.count(), 10)
+
+    def test_dry_run_rolls_back(self):
+        out = self._import("--dry-run")
+        self.assertIn("journeys: 5 created", out)
+        self.assertIn("rolled back", out)
+        self.assertEqual(Journey.objects.count(), 0)
+        self.assertEqual(Station.objects.count(), 1)
+
+    def test_non_finite_coordinates_are_rejected(self):
+        stations = "name,latitude,longitude\nKyiv,50,30\nLviv,nan,24\nOdesa,46,inf\n"
+        with self.assertRaisesMessage(CommandError, "2 invalid rows,"):
+            self._import(
+                stations=stations,
+                routes="source,destination,distance\n",
+                journeys=self.files["journeys"].splitlines()[0] + "\n",
+                journey_crew="journey,first_name,last_name\n",
+            )
+        self.assertFalse(Station.objects.filter(name="Lviv").exists())
+
+    def test_invalid_rows_are_reported_and_nothing_is_imported(self):
+        past = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        journeys = (
+            "ref,source,destination,train,departure_time,arrival_time\n"
+            f"a,Kyiv,Lviv,Intercity 1,{self.departure.isoformat()},yesterday\n"
+            f"b,Kyiv,Odesa,Intercity 1,{past},{past}\n"
+            f"c,Kyiv,Lviv,Missing,{past},{past}\n"
+        )
+        with self.assertRaisesMessage(CommandError, "4 invalid rows"):
+            self._import(
+                journeys=journeys,
+                journey_crew="journey,first_name,last_name\nj0,Ivan,Franko\n",
+            )
+        self.assertEqual(Journey.objects.count(), 0)
+        self.assertEqual(Station.objects.count(), 1)
+
+
+class GTFSTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@example.com", password="testpass"
+        )
+        self.kyiv = Station.objects.create(name="Kyiv", latitude=50.45, longitude=30.52)
+        self.lviv = Station.objects.create(name="Lviv", latitude=49.84, longitude=24.03)
+        self.route = Route.objects.create(
+            source=self.kyiv, destination=self.lviv, distance=540
+        )
+        self.train = Train.objects.create(
+            name="Intercity 1",
+            cargo_num=10,
+            places_in_cargo=40,
+            train_type=TrainType.objects.create(name="Intercity"),
+        )
+        start = datetime.datetime.combine(
+            timezone.now().date() + datetime.timedelta(days=2),
+            datetime.time(22, 15),
+            datetime.timezone.utc,
+        )
+        self.journeys = [
+            Journey.objects.create(
+                route=self.route,
+                train=self.train,
+                departure_time=start + datetime.timedelta(days=i),
+                arrival_time=start + datetime.timedelta(days=i, hours=3),
+            )
+            for i in range(3)
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _export(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(reverse("transport:export-gtfs"))
+        self.assertEqual(response.status_code, 200)
+        path = os.path.join(self.directory.name, "gtfs.zip")
+        with open(path, "wb") as feed:
+            feed.writelines(response.streaming_content)
+        return path
+
+    def _write_feed(self, **files):
+        path = os.path.join(self.directory.name, "feed.zip")
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, content in files.items():
+                archive.writestr(f"{name}.txt", content)
+        return path
+
+    def test_export(self):
+        with zipfile.ZipFile(self._export()) as archive:
+            self.assertIn("calendar_dates.txt", archive.namelist())
+            stop_times = list(
+                csv.DictReader(archive.read("stop_times.txt").decode().splitlines())
+            )
+        self.assertEqual(len(stop_times), 6)
+        first = [row for row in stop_times if row["trip_id"] == str(self.journeys[0].id)]
+        self.assertEqual(
+            [(row["stop_id"], row["departure_time"]) for row in first],
+            [(str(self.kyiv.id), "22:15:00"), (str(self.lviv.id), "25:15:00")],
+        )
+
+    def test_round_trip(self):
+        path = self._export()
+        expected = sorted(
+            Journey.objects.values_list("route", "train", "departure_time", "arrival_time")
+        )
+        Journey.objects.all().delete()
+        call_command("import_gtfs", path, stdout=StringIO())
+        self.assertEqual(
+            sorted(
+                Journey.objects.values_list(
+                    "route", "train", "departure_time", "arrival_time"
+                )
+            ),
+            expected,
+        )
+        self.assertEqual(Station.objects.count(), 2)
+        # Importing the same feed again adds nothing
+        out = StringIO()
+        call_command("import_gtfs", path, stdout=out)
+        self.assertIn("journeys created: 0", out.getvalue())
+
+    def test_import_calendar_and_parent_stations(self):
+        today = timezone.now().date()
+        start = today + datetime.timedelta(days=1)
+        end = today + datetime.timedelta(days=14)
+        removed = today + datetime.timedelta(days=3)
+        path = self._write_feed(
+            agency="agency_id,agency_name,agency_url,agency_timezone\n"
+            "1,Rail,https://example.com,Europe/Kyiv\n",
+            stops="stop_id,stop_name,stop_lat,stop_lon,parent_station\n"
+            "ODS,Odesa,46.47,30.73,\nODS1,Odesa platform 1,46.47,30.73,ODS\n"
+            "KYV,Kyiv,50.45,30.52,\n",
+            trips="route_id,service_id,trip_id,trip_short_name\n"
+            "R1,DAILY,T1,Night train\n",
+            stop_times="trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+            "T1,,21:00:00,ODS1,1\nT1,,,X,2\nT1,31:30:00,,KYV,3\n",
+            calendar="service_id,monday,tuesday,wednesday,thursday,friday,"
+            "saturday,sunday,start_date,end_date\n"
+            f"DAILY,1,1,1,1,1,1,1,{start:%Y%m%d},{end:%Y%m%d}\n",
+            calendar_dates="service_id,date,exception_type\n"
+            f"DAILY,{removed:%Y%m%d},2\n",
+        )
+        call_command("import_gtfs", path, "--train", "Intercity 1", stdout=StringIO())
+        route = Route.objects.get(source__name="Odesa")
+        self.assertEqual(route.destination, self.kyiv)
+        self.assertAlmostEqual(route.distance, 442, delta=5)
+        journeys = Journey.objects.filter(route=route).order_by("departure_time")
+        self.assertEqual(len(journeys), 13)
+        self.assertNotIn(
+            removed, [journey.departure_time.date() for journey in journeys]
+        )
+        kyiv_time = zoneinfo.ZoneInfo("Europe/Kyiv")
+        first = journeys[0]
+        self.assertEqual(first.train, self.train)
+        self.assertEqual(
+            first.departure_time.astimezone(kyiv_time).replace(tzinfo=None),
+            datetime.datetime.combine(start, datetime.time(21)),
+        )
+        self.assertEqual(
+            first.arrival_time - first.departure_time, datetime.timedelta(hours=10.5)
+        )
+
+    def test_repeated_trip_is_imported_once(self):
+        day = timezone.now().date() + datetime.timedelta(days=2)
+        path = self._write_feed(
+            agency="agency_id,agency_name,agency_url,agency_timezone\n"
+            "1,Rail,https://example.com,UTC\n",
+            stops="stop_id,stop_name,stop_lat,stop_lon\n"
+            "KYV,Kyiv,50.45,30.52\nLVV,Lviv,49.84,24.03\n",
+            trips="route_id,service_id,trip_id,trip_short_name\n"
+            "R1,S,T1,Intercity 1\nR1,S,T2,Intercity 1\n",
+            stop_times="trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+            "T1,,06:00:00,KYV,1\nT1,12:00:00,,LVV,2\n"
+            "T2,,06:00:00,KYV,1\nT2,12:00:00,,LVV,2\n",
+            calendar_dates=f"service_id,date,exception_type\nS,{day:%Y%m%d},1\n",
+        )
+        out = StringIO()
+        call_command("import_gtfs", path, stdout=out)
+        self.assertIn("journeys created: 1", out.getvalue())
+        departure = datetime.datetime.combine(
+            day, datetime.time(6), datetime.timezone.utc
+        )
+        self.assertEqual(
+            Journey.objects.filter(route=self.route, departure_time=departure).count(),
+            1,
+        )
+
+    def test_invalid_feed_imports_nothing(self):
+        path = self._write_feed(
+            agency="agency_id,agency_name,agency_url,agency_timezone\n"
+            "1,Rail,https://example.com,UTC\n",
+            stops="stop_id,stop_name,stop_lat,stop_lon\nA,New A,1,1\nB,New B,2,2\n",
+            trips="route_id,service_id,trip_id\nR1,S,T1\n",
+            stop_times="trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+            "T1,08:00:00,08:00:00,A,1\nT1,9 o'clock,,B,2\n",
+            calendar_dates="service_id,date,exception_type\nS,20990101,1\n",
+        )
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("import_gtfs", path, stdout=StringIO(), stderr=err)
+        self.assertIn("without a valid time", err.getvalue())
+        self.assertIn("trip_short_name", err.getvalue())
+        self.assertFalse(Station.objects.filter(name="New A").exists())
+
+    def test_feed_rows_the_models_would_reject(self):
+        path = self._write_feed(
+            agency="agency_id,agency_name,agency_url,agency_timezone\n"
+            "1,Rail,https://example.com,UTC\n",
+            stops="stop_id,stop_name,stop_lat,stop_lon\n"
+            f"A,New A,1,1\nB,{'B' * 256},2,2\n",
+            trips="route_id,service_id,trip_id,trip_short_name\n"
+            "R1,S,T1,Intercity 1\n",
+            stop_times="trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+            "T1,09:00:00,09:00:00,A,1\nT1,08:00:00,08:00:00,B,2\n",
+            calendar_dates="service_id,date,exception_type\nS,20990101,1\n",
+        )
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("import_gtfs", path, stdout=StringIO(), stderr=err)
+        errors = err.getvalue()
+        self.assertIn("1 stops have no stop_name or one longer than 255", errors)
+        self.assertIn("1 trips do not arrive after they depart", errors)
+        self.assertNotIn("trip_short_name", errors)
+        self.assertFalse(Station.objects.filter(name="New A").exists())
+
+
+class SeedScaleCommandTest(TestCase):
+    options = {
+        "seed": 3,
+        "stations": 12,
+        "routes": 20,
+        "trains": 6,
+        "crew": 10,
+        "users": 25,
+        "days": 2,
+        "journeys_per_day": 2,
+        "tickets": 15000,
+        "sold_out": 0.1,
+    }
+
+    def _seed(self, **options):
+        out = StringIO()
+        call_command("seed_scale", stdout=out, **{**self.options, **options})
+        return out.getvalue()
+
+    def _signature(self):
+        return sorted(
+            Ticket.objects.values_list(
+                "journey__route__source__name",
+                "journey__route__destination__name",
+                "journey__departure_time",
+                "journey__train__name",
+                "cargo",
+                "seat",
+                "order__user__email",
+            )
+        )
+
+    def test_generates_consistent_dataset(self):
+        self.assertIn("Seeded", self._seed())
+        self.assertEqual(Station.objects.count(), 12)
+        self.assertEqual(Route.objects.count(), 20)
+        self.assertEqual(Journey.objects.count(), 80)
+        self.assertEqual(get_user_model().objects.count(), 25)
+        tickets = Ticket.objects.count()
+        self.assertAlmostEqual(tickets, 15000, delta=1500)
+        self.assertFalse(
+            Ticket.objects.filter(
+                Q(cargo__gt=F("journey__train__cargo_num"))
+                | Q(seat__gt=F("journey__train__places_in_cargo"))
+                | Q(cargo__lt=1)
+                | Q(seat__lt=1)
+            ).exists()
+        )
+        self.assertFalse(Order.objects.filter(ticket__isnull=True).exists())
+        sold = dict(
+            Ticket.objects.values_list("journey").annotate(count=Count("pk"))
+        )
+        occupancy = JourneyOccupancy.objects.all()
+        self.assertEqual(len(occupancy), 80)
+        self.assertEqual(
+            {row.journey_id: row.sold for row in occupancy if row.sold}, sold
+        )
+        self.assertTrue(any(row.seats_available == 0 for row in occupancy))
+        out = StringIO()
+        call_command("reconcile_occupancy", stdout=out)
+        self.assertIn("0 journeys fixed", out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, "already loaded"):
+            self._seed()
+
+    def test_same_seed_same_dataset(self):
+        with transaction.atomic():
+            self._seed()
+            signature = self._signature()
+            transaction.set_rollback(True)
+        self._seed()
+        self.assertEqual(self._signature(), signature)
+
+    def test_rejects_more_tickets_than_seats(self):
+        with self.assertRaisesMessage(CommandError, "do not fit"):
+            self._seed(tickets=10**7)
+        self.assertFalse(Station.objects.exists())
+
+
+class BenchmarkCommandTest(TestCase):
+    def setUp(self):
+        call_command(
+            "seed_scale",
+            stdout=StringIO(),
+            seed=4,
+            stations=6,
+            routes=8,
+            trains=3,
+            crew=5,
+            users=5,
+            days=2,
+            journeys_per_day=1,
+            tickets=2000,
+            sold_out=0.1,
+        )
+        self.output = os.path.join(tempfile.mkdtemp(), "benchmark.json")
+        self.options = {
+            "email": "seed4.user1@example.com",
+            "iterations": 3,
+            "warmup": 1,
+            "profile_iterations": 1,
+            "stdout": StringIO(),
+            "stderr": StringIO(),
+        }
+
+    def test_reports_every_case(self):
+        orders = Order.objects.count()
+        call_command("benchmark", output=self.output, **self.options)
+        with open(self.output) as file:
+            results = json.load(file)
+        self.assertEqual(set(results["results"]), set(benchmark.CASES))
+        self.assertEqual(results["dataset"]["orders"], orders)
+        for metrics in results["results"].values():
+            self.assertLessEqual(metrics["p50_ms"], metrics["p99_ms"])
+            self.assertGreater(metrics["allocated_bytes"], 0)
+        self.assertEqual(results["results"]["journey.retrieve"]["queries"], 2)
+        self.assertEqual(Order.objects.count(), orders)
+
+    def test_baseline_regressions_fail(self):
+        options = {**self.options, "cases": ["journey.retrieve", "station.list"]}
+        call_command("benchmark", output=self.output, **options)
+        call_command(
+            "benchmark",
+            baseline=self.output,
+            latency_tolerance=100.0,
+            allocated_bytes_tolerance=100.0,
+            **options,
+        )
+
+        with open(self.output) as file:
+            baseline = json.load(file)
+        baseline["results"]["journey.retrieve"]["queries"] = 1
+        with open(self.output, "w") as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, "1 metrics regressed"):
+            call_command(
+                "benchmark",
+                baseline=self.output,
+                latency_tolerance=100.0,
+                allocated_bytes_tolerance=100.0,
+                **options,
+            )
+
+    def test_percentile(self):
+        self.assertEqual(benchmark.percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4, 5], 99), 4.96)
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import throttling
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """Rate throttle with two integer counters per client instead of a history.
+
+    Requests are counted in fixed windows of the rate's duration. The rate is
+    estimated over the last ``duration`` seconds by weighting the previous
+    window's count by how much of it still overlaps. A request takes a slot
+    with an atomic ``incr`` and gives it back when over the limit, so
+    concurrent workers cannot overshoot it. State lives in
+    ``settings.THROTTLE_CACHE``, which must support atomic ``add``/``incr``.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        current_key = f"{self.key}:{window}"
+        previous_key = f"{self.key}:{window - 1}"
+
+        self.current = self._increment(current_key)
+        self.previous = self.cache.get(previous_key, 0)
+        self.elapsed = self.now - window * self.duration
+        estimate = self.previous * (1 - self.elapsed / self.duration) + self.current
+        if estimate > self.num_requests:
+            self.cache.incr(current_key, -1)
+            self.current -= 1
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def _increment(self, key):
+        # Kept for two windows so it can be read as the previous one
+        if self.cache.add(key, 1, 2 * self.duration):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.add(key, 0, 2 * self.duration)
+            return self.cache.incr(key)
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        """Seconds until the estimate drops enough to admit one more request"""
+        allowed = self.num_requests - 1
+        if self.current <= allowed:
+            # Wait for the previous window to slide out far enough
+            needed = self.duration * (1 - (allowed - self.current) / self.previous)
+            return max(needed - self.elapsed, 0)
+        # The current window becomes the previous one first
+        remaining = self.duration - self.elapsed
+        return remaining + self.duration * (1 - allowed / self.current)
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowRateThrottle):
+    pass
@@ -0,0 +1,168 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+from transport.cache import VersionedObject
+from transport.models import Journey, Route
+
+DEFAULT_MIN_TRANSFER_MINUTES = 10
+
+# Parallel arrays, one element per journey, sorted by departure time
+COLUMNS = ("departures", "arrivals", "sources", "destinations", "routes", "journeys")
+
+
+def to_timestamp(value):
+    return int(value.timestamp())
+
+
+def from_timestamp(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
+class Timetable:
+    """Connection scan over journeys held in sorted ``array('q')`` columns.
+
+    Changes replace the columns as a whole (copy on write), so a scan always
+    works on a consistent snapshot without locking.
+    """
+
+    def __init__(self, rows=()):
+        rows = sorted(rows, key=lambda row: (row[3], row[0]))
+        self.columns = (
+            array("q", (to_timestamp(row[3]) for row in rows)),
+            array("q", (to_timestamp(row[4]) for row in rows)),
+            array("q", (row[1] for row in rows)),
+            array("q", (row[2] for row in rows)),
+            array("q", (row[5] for row in rows)),
+            array("q", (row[0] for row in rows)),
+        )
+
+    @classmethod
+    def from_database(cls):
+        return cls(
+            Journey.objects.filter(arrival_time__gte=timezone.now()).values_list(
+                "id",
+                "route__source_id",
+                "route__destination_id",
+                "departure_time",
+                "arrival_time",
+                "route_id",
+            )
+        )
+
+    def __len__(self):
+        return len(self.columns[0])
+
+    def _index_of(self, columns, journey_id):
+        try:
+            return columns[5].index(journey_id)
+        except ValueError:
+            return None
+
+    def set_journey(
+        self, journey_id, source_id, destination_id, departure, arrival, route_id
+    ):
+        columns = tuple(array("q", column) for column in self.columns)
+        index = self._index_of(columns, journey_id)
+        if index is not None:
+            for column in columns:
+                del column[index]
+        departure, arrival = to_timestamp(departure), to_timestamp(arrival)
+        index = bisect_right(columns[0], departure)
+        for column, value in zip(
+            columns,
+            (departure, arrival, source_id, destination_id, route_id, journey_id),
+        ):
+            column.insert(index, value)
+        self.columns = columns
+
+    def remove_journey(self, journey_id):
+        index = self._index_of(self.columns, journey_id)
+        if index is None:
+            return
+        columns = tuple(array("q", column) for column in self.columns)
+        for column in columns:
+            del column[index]
+        self.columns = columns
+
+    def set_route(self, route_id, source_id, destination_id):
+        columns = tuple(array("q", column) for column in self.columns)
+        sources, destinations, routes = columns[2], columns[3], columns[4]
+        for index, value in enumerate(routes):
+            if value == route_id:
+                sources[index] = source_id
+                destinations[index] = destination_id
+        self.columns = columns
+
+    def earliest_arrival(
+        self,
+        source_id,
+        destination_id,
+        departure_after,
+        min_transfer_minutes=DEFAULT_MIN_TRANSFER_MINUTES,
+    ):
+        """Return the legs of the earliest arriving itinerary, or None.
+
+        Each leg is a dict with the journey, route, stations and times.
+        Changing at a station needs ``min_transfer_minutes`` after arrival.
+        """
+        departures, arrivals, sources, destinations, routes, journeys = self.columns
+        transfer = int(min_transfer_minutes * 60)
+        # Earliest time a journey may depart from each reached station
+        ready = {source_id: to_timestamp(departure_after)}
+        arrival_at = {}
+        via = {}
+        best = None
+
+        for index in range(bisect_left(departures, ready[source_id]), len(departures)):
+            departure = departures[index]
+            if best is not None and departure >= best:
+                break
+            station = sources[index]
+            if station not in ready or ready[station] > departure:
+                continue
+            arrival = arrivals[index]
+            next_station = destinations[index]
+            if next_station == source_id or arrival >= arrival_at.get(
+                next_station, arrival + 1
+            ):
+                continue
+            arrival_at[next_station] = arrival
+            ready[next_station] = arrival + transfer
+            via[next_station] = index
+            if next_station == destination_id:
+                best = arrival
+
+        if best is None:
+            return None
+
+        legs = []
+        station = destination_id
+        while station != source_id:
+            index = via[station]
+            legs.append(
+                {
+                    "journey": journeys[index],
+                    "route": routes[index],
+                    "source": sources[index],
+                    "destination": destinations[index],
+                    "departure_time": from_timestamp(departures[index]),
+                    "arrival_time": from_timestamp(arrivals[index]),
+                }
+            )
+            station = sources[index]
+        return legs[::-1]
+
+
+timetable = VersionedObject((Journey, Route), Timetable.from_database)
+
+
+def get_timetable():
+    """Return the process-wide timetable, reloading it after changes made elsewhere"""
+    return timetable.get()
+
+
+def reset_timetable():
+    timetable.reset()
@@ -0,0 +1,325 @@
+import csv
+import functools
+import math
+import os
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from transport.cache import bump_versions
+from transport.models import Crew, Journey, Route, Station, Train, TrainType
+
+# Rows validated, and then written to the staging tables, per step
+BATCH_SIZE = 10000
+
+# Errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Marks a natural key that matches several existing rows
+AMBIGUOUS = object()
+
+COLUMNS = {
+    "stations": ("name", "latitude", "longitude"),
+    "routes": ("source", "destination", "distance"),
+    "trains": ("name", "cargo_num", "places_in_cargo", "train_type"),
+    "crew": ("first_name", "last_name"),
+    "journeys": (
+        "ref",
+        "source",
+        "destination",
+        "train",
+        "departure_time",
+        "arrival_time",
+    ),
+    "journey_crew": ("journey", "first_name", "last_name"),
+}
+
+
+def _lookup(pairs):
+    """Map natural keys to ids, marking keys shared by several rows"""
+    lookup = {}
+    for key, pk in pairs:
+        lookup[key] = AMBIGUOUS if key in lookup else pk
+    return lookup
+
+
+def _text(row, column):
+    value = row[column].strip()
+    if not value:
+        raise ValueError(f"{column}: This field may not be blank.")
+    if len(value) > 255:
+        raise ValueError(f"{column}: Ensure this field has at most 255 characters.")
+    return value
+
+
+def _number(row, column, convert, minimum, maximum=None):
+    try:
+        value = convert(row[column])
+    except ValueError:
+        raise ValueError(f"{column}: A valid number is required.") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{column}: A valid number is required.")
+    if value < minimum:
+        raise ValueError(f"{column}: Ensure this value is at least {minimum}.")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{column}: Ensure this value is at most {maximum}.")
+    return value
+
+
+def _datetime(row, column):
+    try:
+        value = parse_datetime(row[column].strip())
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValueError(f"{column}: A valid ISO 8601 datetime is required.")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _resolve(lookup, key, column):
+    pk = lookup.get(key)
+    if pk is None:
+        raise ValueError(f"{column}: {key} does not exist.")
+    if pk is AMBIGUOUS:
+        raise ValueError(f"{column}: {key} matches several rows.")
+    return pk
+
+
+class TimetableImport:
+    """Load a directory of timetable CSV files into the database.
+
+    Every file is optional; they are read in the order of ``COLUMNS``.
+    Stations, routes, trains and crew are matched on natural keys (names)
+    against lookup maps built up front, and only missing rows are inserted.
+    Journeys, identified by a ``ref`` column local to the import, and their
+    crew are streamed through ``COPY`` into temporary staging tables and
+    moved into place with one ``INSERT ... SELECT`` each, so they never go
+    through ``Journey.save``.
+
+    Everything runs in one transaction, which is rolled back on any
+    validation error or when ``dry_run`` is set.
+    """
+
+    def __init__(self, directory, batch_size=BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.errors = []
+        self.error_count = 0
+        self.counts = {}
+
+    def run(self, dry_run=False):
+        with transaction.atomic():
+            self._load()
+            if dry_run or self.error_count:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(
+                    functools.partial(
+                        bump_versions, Station, Route, TrainType, Train, Crew, Journey
+                    )
+                )
+        return not self.error_count
+
+    def _load(self):
+        self.stations = _lookup(Station.objects.values_list("name", "id"))
+        self.routes = _lookup(
+            ((source, destination), pk)
+            for source, destination, pk in Route.objects.values_list(
+                "source_id", "destination_id", "id"
+            )
+        )
+        self.train_types = _lookup(TrainType.objects.values_list("name", "id"))
+        self.trains = _lookup(Train.objects.values_list("name", "id"))
+        self.crew = _lookup(
+            ((first_name, last_name), pk)
+            for first_name, last_name, pk in Crew.objects.values_list(
+                "first_name", "last_name", "id"
+            )
+        )
+        self.refs = set()
+        self.now = timezone.now()
+
+        self._load_objects("stations", self.stations, self._station)
+        self._load_objects("routes", self.routes, self._route)
+        self._load_objects("trains", self.trains, self._train)
+        self._load_objects("crew", self.crew, self._crew_member)
+        with connection.cursor() as cursor:
+            self._create_staging_tables(cursor)
+            self._copy(
+                cursor,
+                "journeys",
+                "import_journey "
+                "(ref, route_id, train_id, departure_time, arrival_time)",
+                self._journey,
+            )
+            self._copy(
+                cursor,
+                "journey_crew",
+                "import_journey_crew (ref, crew_id)",
+                self._crew_link,
+            )
+            if not self.error_count:
+                self._move_staged_rows(cursor)
+
+    def error(self, name, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{name}.csv:{line}: {message}")
+
+    def _rows(self, name):
+        """Yield ``(line number, row)`` for each row of ``name``.csv, if present"""
+        path = os.path.join(self.directory, f"{name}.csv")
+        if not os.path.exists(path):
+            return
+        with open(path, newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            missing = set(COLUMNS[name]) - set(reader.fieldnames or ())
+            if missing:
+                self.error(name, 1, f"Missing columns: {', '.join(sorted(missing))}")
+                return
+            for row in reader:
+                yield reader.line_num, row
+
+    def _load_objects(self, name, lookup, parse):
+        """Insert the rows of ``name`` whose natural key is not in ``lookup``"""
+        new = {}
+        existing = 0
+        for line, row in self._rows(name):
+            try:
+                key, obj = parse(row)
+            except ValueError as exc:
+                self.error(name, line, exc)
+                continue
+            if key in new:
+                self.error(name, line, f"Duplicate of an earlier row: {key}")
+            elif key in lookup:
+                existing += 1
+            else:
+                new[key] = obj
+        if new:
+            model = type(next(iter(new.values())))
+            model.objects.bulk_create(new.values(), batch_size=self.batch_size)
+            lookup.update((key, obj.pk) for key, obj in new.items())
+        self.counts[name] = {"created": len(new), "existing": existing}
+
+    def _station(self, row):
+        name = _text(row, "name")
+        return name, Station(
+            name=name,
+            latitude=_number(row, "latitude", float, -90.0, 90.0),
+            longitude=_number(row, "longitude", float, -180.0, 180.0),
+        )
+
+    def _route(self, row):
+        source = _resolve(self.stations, _text(row, "source"), "source")
+        destination = _resolve(self.stations, _text(row, "destination"), "destination")
+        return (source, destination), Route(
+            source_id=source,
+            destination_id=destination,
+            distance=_number(row, "distance", int, 0),
+        )
+
+    def _train(self, row):
+        train = Train(
+            name=_text(row, "name"),
+            cargo_num=_number(row, "cargo_num", int, 0, 100),
+            places_in_cargo=_number(row, "places_in_cargo", int, 0, 100),
+        )
+        type_name = _text(row, "train_type")
+        if type_name not in self.train_types:
+            self.train_types[type_name] = TrainType.objects.create(name=type_name).pk
+        train.train_type_id = self.train_types[type_name]
+        return train.name, train
+
+    def _crew_member(self, row):
+        key = (_text(row, "first_name"), _text(row, "last_name"))
+        return key, Crew(first_name=key[0], last_name=key[1])
+
+    def _create_staging_tables(self, cursor):
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id')", [Journey._meta.db_table]
+        )
+        (sequence,) = cursor.fetchone()
+        # Ids are drawn from the journey sequence as rows are copied
+        for statement in (
+            "DROP TABLE IF EXISTS pg_temp.import_journey, pg_temp.import_journey_crew",
+            "CREATE TEMPORARY TABLE import_journey ("
+            "ref text NOT NULL, "
+            f"id bigint NOT NULL DEFAULT nextval('{sequence}'::regclass), "
+            "route_id bigint NOT NULL, "
+            "train_id bigint NOT NULL, "
+            "departure_time timestamptz NOT NULL, "
+            "arrival_time timestamptz NOT NULL"
+            ") ON COMMIT DROP",
+            "CREATE TEMPORARY TABLE import_journey_crew ("
+            "ref text NOT NULL, crew_id bigint NOT NULL"
+            ") ON COMMIT DROP",
+        ):
+            cursor.execute(statement)
+
+    def _copy(self, cursor, name, table, parse):
+        """Validate the rows of ``name`` in batches and COPY the valid ones"""
+        count = 0
+        batch = []
+        with cursor.copy(f"COPY {table} FROM STDIN") as copy:
+            for line, row in self._rows(name):
+                try:
+                    batch.append(parse(row))
+                except ValueError as exc:
+                    self.error(name, line, exc)
+                if len(batch) == self.batch_size:
+                    for values in batch:
+                        copy.write_row(values)
+                    count += len(batch)
+                    batch = []
+            for values in batch:
+                copy.write_row(values)
+            count += len(batch)
+        self.counts[name] = {"created": count}
+
+    def _journey(self, row):
+        ref = _text(row, "ref")
+        if ref in self.refs:
+            raise ValueError(f"ref: Duplicate of an earlier row: {ref}")
+        source = _resolve(self.stations, _text(row, "source"), "source")
+        destination = _resolve(self.stations, _text(row, "destination"), "destination")
+        route = _resolve(self.routes, (source, destination), "route")
+        train = _resolve(self.trains, _text(row, "train"), "train")
+        departure_time = _datetime(row, "departure_time")
+        arrival_time = _datetime(row, "arrival_time")
+        # Same rules as Journey.clean
+        if departure_time < self.now:
+            raise ValueError("departure_time: Departure time cannot be in the past.")
+        if arrival_time < departure_time:
+            raise ValueError(
+                "arrival_time: Arrival time cannot be earlier than departure time."
+            )
+        self.refs.add(ref)
+        return ref, route, train, departure_time, arrival_time
+
+    def _crew_link(self, row):
+        ref = _text(row, "journey")
+        if ref not in self.refs:
+            raise ValueError(f"journey: {ref} is not in journeys.csv.")
+        key = (_text(row, "first_name"), _text(row, "last_name"))
+        return ref, _resolve(self.crew, key, "crew")
+
+    def _move_staged_rows(self, cursor):
+        cursor.execute(
+            f"INSERT INTO {Journey._meta.db_table} "
+            "(id, route_id, train_id, departure_time, arrival_time) "
+            "SELECT id, route_id, train_id, departure_time, arrival_time "
+            "FROM import_journey"
+        )
+        cursor.execute("ANALYZE import_journey, import_journey_crew")
+        cursor.execute(
+            f"INSERT INTO {Journey.crew.through._meta.db_table} "
+            "(journey_id, crew_id) "
+            "SELECT DISTINCT journey.id, link.crew_id "
+            "FROM import_journey_crew link "
+            "JOIN import_journey journey ON journey.ref = link.ref"
+        )
+        self.counts["journey_crew"]["created"] = cursor.rowcount
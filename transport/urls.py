@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
 
+from transport.async_views import async_read_view
 
 from transport.views import (
     StationViewSet,
@@ -10,6 +12,10 @@ from transport.views import (
     CrewViewSet,
     JourneyViewSet,
     OrderViewSet,
+    SeatHoldViewSet,
+    MetricsView,
+    ExportView,
+    GTFSExportView,
 )
 
 router = routers.DefaultRouter()
@@ -20,7 +26,47 @@ router.register("routes", RouteViewSet)
 router.register("crews", CrewViewSet)
 router.register("journey", JourneyViewSet)
 router.register("orders", OrderViewSet)
+router.register("holds", SeatHoldViewSet, basename="hold")
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("", include(router.urls)),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
+    path("export/gtfs/", GTFSExportView.as_view(), name="export-gtfs"),
+    path("export/<str:dataset>/", ExportView.as_view(), name="export"),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    # Searches are served on the async ORM, writes stay on the sync ViewSets
+    urlpatterns = [
+        path(
+            "journey/",
+            async_read_view(
+                JourneyViewSet, {"get": "list", "post": "create"}, basename="journey"
+            ),
+            name="journey-list",
+        ),
+        path(
+            "journey/<int:pk>/",
+            async_read_view(
+                JourneyViewSet,
+                {
+                    "get": "retrieve",
+                    "put": "update",
+                    "patch": "partial_update",
+                    "delete": "destroy",
+                },
+                basename="journey",
+                detail=True,
+            ),
+            name="journey-detail",
+        ),
+        path(
+            "routes/",
+            async_read_view(
+                RouteViewSet, {"get": "list", "post": "create"}, basename="route"
+            ),
+            name="route-list",
+        ),
+    ] + urlpatterns
 
 app_name = "transport"
@@ -1,10 +1,21 @@
+import datetime
+
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Max, Min, Prefetch
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, extend_schema
-from rest_framework import viewsets, mixins
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from transport.models import (
     Station,
@@ -14,6 +25,7 @@ from transport.models import (
     Crew,
     Journey,
     Order,
+    Ticket,
 )
 from transport.serializers import (
     TrainListSerializer,
@@ -29,87 +41,185 @@ from transport.serializers import (
     JourneyDetailSerializer,
     OrderSerializer,
     OrderListSerializer,
+    SeatMapSerializer,
+    RoutePlanSerializer,
+    RouteCalendarDaySerializer,
+    ConnectionPlanSerializer,
+    StationDistanceSerializer,
+    SeatHoldSerializer,
+    SeatAllocationSerializer,
 )
+from transport import metrics
+from transport.async_views import AsyncReadMixin
+from transport.booking import (
+    active_holds,
+    cancel_hold,
+    confirm_hold,
+    seats_available,
+)
+from transport.cache import cache_response
+from transport.export import COMPRESSIONS, DATASETS, OUTPUT_FORMATS, export_stream
+from transport.filters import (
+    DateTimeFilter,
+    FilterSetBackend,
+    JourneyFilter,
+    TrainFilter,
+)
+from transport.gtfs import export_feed
+from transport.pagination import (
+    AsyncPageNumberPagination,
+    PageNumberOrKeysetPagination,
+)
+from transport.routing import get_route_graph
+from transport.seat_map import SeatMap
+from transport.spatial import get_station_index
+from transport.timetable import DEFAULT_MIN_TRANSFER_MINUTES, get_timetable
+from user.authentication import CachedUserJWTAuthentication
+
+
+def _station_params(query_params):
+    """Read the required ``from``/``to`` station ids of a trip search"""
+    stations = {}
+    for param in ("from", "to"):
+        value = query_params.get(param, "")
+        if not value.isdigit():
+            raise ValidationError({param: "A valid station id is required."})
+        stations[param] = int(value)
+    return stations
 
 
 class StationViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, GenericViewSet):
     queryset = Station.objects.all().order_by("id")
     serializer_class = StationSerializer
     pagination_class = PageNumberPagination
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedUserJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
+    cache_models = (Station,)
 
+    max_nearest = 100
 
-class TrainTypeViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, GenericViewSet):
-    queryset = TrainType.objects.all().order_by("id")
-    serializer_class = TrainTypeSerializer
-    pagination_class = PageNumberPagination
-    authentication_classes = (JWTAuthentication,)
-    permission_classes = (IsAuthenticated,)
-
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-class TrainViewSet(viewsets.ModelViewSet):
-    queryset = Train.objects.select_related("train_type").order_by("id")
-    authentication_classes = (JWTAuthentication,)
-    permission_classes = (IsAuthenticated,)
-    pagination_class = PageNumberPagination
+    def get_serializer_class(self):
+        if self.action in ("nearby", "nearest"):
+            return StationDistanceSerializer
+        return StationSerializer
 
     @staticmethod
-    def _params_to_ints(qs):
-        """Converts a list of string IDs to a list of integers"""
-        return [int(str_id) for str_id in qs.split(",")]
-
-    def get_queryset(self):
-        """Retrieve the trains with filters"""
-        name = self.request.query_params.get("name")
-        train_types = self.request.query_params.get("train_types")
-        cargo_num = self.request.query_params.get("cargo_num")
-        places_in_cargo = self.request.query_params.get("places_in_cargo")
-
-        queryset = self.queryset
-
-        if name:
-            queryset = queryset.filter(name__icontains=name)
-
-        if cargo_num and cargo_num.isdigit():
-            queryset = queryset.filter(cargo_num=cargo_num)
-
-        if places_in_cargo and places_in_cargo.isdigit():
-            queryset = queryset.filter(places_in_cargo=places_in_cargo)
-
-        if train_types:
-            train_type_ids = self._params_to_ints(train_types)
-            queryset = queryset.filter(train_type__id__in=train_type_ids)
-
-        return queryset.distinct()
+    def _float_param(query_params, name, minimum, maximum):
+        try:
+            value = float(query_params[name])
+        except (KeyError, ValueError):
+            raise ValidationError({name: "A number is required."})
+        if not (minimum <= value <= maximum):
+            raise ValidationError(
+                {name: f"Must be between {minimum} and {maximum}."}
+            )
+        return value
+
+    def _location(self, query_params):
+        return (
+            self._float_param(query_params, "lat", -90.0, 90.0),
+            self._float_param(query_params, "lon", -180.0, 180.0),
+        )
+
+    def _distance_response(self, matches):
+        stations = Station.objects.in_bulk([station_id for _, station_id in matches])
+        results = []
+        for distance, station_id in matches:
+            station = stations.get(station_id)
+            if station is not None:
+                station.distance = round(distance, 3)
+                results.append(station)
+        return Response(self.get_serializer(results, many=True).data)
 
     @extend_schema(
         parameters=[
             OpenApiParameter(
-                "name",
-                type=OpenApiTypes.STR,
-                description="Filter by train name (ex. ?name=train1)",
+                "lat", type=OpenApiTypes.FLOAT, required=True, description="Latitude"
             ),
             OpenApiParameter(
-                "train_types",
-                type={"type": "list", "items": {"type": "number"}},
-                description="Filter by train_types id (ex. ?train_types=2,5)",
+                "lon", type=OpenApiTypes.FLOAT, required=True, description="Longitude"
             ),
             OpenApiParameter(
-                "cargo_num",
-                type=OpenApiTypes.INT,
-                description="Filter by number of cargo (ex. ?cargo_num=10)",
+                "radius",
+                type=OpenApiTypes.FLOAT,
+                required=True,
+                description="Search radius in km (ex. ?radius=25)",
             ),
+        ]
+    )
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def nearby(self, request):
+        """Stations within a radius, nearest first"""
+        latitude, longitude = self._location(request.query_params)
+        radius = self._float_param(request.query_params, "radius", 0.0, 20040.0)
+        return self._distance_response(
+            get_station_index().within(latitude, longitude, radius)
+        )
+
+    @extend_schema(
+        parameters=[
             OpenApiParameter(
-                "places_in_cargo",
+                "lat", type=OpenApiTypes.FLOAT, required=True, description="Latitude"
+            ),
+            OpenApiParameter(
+                "lon", type=OpenApiTypes.FLOAT, required=True, description="Longitude"
+            ),
+            OpenApiParameter(
+                "k",
                 type=OpenApiTypes.INT,
-                description="Filter by places in cargo (ex. ?places_in_cargo=50)",
+                description="Number of stations to return, 5 by default (max 100)",
             ),
         ]
     )
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def nearest(self, request):
+        """The k nearest stations"""
+        latitude, longitude = self._location(request.query_params)
+        k = request.query_params.get("k", "5")
+        if not k.isdigit() or not (1 <= int(k) <= self.max_nearest):
+            raise ValidationError(
+                {"k": f"Must be an integer between 1 and {self.max_nearest}."}
+            )
+        return self._distance_response(
+            get_station_index().nearest(latitude, longitude, int(k))
+        )
+
+
+class TrainTypeViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, GenericViewSet):
+    queryset = TrainType.objects.all().order_by("id")
+    serializer_class = TrainTypeSerializer
+    pagination_class = PageNumberPagination
+    authentication_classes = (CachedUserJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    cache_models = (TrainType,)
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class TrainViewSet(viewsets.ModelViewSet):
+    queryset = Train.objects.select_related("train_type").order_by("id")
+    authentication_classes = (CachedUserJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    pagination_class = PageNumberOrKeysetPagination
+    keyset_ordering = ("id",)
+    cache_models = (Train, TrainType)
+    filter_backends = (FilterSetBackend,)
+    filterset_class = TrainFilter
+
+    @cache_response
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def get_serializer_class(self):
         if self.action == "list":
             return TrainListSerializer
@@ -118,35 +228,190 @@ class TrainViewSet(viewsets.ModelViewSet):
         return TrainListSerializer
 
 
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     queryset = (
         Route.objects.all().select_related("source", "destination").order_by("id")
     )
     serializer_class = RouteSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedUserJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
-    pagination_class = PageNumberPagination
+    pagination_class = AsyncPageNumberPagination
+    cache_models = (Route, Station)
+
+    max_calendar_days = 366
 
+    @cache_response
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @cache_response
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
+    @cache_response
+    async def aretrieve(self, request, *args, **kwargs):
+        return await super().aretrieve(request, *args, **kwargs)
+
+    def get_cache_models(self):
+        if self.action == "calendar":
+            # Bookings, journeys and trains bump only their routes' versions
+            return (Route, (Route, self.kwargs["pk"]))
+        return self.cache_models
+
     def get_serializer_class(self):
         if self.action == "list":
             return RouteListSerializer
         if self.action == "retrieve":
             return RouteDetailSerializer
+        if self.action == "plan":
+            return RoutePlanSerializer
+        if self.action == "calendar":
+            return RouteCalendarDaySerializer
         return RouteSerializer
 
+    def _calendar_params(self, query_params):
+        start = timezone.localdate()
+        if query_params.get("from"):
+            try:
+                start = parse_date(query_params["from"])
+            except ValueError:
+                start = None
+            if start is None:
+                raise ValidationError({"from": "A valid date is required."})
+        days = query_params.get("days", "60")
+        if not days.isdigit() or not (1 <= int(days) <= self.max_calendar_days):
+            raise ValidationError(
+                {"days": f"Must be an integer between 1 and {self.max_calendar_days}."}
+            )
+        return start, int(days)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "from",
+                type=OpenApiTypes.DATE,
+                description="First day, today by default (ex. ?from=2025-05-01)",
+            ),
+            OpenApiParameter(
+                "days",
+                type=OpenApiTypes.INT,
+                description="Number of days, 60 by default (max 366)",
+            ),
+        ],
+        responses=RouteCalendarDaySerializer(many=True),
+    )
+    @action(detail=True, methods=["get"], pagination_class=None)
+    @cache_response
+    def calendar(self, request, *args, **kwargs):
+        """Journeys and their fewest and most free seats per day"""
+        route = self.get_object()
+        start, days = self._calendar_params(request.query_params)
+        first, last = (
+            timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+            for date in (start, start + datetime.timedelta(days=days))
+        )
+        found = {
+            row["date"]: row
+            for row in Journey.objects.filter(
+                route=route, departure_time__gte=first, departure_time__lt=last
+            )
+            .annotate(date=TruncDate("departure_time"))
+            .values("date")
+            .annotate(
+                journeys=Count("pk"),
+                min_seats_available=Min(seats_available()),
+                max_seats_available=Max(seats_available()),
+            )
+            .order_by("date")
+        }
+        calendar = []
+        for day in range(days):
+            date = start + datetime.timedelta(days=day)
+            calendar.append(
+                found.get(
+                    date,
+                    {
+                        "date": date,
+                        "journeys": 0,
+                        "min_seats_available": None,
+                        "max_seats_available": None,
+                    },
+                )
+            )
+        serializer = self.get_serializer(calendar, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "from",
+                type=OpenApiTypes.INT,
+                required=True,
+                description="Departure station id (ex. ?from=1)",
+            ),
+            OpenApiParameter(
+                "to",
+                type=OpenApiTypes.INT,
+                required=True,
+                description="Arrival station id (ex. ?to=7)",
+            ),
+        ]
+    )
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def plan(self, request):
+        """Shortest sequence of routes between two stations"""
+        stations = _station_params(request.query_params)
+
+        graph = get_route_graph()
+        for param, station_id in stations.items():
+            if station_id not in graph.coordinates:
+                raise NotFound(f"Station {station_id} does not exist.")
+
+        result = graph.plan(stations["from"], stations["to"])
+        if result is None:
+            raise NotFound("No route between these stations.")
+        distance, legs = result
+        serializer = self.get_serializer(
+            {
+                "source": stations["from"],
+                "destination": stations["to"],
+                "distance": distance,
+                "legs": [
+                    {
+                        "id": route_id,
+                        "source": source_id,
+                        "destination": destination_id,
+                        "distance": leg_distance,
+                    }
+                    for route_id, source_id, destination_id, leg_distance in legs
+                ],
+            }
+        )
+        return Response(serializer.data)
+
 
 class CrewViewSet(viewsets.ModelViewSet):
     queryset = Crew.objects.all().order_by("id")
     serializer_class = CrewSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedUserJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
     pagination_class = PageNumberPagination
+    cache_models = (Crew,)
 
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class JourneyViewSet(viewsets.ModelViewSet):
+
+class JourneyViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     queryset = (
         Journey.objects.all()
         .select_related("route", "train")
@@ -154,79 +419,126 @@ class JourneyViewSet(viewsets.ModelViewSet):
         .order_by("id")
     )
     serializer_class = JourneySerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedUserJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
-    pagination_class = PageNumberPagination
-
-    @staticmethod
-    def _params_to_ints(qs):
-        """Converts a list of string IDs to a list of integers"""
-        return [int(str_id) for str_id in qs.split(",")]
+    pagination_class = PageNumberOrKeysetPagination
+    keyset_ordering = ("departure_time", "id")
+    filter_backends = (FilterSetBackend,)
+    filterset_class = JourneyFilter
 
     def get_queryset(self):
-        """Retrieve the Journey with filters"""
-        route = self.request.query_params.get("route")
-        train = self.request.query_params.get("train")
-        crew = self.request.query_params.get("crew")
-        departure_after = self.request.query_params.get("departure_after")
-        arrival_before = self.request.query_params.get("arrival_before")
+        """Retrieve the journeys, with the route and train for detail views"""
+        if self.action == "seats":
+            return Journey.objects.select_related("train")
 
         queryset = self.queryset
+        if self.action == "list":
+            queryset = queryset.select_related("occupancy")
+        if self.action == "retrieve":
+            queryset = queryset.select_related(
+                "route__source", "route__destination", "train__train_type"
+            )
 
-        if route:
-            route_id = self._params_to_ints(route)
-            queryset = queryset.filter(route__id__in=route_id)
-        if train:
-            train_id = self._params_to_ints(train)
-            queryset = queryset.filter(train__id__in=train_id)
-        if crew:
-            crew_id = self._params_to_ints(crew)
-            queryset = queryset.filter(crew__id__in=crew_id)
-        if departure_after:
-            queryset = queryset.filter(departure_time__gte=departure_after)
-        if arrival_before:
-            queryset = queryset.filter(arrival_time__lte=arrival_before)
-
-        return queryset.distinct()
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return JourneyListSerializer
+        if self.action == "retrieve":
+            return JourneyDetailSerializer
+        if self.action == "seats":
+            return SeatMapSerializer
+        if self.action == "connections":
+            return ConnectionPlanSerializer
+        return JourneySerializer
 
     @extend_schema(
         parameters=[
             OpenApiParameter(
-                "route",
-                type={"type": "list", "items": {"type": "number"}},
-                description="Filter by route id (ex. ?route=2,5)",
+                "encoding",
+                type=OpenApiTypes.STR,
+                enum=["bitmap", "rle"],
+                description="Seat map encoding: base64 bitmap of taken seats "
+                "(default) or run lengths alternating free and taken seats "
+                "(ex. ?encoding=rle)",
             ),
+        ]
+    )
+    @action(detail=True, methods=["get"], pagination_class=None)
+    def seats(self, request, pk=None):
+        """Return free and taken seats of the journey's train"""
+        encoding = request.query_params.get("encoding", "bitmap")
+        if encoding not in ("bitmap", "rle"):
+            raise ValidationError({"encoding": 'Must be "bitmap" or "rle".'})
+        journey = self.get_object()
+        serializer = self.get_serializer(
+            SeatMap.for_journey(journey),
+            context={**self.get_serializer_context(), "encoding": encoding},
+        )
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
             OpenApiParameter(
-                "train",
-                type={"type": "list", "items": {"type": "number"}},
-                description="Filter by train id (ex. ?train=2,5)",
+                "from",
+                type=OpenApiTypes.INT,
+                required=True,
+                description="Departure station id (ex. ?from=1)",
             ),
             OpenApiParameter(
-                "crew",
-                type={"type": "list", "items": {"type": "number"}},
-                description="Filter by crew id (ex. ?crew=2,5)",
+                "to",
+                type=OpenApiTypes.INT,
+                required=True,
+                description="Arrival station id (ex. ?to=7)",
             ),
             OpenApiParameter(
                 "departure_after",
                 type=OpenApiTypes.DATETIME,
-                description="Filter journeys departing after this time (ex. ?departure_after=2025-04-24T10:00:00Z)",
+                description="Leave no earlier than this time, now by default "
+                "(ex. ?departure_after=2025-04-24T10:00:00Z)",
             ),
             OpenApiParameter(
-                "arrival_before",
-                type=OpenApiTypes.DATETIME,
-                description="Filter journeys arriving before this time (ex. ?arrival_before=2025-04-24T18:00:00Z)",
+                "min_transfer",
+                type=OpenApiTypes.INT,
+                description="Minimum minutes between connecting journeys "
+                f"(default {DEFAULT_MIN_TRANSFER_MINUTES})",
             ),
         ]
     )
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
-    def get_serializer_class(self):
-        if self.action == "list":
-            return JourneyListSerializer
-        if self.action == "retrieve":
-            return JourneyDetailSerializer
-        return JourneySerializer
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def connections(self, request):
+        """Earliest arrival itinerary over scheduled journeys"""
+        params = request.query_params
+        stations = _station_params(params)
+
+        departure_after = timezone.now()
+        if params.get("departure_after"):
+            try:
+                departure_after = DateTimeFilter("departure_time").parse(
+                    params["departure_after"]
+                )
+            except ValueError as exc:
+                raise ValidationError({"departure_after": str(exc)})
+
+        min_transfer = params.get("min_transfer", str(DEFAULT_MIN_TRANSFER_MINUTES))
+        if not min_transfer.isdigit():
+            raise ValidationError({"min_transfer": "A number of minutes is required."})
+
+        legs = get_timetable().earliest_arrival(
+            stations["from"], stations["to"], departure_after, int(min_transfer)
+        )
+        if not legs:
+            raise NotFound("No connection between these stations.")
+        serializer = self.get_serializer(
+            {
+                "source": stations["from"],
+                "destination": stations["to"],
+                "departure_after": departure_after,
+                "arrival_time": legs[-1]["arrival_time"],
+                "legs": legs,
+            }
+        )
+        return Response(serializer.data)
 
 
 class OrderViewSet(
@@ -234,22 +546,169 @@ class OrderViewSet(
     mixins.CreateModelMixin,
     GenericViewSet,
 ):
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedUserJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
-    pagination_class = PageNumberPagination
+    pagination_class = PageNumberOrKeysetPagination
+    keyset_ordering = ("-created_at", "-id")
 
     queryset = Order.objects.prefetch_related(
-        "tickets__journey__route", "tickets__journey__train"
+        Prefetch(
+            "ticket_set",
+            queryset=Ticket.objects.select_related(
+                "journey__route", "journey__train", "journey__occupancy"
+            ),
+        ),
+        "ticket_set__journey__crew",
     ).order_by("-created_at")
     serializer_class = OrderSerializer
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return self.queryset.filter(user=self.request.user)
 
     def get_serializer_class(self):
         if self.action == "list":
             return OrderListSerializer
+        if self.action == "allocate":
+            return SeatAllocationSerializer
         return OrderSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @extend_schema(responses={201: OrderSerializer})
+    @action(detail=False, methods=["post"])
+    def allocate(self, request):
+        """Order the best available seats on a journey"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save(user=request.user)
+        return Response(
+            OrderSerializer(order, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class SeatHoldViewSet(GenericViewSet):
+    """Reserve seats for a few minutes, then confirm them into an order"""
+
+    authentication_classes = (CachedUserJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = SeatHoldSerializer
+    lookup_field = "hold_id"
+    lookup_value_regex = "[0-9a-f-]{36}"
+    pagination_class = None
+
+    def get_queryset(self):
+        return active_holds().filter(user=self.request.user)
+
+    def get_serializer_class(self):
+        if self.action == "confirm":
+            return OrderSerializer
+        return SeatHoldSerializer
+
+    def _get_hold(self):
+        seats = list(self.get_queryset().filter(hold_id=self.kwargs["hold_id"]))
+        if not seats:
+            raise NotFound()
+        return {
+            "hold_id": seats[0].hold_id,
+            "expires_at": seats[0].expires_at,
+            "seats": seats,
+        }
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self._get_hold()).data)
+
+    def destroy(self, request, *args, **kwargs):
+        if not cancel_hold(self.kwargs["hold_id"], request.user):
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @extend_schema(request=None, responses={201: OrderSerializer})
+    @action(detail=True, methods=["post"])
+    def confirm(self, request, *args, **kwargs):
+        """Create an order with the held seats and release the hold"""
+        try:
+            order = confirm_hold(self.kwargs["hold_id"], request.user)
+        except IntegrityError:
+            raise ValidationError(
+                {"seats": ["A held seat has already been ordered."]}
+            )
+        if order is None:
+            raise NotFound()
+        return Response(
+            self.get_serializer(order).data, status=status.HTTP_201_CREATED
+        )
+
+
+class MetricsView(APIView):
+    """Counters and gauges of the worker process serving the request"""
+
+    authentication_classes = (CachedUserJWTAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(responses={200: OpenApiTypes.OBJECT})
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+class ExportView(APIView):
+    """Stream a whole table for bulk consumers such as the data warehouse"""
+
+    authentication_classes = (CachedUserJWTAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "output",
+                type=OpenApiTypes.STR,
+                enum=list(OUTPUT_FORMATS),
+                description="Newline delimited JSON (default) or CSV "
+                "(ex. ?output=csv)",
+            ),
+            OpenApiParameter(
+                "compression",
+                type=OpenApiTypes.STR,
+                enum=list(COMPRESSIONS),
+                description="Compress the stream (ex. ?compression=zstd)",
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    def get(self, request, dataset):
+        if dataset not in DATASETS:
+            raise NotFound()
+        output_format = request.query_params.get("output", "ndjson")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValidationError({"output": f"Choose from {list(OUTPUT_FORMATS)}."})
+        compression = request.query_params.get("compression") or None
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValidationError(
+                {"compression": f"Choose from {list(COMPRESSIONS)}."}
+            )
+        content_type, filename, chunks = export_stream(
+            dataset, output_format, compression
+        )
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class GTFSExportView(APIView):
+    """Stream the timetable as a GTFS feed"""
+
+    authentication_classes = (CachedUserJWTAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(responses={200: OpenApiTypes.BINARY})
+    def get(self, request):
+        response = StreamingHttpResponse(export_feed(), content_type="application/zip")
+        response["Content-Disposition"] = 'attachment; filename="gtfs.zip"'
+        return response
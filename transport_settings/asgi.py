@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "transport_settings.settings")
+os.environ["SERVER_INTERFACE"] = "asgi"
 
 application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
@@ -73,13 +74,13 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedUserJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
-        "rest_framework.throttling.ScopedRateThrottle",
+        "transport.throttling.AnonRateThrottle",
+        "transport.throttling.UserRateThrottle",
+        "transport.throttling.ScopedRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": "100/day",
@@ -133,6 +134,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "transport_settings.wsgi.application"
 
+# Serve journey and route searches from async views; enable when running
+# under ASGI (transport_settings.asgi:application).
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "0") == "1"
+
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
@@ -144,8 +149,98 @@ DATABASES = {
         "USER": os.environ["POSTGRES_USER"],
         "PASSWORD": os.environ["POSTGRES_PASSWORD"],
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # Statements run this many times on a connection are prepared
+            # server-side; requires server-side parameter binding.
+            "server_side_binding": True,
+            "prepare_threshold": int(os.environ.get("DB_PREPARE_THRESHOLD", "5")),
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+                "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            },
+        },
     }
 }
+
+if os.environ.get("DB_POOL", "1") == "0":
+    # Behind an external pooler such as PgBouncer in transaction mode:
+    # persistent connections without server-side prepared statements.
+    DATABASES["default"]["OPTIONS"] = {}
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.environ.get("DB_CONN_MAX_AGE", "60")
+    )
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    # Per-process; response entries are keyed by model versions
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared by every worker on the node, with atomic add/incr
+    "shared": {
+        "BACKEND": "transport.sqlite_cache.SQLiteCache",
+        "LOCATION": os.environ.get(
+            "SHARED_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "transport-cache.sqlite3"),
+        ),
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+RESPONSE_CACHE = "default"
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", "86400"))
+MODEL_VERSIONS_CACHE = "shared"
+THROTTLE_CACHE = "shared"
+USER_CACHE = "shared"
+USER_CACHE_TIMEOUT = int(os.environ.get("USER_CACHE_TIMEOUT", "300"))
+
+# Seat holds (minutes a seat stays reserved before it must be confirmed)
+SEAT_HOLD_MINUTES = int(os.environ.get("SEAT_HOLD_MINUTES", "10"))
+SEAT_HOLD_MAX_MINUTES = 30
+
+# Rows fetched from the server-side cursor, and encoded, per step of an export
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "2000"))
+
+# Agency written to agency.txt of GTFS exports
+GTFS_AGENCY_NAME = os.environ.get("GTFS_AGENCY_NAME", "py-transport-api")
+GTFS_AGENCY_URL = os.environ.get(
+    "GTFS_AGENCY_URL", "https://py-transport-api.onrender.com"
+)
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+
+PASSWORD_HASHERS = [
+    # Same hashes as PBKDF2PasswordHasher, derived in a process pool
+    "user.hashers.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Set by transport_settings.asgi
+SERVER_INTERFACE = os.environ.get("SERVER_INTERFACE", "wsgi")
+
+# 0 hashes on the request thread. The pool is only used under ASGI, where each
+# sync view has its own thread to wait in; a WSGI worker would stay blocked
+# for the whole hash either way.
+PASSWORD_HASHING_PROCESSES = (
+    int(os.environ.get("PASSWORD_HASHING_PROCESSES", "0"))
+    if SERVER_INTERFACE == "asgi"
+    else 0
+)
+# Hashes running or waiting before logins are refused with 503
+PASSWORD_HASHING_QUEUE_SIZE = int(
+    os.environ.get(
+        "PASSWORD_HASHING_QUEUE_SIZE", str(max(PASSWORD_HASHING_PROCESSES, 1) * 8)
+    )
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
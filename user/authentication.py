@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# The password hash never leaves the database
+CACHED_FIELDS_EXCLUDE = ("password",)
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """JWT authentication that loads the user from ``settings.USER_CACHE``.
+
+    The user's columns, except the password, are cached for
+    ``USER_CACHE_TIMEOUT`` seconds and dropped when the user is saved or
+    deleted. A hit rebuilds a ``User`` instance with ``from_db`` without a
+    query; the password is deferred and loaded if something reads it.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares against the password hash
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        cache = caches[settings.USER_CACHE]
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            user = super().get_user(validated_token)
+            cache.set(key, self._values(user), settings.USER_CACHE_TIMEOUT)
+            return user
+
+        user = self.user_model.from_db(
+            DEFAULT_DB_ALIAS, self._field_names(), values
+        )
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def _field_names(self):
+        return [
+            field.attname
+            for field in self.user_model._meta.concrete_fields
+            if field.attname not in CACHED_FIELDS_EXCLUDE
+        ]
+
+    def _values(self, user):
+        return [getattr(user, name) for name in self._field_names()]
@@ -0,0 +1,97 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+from transport import metrics
+
+
+class HashingPoolBusy(Exception):
+    """Raised instead of queueing a hash beyond ``PASSWORD_HASHING_QUEUE_SIZE``"""
+
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process pool, or None when hashing runs in the caller.
+
+    Workers are spawned rather than forked so they do not inherit the
+    parent's threads or database connections.
+    """
+    global _executor
+    if not settings.PASSWORD_HASHING_PROCESSES:
+        return None
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def _finished(future):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def run_in_pool(function, *args):
+    """Run ``function(*args)`` in the pool and block until it returns.
+
+    At most ``PASSWORD_HASHING_QUEUE_SIZE`` calls may be running or queued;
+    beyond that the call fails fast with ``HashingPoolBusy``.
+    """
+    global _pending
+    executor = get_executor()
+    if executor is None:
+        return function(*args)
+    with _lock:
+        if _pending >= settings.PASSWORD_HASHING_QUEUE_SIZE:
+            metrics.increment("password_hashing.rejected")
+            raise HashingPoolBusy()
+        _pending += 1
+    try:
+        future = executor.submit(function, *args)
+    except BaseException:
+        _finished(None)
+        raise
+    future.add_done_callback(_finished)
+    metrics.increment("password_hashing.submitted")
+    return future.result()
+
+
+def _derive(password, salt, iterations):
+    return PBKDF2PasswordHasher().encode(password, salt, iterations)
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with the key derivation run in a process pool.
+
+    ``verify`` goes through ``encode``, so both hashing a new password and
+    checking a login leave the request thread free of CPU work. Hashes are
+    identical to ``PBKDF2PasswordHasher``.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        return run_in_pool(_derive, password, salt, iterations or self.iterations)
+
+
+metrics.register_gauge(
+    "password_hashing.pool_size", lambda: settings.PASSWORD_HASHING_PROCESSES
+)
+metrics.register_gauge("password_hashing.queue_depth", lambda: _pending)
@@ -1,10 +1,12 @@
 from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
 from django.core.mail import send_mail
 from django.utils import timezone
 from rest_framework import serializers
 from django.utils.translation import gettext as _
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 import re
@@ -79,8 +81,13 @@ class AuthTokenSerializer(TokenObtainPairSerializer):
             msg = _('Must include "email" and "password".')
             raise serializers.ValidationError(msg, code="authorization")
 
-        attrs["user"] = user
-        data = super().validate(attrs)
+        # TokenObtainPairSerializer.validate would authenticate, and hash the
+        # password, a second time
+        self.user = user
+        refresh = self.get_token(user)
+        data = {"refresh": str(refresh), "access": str(refresh.access_token)}
+        if jwt_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
         return data
 
 
@@ -1,9 +1,28 @@
-from django.test import TestCase
+from django.core.cache import cache, caches
+from django.db import connection
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher,
+    check_password,
+    make_password,
+)
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from datetime import timedelta
+from unittest import mock
+import os
+import subprocess
+import sys
 import uuid
 
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from transport import metrics
+
+from . import hashers
 from .models import User, PasswordResetToken
 
 
@@ -88,3 +107,219 @@ class PasswordResetTokenModelTests(TestCase):
         )
         token.save()
         self.assertTrue(token.is_expired())
+
+
+# Maximum number of queries per endpoint, including JWT authentication.
+QUERY_BUDGETS = {
+    "create": 2,
+    "login": 3,
+    "manage_retrieve": 1,
+    "manage_update": 3,
+    "password_reset_request": 2,
+    "password_reset_confirm": 4,
+}
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["shared"].clear()
+        self.user = User.objects.create_user(
+            email="budget@example.com",
+            password="Testpass123",
+            first_name="A",
+            last_name="B",
+        )
+        self.client = APIClient()
+
+    def assert_within_budget(self, key, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertLessEqual(len(queries), QUERY_BUDGETS[key])
+
+    def test_anonymous_endpoints(self):
+        self.assert_within_budget(
+            "create",
+            "post",
+            reverse("user:create"),
+            {"email": "new@example.com", "password": "Newpass!123"},
+        )
+        self.assert_within_budget(
+            "login",
+            "post",
+            reverse("user:login"),
+            {"email": "budget@example.com", "password": "Testpass123"},
+        )
+        self.assert_within_budget(
+            "password_reset_request",
+            "post",
+            reverse("user:password-reset-request"),
+            {"email": "budget@example.com"},
+        )
+        token = PasswordResetToken.objects.create(user=self.user)
+        self.assert_within_budget(
+            "password_reset_confirm",
+            "post",
+            reverse("user:password-reset-confirm"),
+            {"token": token.token, "new_password": "Newpass!123"},
+        )
+
+    def test_manage_user(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        url = reverse("user:manage")
+        self.assert_within_budget("manage_retrieve", "get", url)
+        self.assert_within_budget(
+            "manage_update", "patch", url, {"password": "Otherpass!123"}
+        )
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["shared"].clear()
+        self.client = APIClient()
+        self.url = reverse("user:login")
+        self.credentials = {"email": "nobody@example.com", "password": "wrong"}
+
+    def test_login_attempts_are_counted_in_shared_cache(self):
+        for _ in range(10):
+            response = self.client.post(self.url, self.credentials, format="json")
+            self.assertNotEqual(response.status_code, 429)
+        # Another worker has its own local cache but the same shared one
+        cache.clear()
+        response = self.client.post(self.url, self.credentials, format="json")
+        self.assertEqual(response.status_code, 429)
+
+
+class CachedUserAuthenticationTests(TestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        self.user = User.objects.create_user(
+            email="cached@example.com",
+            password="Testpass123",
+            first_name="A",
+            last_name="B",
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.url = reverse("transport:metrics")
+
+    def test_user_is_loaded_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(len(queries), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_saving_user_drops_cached_copy(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+@override_settings(PASSWORD_HASHING_PROCESSES=1, PASSWORD_HASHING_QUEUE_SIZE=2)
+class PooledPasswordHasherTests(TestCase):
+    def setUp(self):
+        self.addCleanup(hashers.shutdown_executor)
+        caches["shared"].clear()
+        metrics.reset()
+        self.client = APIClient()
+
+    def test_hashes_match_pbkdf2(self):
+        encoded = make_password("Testpass123", salt="fixedsalt")
+        self.assertEqual(
+            encoded, PBKDF2PasswordHasher().encode("Testpass123", "fixedsalt")
+        )
+        self.assertTrue(check_password("Testpass123", encoded))
+        self.assertFalse(check_password("wrong", encoded))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["password_hashing.submitted"], 3)
+        self.assertEqual(snapshot["gauges"]["password_hashing.pool_size"], 1)
+        self.assertEqual(snapshot["gauges"]["password_hashing.queue_depth"], 0)
+
+    def test_full_queue_is_refused(self):
+        with mock.patch.object(hashers, "_pending", 2):
+            with self.assertRaises(hashers.HashingPoolBusy):
+                make_password("Testpass123")
+
+    def test_full_queue_is_503_on_the_api(self):
+        User.objects.create_user(
+            email="login@example.com",
+            password="Testpass123",
+            first_name="A",
+            last_name="B",
+        )
+        with mock.patch.object(hashers, "_pending", 2):
+            response = self.client.post(
+                reverse("user:login"),
+                {"email": "login@example.com", "password": "Testpass123"},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.data["detail"].code, "hashing_pool_busy")
+            response = self.client.post(
+                reverse("user:create"),
+                {
+                    "email": "new@example.com",
+                    "password": "Testpass123",
+                    "first_name": "A",
+                    "last_name": "B",
+                },
+                format="json",
+            )
+            self.assertEqual(response.status_code, 503)
+
+    def test_login_hashes_password_once(self):
+        User.objects.create_user(
+            email="login@example.com",
+            password="Testpass123",
+            first_name="A",
+            last_name="B",
+        )
+        with mock.patch.object(
+            hashers, "run_in_pool", wraps=hashers.run_in_pool
+        ) as run_in_pool:
+            response = self.client.post(
+                reverse("user:login"),
+                {"email": "login@example.com", "password": "Testpass123"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.data)
+        self.assertEqual(run_in_pool.call_count, 1)
+
+    def test_pool_is_only_configured_under_asgi(self):
+        for interface, expected in (("wsgi", "0"), ("asgi", "3")):
+            env = {
+                **os.environ,
+                "SERVER_INTERFACE": interface,
+                "PASSWORD_HASHING_PROCESSES": "3",
+            }
+            with self.subTest(interface=interface):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        "from transport_settings import settings; "
+                        "print(settings.PASSWORD_HASHING_PROCESSES)",
+                    ],
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                self.assertEqual(output.strip(), expected)
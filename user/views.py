@@ -1,5 +1,6 @@
 from drf_spectacular.utils import extend_schema
 from rest_framework import generics, status
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -7,6 +8,7 @@ from rest_framework.response import Response
 from django.utils.translation import gettext_lazy as _
 import logging
 
+from user.hashers import HashingPoolBusy
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
@@ -17,7 +19,22 @@ from user.serializers import (
 logger = logging.getLogger(__name__)
 
 
-class CreateUserView(generics.CreateAPIView):
+class PasswordHashingUnavailable(APIException):
+    status_code = 503
+    default_detail = _("Too many password checks in progress, try again later.")
+    default_code = "hashing_pool_busy"
+
+
+class HashingPoolBusyMixin:
+    """Answer 503 rather than 500 when the password hashing pool is full"""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, HashingPoolBusy):
+            exc = PasswordHashingUnavailable()
+        return super().handle_exception(exc)
+
+
+class CreateUserView(HashingPoolBusyMixin, generics.CreateAPIView):
     """API view to create a new user."""
 
     serializer_class = UserSerializer
@@ -32,7 +49,7 @@ class CreateUserView(generics.CreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
-class CreateTokenView(TokenObtainPairView):
+class CreateTokenView(HashingPoolBusyMixin, TokenObtainPairView):
     """API view to obtain JWT token."""
 
     serializer_class = AuthTokenSerializer
@@ -46,7 +63,7 @@ class CreateTokenView(TokenObtainPairView):
         return super().post(request, *args, **kwargs)
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(HashingPoolBusyMixin, generics.RetrieveUpdateAPIView):
     """API view to retrieve or update authenticated user details."""
 
     serializer_class = UserSerializer
@@ -90,7 +107,7 @@ class PasswordResetRequestView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PasswordResetView(generics.GenericAPIView):
+class PasswordResetView(HashingPoolBusyMixin, generics.GenericAPIView):
     """API view to reset a user's password.
 
     Expects a POST request with a token and new password.
@@ -108,6 +125,8 @@ class PasswordResetView(generics.GenericAPIView):
                 return Response(
                     {"detail": _("Password has been reset.")}, status=status.HTTP_200_OK
                 )
+            except HashingPoolBusy:
+                raise
             except Exception as e:
                 logger.error(f"Error resetting password: {str(e)}")
                 return Response(